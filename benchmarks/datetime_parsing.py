@@ -0,0 +1,21 @@
+"""
+Compares `parse_datetime` fixed width fast path against the regex one.
+Run it from the repository root: `python -m benchmarks.datetime_parsing`
+"""
+import timeit
+
+from python_utils.generic.datetime_utils import parse_datetime, parse_datetime_regex
+
+VALUES = ('2019-01-01T00:00:00Z', '2019-06-15T10:20:30.123456+02:00', '2019-06-15 10:20:30-0530',
+          '2019-12-31T23:59:59.5')
+
+
+def main(number=100000):
+    for parse in (parse_datetime_regex, parse_datetime):
+        for value in VALUES:
+            seconds = timeit.timeit(lambda: parse(value), number=number)
+            print('{} {!r}: {:.2f} us'.format(parse.__name__, value, seconds / number * 1000000))
+
+
+if __name__ == '__main__':
+    main()
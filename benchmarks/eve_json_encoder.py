@@ -0,0 +1,79 @@
+"""
+Compares Eve response encoding with the previous `MyMongoJSONEncoder` (encoders chain), the type dispatch one without
+and with the datetime cache and the orjson one, over a page of realistic documents. Pages are built with distinct
+datetimes and with datetimes repeated between documents, as bulk created ones.
+Run it from the repository root: `python -m benchmarks.eve_json_encoder [documents]`
+"""
+import datetime
+import json
+import random
+import sys
+import timeit
+
+import pytz
+from bson import ObjectId, decimal128
+from bson.dbref import DBRef
+from eve.io.mongo.mongo import MongoJSONEncoder
+
+from python_utils.eve.utils import datetime_utils
+from python_utils.eve.utils.datetime_utils import MyMongoJSONEncoder, MyMongoORJSONEncoder
+from python_utils.generic.datetime_utils import print_datetime
+
+
+class ChainJSONEncoder(MongoJSONEncoder):
+    """Previous `MyMongoJSONEncoder`"""
+
+    def default(self, obj):  # pylint: disable=E0202
+        if isinstance(obj, datetime.datetime):
+            return print_datetime(obj)
+        return super().default(obj)
+
+
+class UncachedJSONEncoder(MyMongoJSONEncoder):
+    """Type dispatch `MyMongoJSONEncoder` without the datetime cache"""
+    dispatch = dict(MyMongoJSONEncoder.dispatch)
+    dispatch[datetime.datetime] = lambda self, obj: print_datetime(obj)
+
+
+def get_documents(count, datetimes=None):
+    """Eve like documents, with meta fields, references, decimals and embedded lists. Creation times are taken from
+    `datetimes` distinct values, all different by default"""
+    rng = random.Random(0)
+    start = datetime.datetime(2019, 1, 1, tzinfo=pytz.utc)
+    documents = []
+    for position in range(count):
+        if datetimes is None:
+            created = start + datetime.timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        else:
+            created = start + datetime.timedelta(hours=rng.randrange(datetimes))
+        documents.append({
+            '_id': ObjectId(),
+            '_created': created,
+            '_updated': created + datetime.timedelta(minutes=rng.randrange(1000)),
+            '_etag': '%040x' % rng.getrandbits(160),
+            'name': 'item {}'.format(position),
+            'owner': DBRef('users', ObjectId()),
+            'price': decimal128.Decimal128('{}.{:02d}'.format(rng.randrange(100), rng.randrange(100))),
+            'tags': ['tag{}'.format(rng.randrange(10)) for _ in range(3)],
+            'history': [{'at': created + datetime.timedelta(days=day), 'state': 'ok'} for day in range(3)],
+        })
+    return {'_items': documents, '_meta': {'page': 1, 'max_results': count, 'total': count}}
+
+
+def main(count=1000, number=20):
+    for name, response in (('distinct datetimes', get_documents(count)),
+                           ('repeated datetimes', get_documents(count, datetimes=50))):
+        print(name)
+        for encoder_cls in (ChainJSONEncoder, UncachedJSONEncoder, MyMongoJSONEncoder, MyMongoORJSONEncoder):
+            datetime_utils.format_datetime.cache_clear()
+            seconds = timeit.timeit(lambda: json.dumps(response, cls=encoder_cls), number=number)
+            line = '  {}: {:.2f} ms per response'.format(encoder_cls.__name__, seconds / number * 1000)
+            cache_info = datetime_utils.format_datetime.cache_info()
+            calls = cache_info.hits + cache_info.misses
+            if calls:
+                line += ', datetime cache hit rate {:.0%}'.format(cache_info.hits / calls)
+            print(line)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,55 @@
+"""
+Compares Eve `serialize` per document against `MyMongo.serialize_documents` over a bulk POST like batch.
+Run it from the repository root: `python -m benchmarks.eve_serialization [documents]`
+"""
+import copy
+import sys
+import time
+
+from eve import Eve
+from eve.methods.common import serialize
+
+from python_utils.eve.utils.datetime_utils import MyMongo
+
+SCHEMA = {
+    'owner': {'type': 'objectid'},
+    'created': {'type': 'datetime'},
+    'count': {'type': 'integer'},
+    'amount': {'type': 'number'},
+    'active': {'type': 'boolean'},
+    'name': {'type': 'string'},
+    'tags': {'type': 'list', 'schema': {'type': 'objectid'}},
+    'address': {'type': 'dict', 'schema': {'city': {'type': 'string'}, 'since': {'type': 'datetime'}}},
+    'events': {'type': 'list', 'schema': {'type': 'dict', 'schema': {'at': {'type': 'datetime'},
+                                                                      'value': {'type': 'number'}}}},
+}
+
+DOCUMENT = {
+    'owner': '5d0b6e1f8f1b2c3d4e5f6a7b',
+    'created': '2019-06-15T10:20:30.123456Z',
+    'count': '12',
+    'amount': '1500',
+    'active': 'true',
+    'name': 'item',
+    'tags': ['5d0b6e1f8f1b2c3d4e5f6a7c', '5d0b6e1f8f1b2c3d4e5f6a7d'],
+    'address': {'city': 'Madrid', 'since': '2018-01-01T00:00:00Z'},
+    'events': [{'at': '2019-06-15T10:20:30Z', 'value': '3'}, {'at': '2019-06-16T10:20:30Z', 'value': '4.5'}],
+}
+
+
+def main(count=10000):
+    app = Eve(settings={'DOMAIN': {'items': {'schema': SCHEMA}}}, data=MyMongo)
+    with app.app_context():
+        documents = [copy.deepcopy(DOCUMENT) for _ in range(count)]
+        start = time.perf_counter()
+        for document in documents:
+            serialize(document, 'items')
+        print('eve serialize: {:.2f} ms'.format((time.perf_counter() - start) * 1000))
+        documents = [copy.deepcopy(DOCUMENT) for _ in range(count)]
+        start = time.perf_counter()
+        app.data.serialize_documents('items', documents)
+        print('serialize_documents: {:.2f} ms'.format((time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,59 @@
+"""
+Compares GunicornLogger templated access log against StructuredGunicornLogger, formatting with
+GunicornRequestGELFFormatter. Run it from the repository root: `python -m benchmarks.gunicorn_access`
+"""
+import datetime
+import io
+import logging
+import timeit
+
+from gunicorn.config import Config
+
+from python_utils.gunicorn.log.formatters import GunicornRequestGELFFormatter
+from python_utils.gunicorn.log.loggers import GunicornLogger, StructuredGunicornLogger
+
+
+class Response:
+    status = '200 OK'
+    sent = 1024
+    headers = [('Content-Type', 'application/json'), ('Content-Length', '1024')]
+
+
+class Request:
+    headers = [('HOST', 'localhost'), ('USER-AGENT', 'benchmark'), ('ACCEPT', '*/*')]
+
+
+ENVIRON = {
+    'REMOTE_ADDR': '10.0.0.1',
+    'REQUEST_METHOD': 'GET',
+    'RAW_URI': '/api/v1/items/?page=2',
+    'PATH_INFO': '/api/v1/items/',
+    'QUERY_STRING': 'page=2',
+    'SERVER_PROTOCOL': 'HTTP/1.1',
+    'HTTP_USER_AGENT': 'benchmark',
+    'wsgi.version': (1, 0),
+    'wsgi.url_scheme': 'http',
+}
+
+REQUEST_TIME = datetime.timedelta(microseconds=12345)
+
+
+def build_logger(logger_class):
+    cfg = Config()
+    cfg.set('accesslog', '-')
+    logger = logger_class(cfg)
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(GunicornRequestGELFFormatter())
+    logger.access_log.handlers = [handler]
+    return logger
+
+
+def main(number=20000):
+    for logger_class in (GunicornLogger, StructuredGunicornLogger):
+        logger = build_logger(logger_class)
+        seconds = timeit.timeit(lambda: logger.access(Response(), Request(), ENVIRON, REQUEST_TIME), number=number)
+        print('{}: {:.2f} us per access log'.format(logger_class.__name__, seconds / number * 1000000))
+
+
+if __name__ == '__main__':
+    main()
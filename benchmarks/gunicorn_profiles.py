@@ -0,0 +1,91 @@
+"""
+Load test of every gunicorn profile of `python_utils.gunicorn.config` serving the test Django app with
+`python_utils/gunicorn/log/gunicorn_conf.py`. Run it from the repository root:
+`python -m benchmarks.gunicorn_profiles [io|cpu] [seconds] [concurrency]`
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from python_utils.gunicorn.config import PROFILES
+
+CONF = os.path.join('python_utils', 'gunicorn', 'log', 'gunicorn_conf.py')
+APP = 'tests.django_test_app.wsgi:application'
+GUNICORN = 'from gunicorn.app.wsgiapp import run; run()'
+PATHS = {'io': '/bench/io/', 'cpu': '/bench/cpu/'}
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def load(url, seconds, concurrency):
+    """Requests the url from `concurrency` threads during `seconds` and returns the sorted latencies and errors"""
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + seconds
+
+    def client():
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                urllib.request.urlopen(url, timeout=10).read()
+                latencies.append(time.monotonic() - start)
+            except OSError as exc:
+                errors.append(exc)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors
+
+
+def run_profile(profile, path, seconds, concurrency):
+    port = get_free_port()
+    env = dict(os.environ, GUNICORN_PROFILE=profile, DJANGO_SETTINGS_MODULE='tests.django_test_app.settings')
+    server = subprocess.Popen([sys.executable, '-c', GUNICORN, '-c', CONF, '--bind', '127.0.0.1:{}'.format(port),
+                               APP], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = 'http://127.0.0.1:{}{}'.format(port, path)
+    try:
+        wait_ready(url)
+        latencies, errors = load(url, seconds, concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+    if not latencies:
+        print('{}: no successful requests, {} errors'.format(profile, len(errors)))
+        return
+    print('{}: {:.0f} req/s, p50 {:.1f} ms, p99 {:.1f} ms, {} errors'.format(
+        profile, len(latencies) / seconds, latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000, len(errors)))
+
+
+def main():
+    workload = sys.argv[1] if len(sys.argv) > 1 else 'io'
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    for profile in PROFILES:
+        run_profile(profile, PATHS[workload], seconds, concurrency)
+
+
+if __name__ == '__main__':
+    main()
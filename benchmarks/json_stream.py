@@ -0,0 +1,37 @@
+"""
+Compares removing top level keys of a big JSON body parsing and dumping it against `filter_json_keys`.
+Run it from the repository root: `python -m benchmarks.json_stream`
+"""
+import json
+import timeit
+
+from python_utils.generic.json_stream import filter_json_keys
+
+KEYS = ('_meta', '_links')
+CHUNK_SIZE = 64 * 1024
+
+
+def main(number=10, items=20000):
+    body = json.dumps({
+        '_items': [{'_id': str(index), 'title': 'Title {}'.format(index), 'tags': ['a', 'b'], 'count': index}
+                   for index in range(items)],
+        '_meta': {'total': items},
+        '_links': {},
+    }).encode('utf-8')
+    chunks = [body[start:start + CHUNK_SIZE] for start in range(0, len(body), CHUNK_SIZE)]
+
+    def parse_and_dump():
+        data = json.loads(body)
+        return json.dumps({key: value for key, value in data.items() if key not in KEYS}).encode('utf-8')
+
+    def stream_filter():
+        return b''.join(filter_json_keys(chunks, KEYS))
+
+    print('body: {:.1f} MB'.format(len(body) / 1024 / 1024))
+    for function in (parse_and_dump, stream_filter):
+        seconds = timeit.timeit(function, number=number)
+        print('{}: {:.1f} ms'.format(function.__name__, seconds / number * 1000))
+
+
+if __name__ == '__main__':
+    main()
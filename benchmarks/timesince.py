@@ -0,0 +1,30 @@
+"""
+Compares `timesince` called per item against `timesince_many`, with and without NumPy.
+Run it from the repository root: `python -m benchmarks.timesince [items]`
+"""
+import datetime
+import random
+import sys
+import timeit
+
+import pytz
+
+from python_utils.generic.datetime_utils import timesince, timesince_many
+
+
+def main(items=5000, number=10):
+    now = datetime.datetime(2020, 3, 1, 12, tzinfo=pytz.utc)
+    rng = random.Random(0)
+    values = [now - datetime.timedelta(seconds=rng.randrange(0, 5 * 365 * 24 * 3600)) for _ in range(items)]
+    cases = (
+        ('timesince per item', lambda: [timesince(value, now) for value in values]),
+        ('timesince_many', lambda: timesince_many(values, now)),
+        ('timesince_many numpy', lambda: timesince_many(values, now, use_numpy=True)),
+    )
+    for name, func in cases:
+        seconds = timeit.timeit(func, number=number)
+        print('{}: {:.2f} us per item'.format(name, seconds / number / items * 1000000))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -5,9 +5,19 @@ GELF formatters are based on this spec: http://docs.graylog.org/en/2.4/pages/gel
 
 from python_utils.log.formatters import BasicRequestGELFFormatter
 
+REQUEST_EXTRA_FIELDS = ['scheme', 'method', 'user_id', 'username']
+
 
 class DjangoRequestGELFFormatter(BasicRequestGELFFormatter):
-    """A GELF formatter to format a :class:`logging.LogRecord` into GELF, with specific request fields"""
+    """
+    A GELF formatter to format a :class:`logging.LogRecord` into GELF, with specific request fields.
+    Records emitted during a request handled by `RequestLogContextMiddleware` get them from the log context, the rest
+    from the `request` attribute of the record, if any
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.extra_fields = self.extra_fields + REQUEST_EXTRA_FIELDS
 
     def set_more_extra_fields(self, record):
         """Transform from :class:`logging.LogRecord` some fields to python dict.
@@ -18,15 +28,9 @@ class DjangoRequestGELFFormatter(BasicRequestGELFFormatter):
         request = getattr(record, 'request', None)
         if request:
             setattr(record, 'scheme', getattr(record.request, 'scheme', None))
-            self.extra_fields.append('scheme')
-
             setattr(record, 'method', getattr(record.request, 'method', None))
-            self.extra_fields.append('method')
 
             user = getattr(record.request, 'user', None)
             if user:
                 setattr(record, 'user_id', str(getattr(user, 'id', None)))
-                self.extra_fields.append('user_id')
-
                 setattr(record, 'username', getattr(user, 'username', None))
-                self.extra_fields.append('username')
@@ -0,0 +1,72 @@
+"""Log context related middlewares"""
+import asyncio
+import uuid
+
+from django.conf import settings
+from django.utils.functional import empty
+
+from python_utils.log.context import reset_log_context, set_log_context
+
+try:
+    from asgiref.sync import markcoroutinefunction
+except ImportError:  # asgiref < 3.6
+    def markcoroutinefunction(func):
+        """Marks an instance as a coroutine function, as Django does with async middlewares"""
+        func._is_coroutine = asyncio.coroutines._is_coroutine  # pylint: disable=protected-access
+        return func
+
+REQUEST_ID_HEADER = getattr(settings, 'REQUEST_ID_HEADER', 'HTTP_X_REQUEST_ID')
+
+
+def get_user_fields(request):
+    """
+    Returns the user fields of the request. The user is only read if it is already loaded, so logging never queries
+    the database (not allowed in async contexts). Django Rest Framework sets the authenticated user in the request
+    """
+    user = getattr(request, 'user', None)
+    if user is None or getattr(user, '_wrapped', None) is empty:
+        return {}
+    return {'user_id': str(getattr(user, 'id', None)), 'username': getattr(user, 'username', None)}
+
+
+class RequestLogContextMiddleware:
+    """
+    Sets the request id, scheme, method, path and user of the request as log context, to be added by GELF formatters
+    to every record emitted while handling the request. The request id is taken from `REQUEST_ID_HEADER` setting header
+    (`X-Request-ID` by default) or generated. It works with sync and async views
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def set_log_context(self, request):
+        """Captures the request context once and returns the token to reset it"""
+        request_id = request.META.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        fields = {
+            'request_id': request_id,
+            'scheme': request.scheme,
+            'method': request.method,
+            'path': request.path,
+        }
+        return set_log_context(fields, lambda: get_user_fields(request))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = self.set_log_context(request)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_log_context(token)
+
+    async def __acall__(self, request):
+        token = self.set_log_context(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_log_context(token)
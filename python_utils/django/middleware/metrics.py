@@ -0,0 +1,41 @@
+"""Metrics related middlewares"""
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound
+
+from python_utils.gunicorn.metrics import ROUTE_ENVIRON_KEY, SharedHistograms
+
+METRICS_PATH = getattr(settings, 'METRICS_PATH', "/metrics")
+METRICS_FILE = getattr(settings, 'METRICS_FILE', os.environ.get('GUNICORN_METRICS_FILE'))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsMiddleware:
+    """
+    Exposes in /metrics endpoint the request latency histograms recorded by gunicorn workers in Prometheus text
+    format, and tells them the resolved route of every request so they are not recorded by path
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.histograms = None
+
+    def __call__(self, request):
+        if request.method == "GET" and request.path == METRICS_PATH:
+            return self.metrics(request)
+        response = self.get_response(request)
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None:
+            # WSGI environ is shared with gunicorn logger
+            request.META[ROUTE_ENVIRON_KEY] = getattr(resolver_match, 'route', None) or resolver_match.view_name
+        return response
+
+    def metrics(self, request):
+        """Returns the histograms of all workers"""
+        if not METRICS_FILE or not os.path.exists(METRICS_FILE):
+            return HttpResponseNotFound("metrics: not enabled")
+        if self.histograms is None:
+            self.histograms = SharedHistograms(METRICS_FILE)
+        return HttpResponse(self.histograms.to_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
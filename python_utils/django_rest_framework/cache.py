@@ -0,0 +1,269 @@
+"""
+Cache of upstream responses for proxy views. Entries are fresh for the upstream `Cache-Control` max-age (or the view
+TTL), then served stale while they are refreshed in background for `stale_while_revalidate` seconds, and then
+revalidated with a conditional request (`If-None-Match`/`If-Modified-Since`) if the upstream sent validators.
+"""
+import collections
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+from python_utils.generic.circuit_breaker import CircuitOpenError
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+DEFAULT_STALE_WHILE_REVALIDATE = 0
+# Seconds entries with validators are kept after getting stale, to be revalidated
+DEFAULT_KEEP_TTL = 3600
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_KEY_PREFIX = 'upstream_response'
+
+
+def parse_cache_control(value):
+    """Returns a dict with the directives of a Cache-Control header. Directives without value are True"""
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if not name:
+            continue
+        argument = argument.strip('"')
+        try:
+            directives[name.lower()] = int(argument) if argument else True
+        except ValueError:
+            directives[name.lower()] = argument
+    return directives
+
+
+class LocalUpstreamCacheBackend:
+    """In process cache, bounded by number of entries (least recently used are evicted)"""
+    shared = False
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the value of a key, or None if it is not stored or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        """Stores a value for `timeout` seconds"""
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class DjangoUpstreamCacheBackend:
+    """Backend on a Django cache, shared by all the processes using it"""
+    shared = True
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        """Returns the value of a key, or None if it is not stored or expired"""
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout):
+        """Stores a value for `timeout` seconds"""
+        self.cache.set(key, value, timeout)
+
+
+class UpstreamCache:
+    """
+    Caches upstream GET responses (status and parsed JSON data). Some parameters:
+    - backend: `LocalUpstreamCacheBackend` (default) or `DjangoUpstreamCacheBackend`
+    - ttl: seconds responses are fresh if the upstream does not send a max-age
+    - stale_while_revalidate: seconds stale responses are served while refreshed in background, if the upstream does
+      not send a stale-while-revalidate directive
+    - keep_ttl: seconds stale responses with ETag or Last-Modified are kept to be revalidated
+
+    Only 200 responses are stored, and never with `no-store` or `private` directives. Stored responses, even stale,
+    are served while the circuit of the upstream is open. Every caller gets its own copy of the cached data.
+
+    Freshness is measured with `time.monotonic`, except with shared backends: their entries are read by other
+    processes and hosts, whose monotonic clocks are unrelated, so they use the wall clock.
+    """
+
+    def __init__(self, backend=None, ttl=DEFAULT_TTL, stale_while_revalidate=DEFAULT_STALE_WHILE_REVALIDATE,
+                 keep_ttl=DEFAULT_KEEP_TTL, key_prefix=DEFAULT_KEY_PREFIX):
+        self.backend = backend or LocalUpstreamCacheBackend()
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.keep_ttl = keep_ttl
+        self.key_prefix = key_prefix
+        self.refreshing = set()
+        self.prefetching = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.refreshes = 0
+        self.circuit_open_hits = 0
+
+    def get_key(self, url, params=None, headers=None):
+        """Returns the key of an upstream request, by url, query parameters and forwarded headers, so responses that
+        depend on them (language, credentials) are not shared"""
+        parts = json.dumps([url, sorted((params or {}).items()), sorted((headers or {}).items())], default=str)
+        return '{}:{}'.format(self.key_prefix, hashlib.sha1(parts.encode('utf-8')).hexdigest())
+
+    def now(self):
+        """Returns the current time to measure freshness with"""
+        return time.time() if getattr(self.backend, 'shared', True) else time.monotonic()
+
+    @staticmethod
+    def get_result(entry):
+        """Returns the status, a copy of the data and if there is data of an entry"""
+        return entry['status'], copy.deepcopy(entry['data']), entry['has_data']
+
+    def is_fresh(self, key):
+        """Returns if a key has a fresh entry"""
+        entry = self.backend.get(key)
+        return entry is not None and self.now() < entry['fresh_until']
+
+    @staticmethod
+    def parse_response(response):
+        """Returns the status of a response, its JSON data and if it is JSON"""
+        try:
+            return response.status_code, response.json(), True
+        except ValueError:
+            return response.status_code, None, False
+
+    def store(self, key, response, ttl=None, stale_while_revalidate=None, entry=None):
+        """Stores a response, or refreshes the entry on 304 responses. Returns the entry, or None if not cacheable"""
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        if 'no-store' in directives or 'private' in directives:
+            return None
+        if response.status_code == 304 and entry is not None:
+            entry = dict(entry)
+        elif response.status_code == 200:
+            status, data, has_data = self.parse_response(response)
+            entry = {'status': status, 'data': data, 'has_data': has_data}
+        else:
+            return None
+        max_age = directives.get('s-maxage', directives.get('max-age'))
+        if 'no-cache' in directives:
+            max_age = 0
+        if not isinstance(max_age, int):
+            max_age = self.ttl if ttl is None else ttl
+        stale = directives.get('stale-while-revalidate')
+        if not isinstance(stale, int):
+            stale = self.stale_while_revalidate if stale_while_revalidate is None else stale_while_revalidate
+        entry['etag'] = response.headers.get('ETag', entry.get('etag'))
+        entry['last_modified'] = response.headers.get('Last-Modified', entry.get('last_modified'))
+        now = self.now()
+        entry['fresh_until'] = now + max_age
+        entry['stale_until'] = now + max_age + stale
+        keep = self.keep_ttl if entry['etag'] or entry['last_modified'] else 0
+        timeout = max_age + stale + keep
+        if timeout > 0:
+            self.backend.set(key, entry, timeout)
+        return entry
+
+    @staticmethod
+    def get_conditional_headers(entry):
+        """Returns the headers to revalidate an entry"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def refresh(self, key, fetch, ttl, stale_while_revalidate, entry):
+        """Revalidates an entry in background, once at a time for every key"""
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def run():
+            try:
+                self.store(key, fetch(self.get_conditional_headers(entry)), ttl, stale_while_revalidate, entry)
+                self.refreshes += 1
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.warning('Upstream refresh failed', exc_info=True)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def claim_prefetch(self, key):
+        """Marks a key as being prefetched. Returns False if it already is, so every key is prefetched once at a
+        time. Release it with `release_prefetch`"""
+        with self.lock:
+            if key in self.prefetching:
+                return False
+            self.prefetching.add(key)
+            return True
+
+    def release_prefetch(self, key):
+        """Marks a key as no longer being prefetched"""
+        with self.lock:
+            self.prefetching.discard(key)
+
+    def get(self, key, fetch, ttl=None, stale_while_revalidate=None):
+        """Returns the status, data and if there is data of a request, from the cache or fetching it.
+
+        :param callable fetch: makes the upstream request with the extra headers passed, and returns the response
+        :param int ttl: seconds fresh if the upstream does not send a max-age. Cache `ttl` by default
+        :param int stale_while_revalidate: seconds served stale. Cache `stale_while_revalidate` by default
+        """
+        entry = self.backend.get(key)
+        now = self.now()
+        if entry is not None:
+            if now < entry['fresh_until']:
+                self.hits += 1
+                return self.get_result(entry)
+            if now < entry['stale_until']:
+                self.stale_hits += 1
+                self.refresh(key, fetch, ttl, stale_while_revalidate, entry)
+                return self.get_result(entry)
+        self.misses += 1
+        try:
+            response = fetch(self.get_conditional_headers(entry) if entry is not None else {})
+        except CircuitOpenError:
+            if entry is None:
+                raise
+            self.circuit_open_hits += 1
+            return self.get_result(entry)
+        if response.status_code == 304 and entry is not None:
+            self.revalidations += 1
+            self.store(key, response, ttl, stale_while_revalidate, entry)
+            return self.get_result(entry)
+        entry = self.store(key, response, ttl, stale_while_revalidate)
+        if entry is None:
+            return self.parse_response(response)
+        return self.get_result(entry)
+
+    def stats(self):
+        """Returns a dict with fresh hits, stale hits, misses, 304 revalidations, background refreshes and stale
+        responses served with the circuit open
+        """
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'refreshes': self.refreshes,
+            'circuit_open_hits': self.circuit_open_hits,
+        }
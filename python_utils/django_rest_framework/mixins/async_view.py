@@ -0,0 +1,52 @@
+"""
+Async proxy views, for ASGI deployments. Upstream requests are awaited on a pooled `httpx.AsyncClient`, so a worker
+serves many concurrent proxy requests without a thread for each one. Use them with Django async views, combined with
+ProxyDjangoViewMixin or ProxyEveViewMixin, as in `class MyView(AsyncProxyGetViewMixin, ProxyDjangoViewMixin, View)`
+"""
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from python_utils.generic.defaults import (DEFAULT_ASYNC_KEEPALIVE_EXPIRY, DEFAULT_ASYNC_MAX_CONNECTIONS,
+                                           DEFAULT_POOL_MAXSIZE, DEFAULT_REQUEST_TIMEOUT, DEFAULT_RETRY_TOTAL)
+from python_utils.generic.sessions import AsyncClientRegistry, get_httpx_timeout
+
+# Upstream async clients shared by all async proxy views of the process
+ASYNC_CLIENTS = AsyncClientRegistry(
+    max_connections=getattr(settings, 'REQUESTS_ASYNC_MAX_CONNECTIONS', DEFAULT_ASYNC_MAX_CONNECTIONS),
+    max_keepalive_connections=getattr(settings, 'REQUESTS_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+    keepalive_expiry=getattr(settings, 'REQUESTS_ASYNC_KEEPALIVE_EXPIRY', DEFAULT_ASYNC_KEEPALIVE_EXPIRY),
+    retries=getattr(settings, 'REQUESTS_MAX_RETRIES', DEFAULT_RETRY_TOTAL),
+)
+
+
+class AsyncProxyGetViewMixin():
+    """
+    Async version of ProxyGetViewMixin. Could be customized:
+    - timeout: default timeout of this request
+    - clients: registry of the pooled async clients used for the upstream requests
+    """
+    timeout = getattr(settings, 'REQUESTS_TIMEOUT', DEFAULT_REQUEST_TIMEOUT)
+    clients = ASYNC_CLIENTS
+
+    async def fetch(self, url, headers, params):
+        """Makes the upstream get request and returns the response"""
+        client = await self.clients.get_client()
+        return await client.get(url, headers=headers, params=params, timeout=get_httpx_timeout(self.timeout))
+
+    async def get_data(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        """Makes a get request and format data"""
+        res = await self.fetch(self.get_url(), self.get_headers(), self.get_query_params())
+        try:
+            data = res.json()
+        except ValueError:
+            return self.get_custom_response(res.status_code, None, has_data=False)
+        return self.get_custom_response(res.status_code, data)
+
+    async def get(self, request, *args, **kwargs):
+        """Makes a get request and format the response"""
+        if not hasattr(request, 'query_params'):
+            # Plain Django requests, for the query parameter management of the proxy mixins
+            request.query_params = request.GET
+        custom_response = await self.get_data(request, *args, **kwargs)
+        if 'data' not in custom_response:
+            return HttpResponse(status=custom_response['status'])
+        return JsonResponse(custom_response['data'], status=custom_response['status'], safe=False)
@@ -1,16 +1,103 @@
 """View related mixin classes"""
+import collections
 import copy
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from functools import partial
 
-import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
 from django.utils import translation
-from python_utils.generic.defaults import DEFAULT_REQUEST_TIMEOUT
+from python_utils.generic.circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from python_utils.generic.defaults import (DEFAULT_AGGREGATION_WORKERS, DEFAULT_CIRCUIT_FAILURE_THRESHOLD,
+                                           DEFAULT_CIRCUIT_MIN_REQUESTS, DEFAULT_CIRCUIT_RESET_TIMEOUT,
+                                           DEFAULT_CIRCUIT_WINDOW, DEFAULT_FETCH_ALL_WORKERS, DEFAULT_HEDGE_BURST,
+                                           DEFAULT_HEDGE_MAX_RATIO, DEFAULT_HEDGE_WORKERS, DEFAULT_POOL_BLOCK,
+                                           DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, DEFAULT_REQUEST_TIMEOUT,
+                                           DEFAULT_RETRY_BACKOFF_FACTOR, DEFAULT_RETRY_STATUSES, DEFAULT_RETRY_TOTAL,
+                                           DEFAULT_STREAM_CHUNK_SIZE)
+from python_utils.generic.hedging import Hedger, LatencyTracker
+from python_utils.generic.json_stream import filter_json_keys
+from python_utils.generic.sessions import SessionRegistry, get_host_key
+from python_utils.generic.single_flight import SingleFlight
 from rest_framework import permissions
 from rest_framework.response import Response
 
+# Upstream sessions shared by all proxy views of the process
+SESSIONS = SessionRegistry(
+    pool_connections=getattr(settings, 'REQUESTS_POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS),
+    pool_maxsize=getattr(settings, 'REQUESTS_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+    pool_block=getattr(settings, 'REQUESTS_POOL_BLOCK', DEFAULT_POOL_BLOCK),
+    max_retries=getattr(settings, 'REQUESTS_MAX_RETRIES', DEFAULT_RETRY_TOTAL),
+    backoff_factor=getattr(settings, 'REQUESTS_RETRY_BACKOFF_FACTOR', DEFAULT_RETRY_BACKOFF_FACTOR),
+    retry_statuses=getattr(settings, 'REQUESTS_RETRY_STATUSES', DEFAULT_RETRY_STATUSES),
+    keep_alive=getattr(settings, 'REQUESTS_KEEP_ALIVE', True),
+)
+# Upstream response headers passed through by streamed responses
+STREAM_FORWARDED_HEADERS = ('Cache-Control', 'ETag', 'Last-Modified')
+# Identical upstream requests in flight in the process, opt-in with the `REQUESTS_SINGLE_FLIGHT` setting
+SINGLE_FLIGHT = SingleFlight() if getattr(settings, 'REQUESTS_SINGLE_FLIGHT', False) else None
+# Latencies of the upstream requests by host
+LATENCIES = LatencyTracker()
+# Hedged upstream requests, opt-in with the `REQUESTS_HEDGE_PERCENTILE` setting
+HEDGER = Hedger(
+    max_ratio=getattr(settings, 'REQUESTS_HEDGE_MAX_RATIO', DEFAULT_HEDGE_MAX_RATIO),
+    workers=getattr(settings, 'REQUESTS_HEDGE_WORKERS', DEFAULT_HEDGE_WORKERS),
+    burst=getattr(settings, 'REQUESTS_HEDGE_BURST', DEFAULT_HEDGE_BURST),
+)
+# Circuit breakers by upstream host
+CIRCUIT_BREAKERS = CircuitBreakerRegistry(
+    failure_threshold=getattr(settings, 'REQUESTS_CIRCUIT_FAILURE_THRESHOLD', DEFAULT_CIRCUIT_FAILURE_THRESHOLD),
+    window=getattr(settings, 'REQUESTS_CIRCUIT_WINDOW', DEFAULT_CIRCUIT_WINDOW),
+    min_requests=getattr(settings, 'REQUESTS_CIRCUIT_MIN_REQUESTS', DEFAULT_CIRCUIT_MIN_REQUESTS),
+    reset_timeout=getattr(settings, 'REQUESTS_CIRCUIT_RESET_TIMEOUT', DEFAULT_CIRCUIT_RESET_TIMEOUT),
+) if getattr(settings, 'REQUESTS_CIRCUIT_BREAKER', False) else None
+# Threads making the upstream requests of aggregation views, full collection fetches and page prefetches, shared by
+# all of them to bound the process threads
+AGGREGATION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'REQUESTS_AGGREGATION_WORKERS', DEFAULT_AGGREGATION_WORKERS),
+    thread_name_prefix='proxy-aggregation')
+
+# Partial failure policies of aggregated upstreams
+ON_ERROR_FAIL = 'fail'
+ON_ERROR_NULL = 'null'
+ON_ERROR_OMIT = 'omit'
+
+
+class UpstreamPageError(Exception):
+    """Upstream page request failed while fetching a whole collection"""
+
+    def __init__(self, page, status):
+        super().__init__('Upstream page {} failed with status {}'.format(page, status))
+        self.page = page
+        self.status = status
+
+
+class UpstreamStream():
+    """
+    Chunks of a streamed upstream response. Django closes the content of a streaming response when the response is
+    closed, so closing it releases the pooled upstream connection even if the chunks were never iterated (client
+    disconnected, HEAD request or response replaced by a middleware)
+    """
+
+    def __init__(self, chunks, res):
+        self.chunks = chunks
+        self.res = res
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        """Closes the chunks iterator and the upstream response"""
+        try:
+            close = getattr(self.chunks, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.res.close()
+
 
 class ActionViewMixin():  # pylint: disable=too-few-public-methods
     """View that performs an action"""
@@ -31,21 +118,34 @@ class ProxyBaseViewMixin():
     """
     Custom API view to perform a proxy request. Some fields to define:
     - upstream: destination endpoint. Can have parameters to be filled with format function or can be a partial
+    - keys_to_remove: keys to remove from response JSON
     """
     upstream = None
+    keys_to_remove = ()
 
     def get_headers(self):
         """Passes through the language"""
         return {'Accept-Language': translation.get_language()}
 
-    def get_url(self):
-        """Completes the url against kwargs"""
-        if isinstance(self.upstream, str):
-            return self.upstream.format(**self.kwargs)
-        if isinstance(self.upstream, partial):
-            return self.upstream(**self.kwargs)  # pylint: disable=not-callable
+    def get_url(self, upstream=None):
+        """Completes the url (of `upstream` or the view one) against kwargs"""
+        upstream = self.upstream if upstream is None else upstream
+        if isinstance(upstream, str):
+            return upstream.format(**self.kwargs)
+        if isinstance(upstream, partial):
+            return upstream(**self.kwargs)  # pylint: disable=not-callable
         raise ValueError('upstream has to be an string or a partial')
 
+    def get_custom_response(self, status, data, has_data=True, keys_to_remove=None):
+        """Formats the upstream status and data, without `keys_to_remove` (the view ones by default)"""
+        keys_to_remove = self.keys_to_remove if keys_to_remove is None else keys_to_remove
+        custom_response = {'status': status}
+        if has_data:
+            if keys_to_remove and isinstance(data, dict):
+                data = {key: value for key, value in data.items() if key not in keys_to_remove}
+            custom_response['data'] = data
+        return custom_response
+
 
 class ProxyDjangoViewMixin(ProxyBaseViewMixin):
     """
@@ -81,6 +181,21 @@ class ProxyDjangoViewMixin(ProxyBaseViewMixin):
                 query_params[self.page_param] = parameter_value
         return query_params
 
+    @staticmethod
+    def get_page_total(data):
+        """Returns the total of items of the collection of a page, or None if unknown"""
+        return data.get('count') if isinstance(data, dict) else None
+
+    @staticmethod
+    def get_page_items(data):
+        """Returns the items of a page"""
+        return data.get('results', []) if isinstance(data, dict) else data
+
+    @staticmethod
+    def has_next_page(data):
+        """Returns if there is a page after a page"""
+        return isinstance(data, dict) and bool(data.get('next'))
+
 
 class ProxyEveViewMixin(ProxyBaseViewMixin):
     """
@@ -119,34 +234,379 @@ class ProxyEveViewMixin(ProxyBaseViewMixin):
                 query_params[self.page_param] = parameter_value
         return query_params
 
+    @staticmethod
+    def get_page_total(data):
+        """Returns the total of items of the collection of a page, or None if unknown (pagination optimized for
+        speed)
+        """
+        return data.get('_meta', {}).get('total') if isinstance(data, dict) else None
+
+    @staticmethod
+    def get_page_items(data):
+        """Returns the items of a page"""
+        return data.get('_items', []) if isinstance(data, dict) else data
+
+    @staticmethod
+    def has_next_page(data):
+        """Returns if there is a page after a page"""
+        return isinstance(data, dict) and 'next' in data.get('_links', {})
+
 
 class ProxyGetViewMixin():  # pylint: disable=too-few-public-methods
     """
     ProxyViewMixin with a default get method implementation. Could be customized:
     - timeout: default timeout of this request
+    - sessions: registry of the pooled sessions used for the upstream requests
+    - upstream_cache: `python_utils.django_rest_framework.cache.UpstreamCache` to cache upstream responses, if any
+    - cache_ttl: seconds upstream responses without max-age are fresh. The cache TTL if not set
+    - cache_stale_while_revalidate: seconds stale responses are served while refreshed. The cache default if not set
+    - single_flight: `python_utils.generic.single_flight.SingleFlight` that makes concurrent identical requests share
+      one upstream call, or None
+    - single_flight_timeout: max seconds waiting for an identical request in flight. By default, the request timeout
+    - stream_response: streams the upstream body to the client in chunks of `stream_chunk_size` bytes, instead of
+      parsing and rendering it. `keys_to_remove` are removed from JSON objects incrementally. Streamed responses are
+      neither cached nor shared by single flight
+    - latencies: `python_utils.generic.hedging.LatencyTracker` of the upstream latencies by host
+    - hedger: `python_utils.generic.hedging.Hedger` making the hedged requests
+    - hedge_percentile: percentile of the upstream latency after which a duplicate request is sent, and the first
+      response is taken. None disables hedging
+    - circuit_breakers: `python_utils.generic.circuit_breaker.CircuitBreakerRegistry` that makes requests to upstream
+      hosts failing (errors or 5xx statuses) fail fast with 503, or get the cached response if any. None disables it
+    - fetch_all_workers: max pages requested at once by `fetch_all`
+    - prefetch_next_page: gets the next page in background into the `upstream_cache` while serving a page
+    - executor: thread pool making the page requests of `fetch_all` and the page prefetches
     """
     timeout = getattr(settings, 'REQUESTS_TIMEOUT', DEFAULT_REQUEST_TIMEOUT)
+    sessions = SESSIONS
+    upstream_cache = None
+    cache_ttl = None
+    cache_stale_while_revalidate = None
+    single_flight = SINGLE_FLIGHT
+    single_flight_timeout = getattr(settings, 'REQUESTS_SINGLE_FLIGHT_TIMEOUT', None)
+    stream_response = False
+    stream_chunk_size = getattr(settings, 'REQUESTS_STREAM_CHUNK_SIZE', DEFAULT_STREAM_CHUNK_SIZE)
+    latencies = LATENCIES
+    hedger = HEDGER
+    hedge_percentile = getattr(settings, 'REQUESTS_HEDGE_PERCENTILE', None)
+    circuit_breakers = CIRCUIT_BREAKERS
+    fetch_all_workers = getattr(settings, 'REQUESTS_FETCH_ALL_WORKERS', DEFAULT_FETCH_ALL_WORKERS)
+    prefetch_next_page = False
+    executor = AGGREGATION_EXECUTOR
 
-    def get_data(self, request, *args, **kwargs):  # pylint: disable=unused-argument
-        """Makes a get request and format data"""
-        res = requests.get(url=self.get_url(), headers=self.get_headers(),
-                           params=self.get_query_params(), timeout=self.timeout)
-        custom_response = {'status': res.status_code}
+    def get_hedge_delay(self, host):
+        """Seconds to wait for the upstream before a hedged request, or None not to hedge"""
+        if self.hedge_percentile is None:
+            return None
+        return self.latencies.percentile(host, self.hedge_percentile)
+
+    def fetch(self, url, headers, params, timeout=None, stream=False):
+        """Returns a function that makes the upstream get request with some extra headers.
+
+        :raises CircuitOpenError: if the circuit of the upstream host is open
+        """
+        session = self.sessions.get_session(url)
+        timeout = self.timeout if timeout is None else timeout
+        host = get_host_key(url)
+        breaker = self.circuit_breakers.get(host) if self.circuit_breakers is not None else None
+
+        def fetch_with_headers(extra_headers=None):
+            request_headers = dict(headers, **extra_headers) if extra_headers else headers
+
+            def get():
+                start = time.monotonic()
+                try:
+                    return session.get(url=url, headers=request_headers, params=params, timeout=timeout, stream=stream)
+                finally:
+                    self.latencies.record(host, time.monotonic() - start)
+
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(host)
+            try:
+                delay = self.get_hedge_delay(host)
+                res = get() if delay is None else self.hedger.call(get, delay, discard=lambda lost: lost.close())
+            except Exception:
+                if breaker is not None:
+                    breaker.record(False)
+                raise
+            if breaker is not None:
+                breaker.record(res.status_code < 500)
+            return res
+
+        return fetch_with_headers
+
+    @staticmethod
+    def get_circuit_open_data():
+        """Data of the responses of upstreams with the circuit open"""
+        return {'detail': 'Upstream temporarily unavailable'}
+
+    def fetch_data(self, url, headers, params, timeout=None):
+        """Returns the upstream status, JSON data and if it is JSON, from the upstream cache if any"""
+        fetch = self.fetch(url, headers, params, timeout)
+        if self.upstream_cache is not None:
+            key = self.upstream_cache.get_key(url, params, headers)
+            try:
+                return self.upstream_cache.get(
+                    key, fetch, ttl=self.cache_ttl, stale_while_revalidate=self.cache_stale_while_revalidate)
+            except CircuitOpenError:
+                return 503, self.get_circuit_open_data(), True
+        try:
+            res = fetch()
+        except CircuitOpenError:
+            return 503, self.get_circuit_open_data(), True
         try:
-            custom_response['data'] = res.json()
-            if self.keys_to_remove:
-                for key_to_remove in self.keys_to_remove:
-                    custom_response['data'].pop(key_to_remove, None)
+            return res.status_code, res.json(), True
         except Exception:
-            pass
-        return custom_response
+            return res.status_code, None, False
+
+    def fetch_custom_response(self, url, headers, params):
+        """Gets the upstream response, from the upstream cache if any, and formats it"""
+        status, data, has_data = self.fetch_data(url, headers, params)
+        if self.prefetch_next_page and self.upstream_cache is not None and status == 200 and self.has_next_page(data):
+            self.prefetch(url, headers, params)
+        return self.get_custom_response(status, data, has_data)
+
+    def prefetch(self, url, headers, params):
+        """Gets the page after the one of `params` in background into the upstream cache, unless it is fresh there or
+        already being prefetched"""
+        try:
+            page = int(params.get(self.page_param) or 1)
+        except (TypeError, ValueError):
+            return
+        # As a query parameter of the request, for the same cache key
+        next_params = dict(params, **{self.page_param: str(page + 1)})
+        key = self.upstream_cache.get_key(url, next_params, headers)
+        if self.upstream_cache.is_fresh(key) or not self.upstream_cache.claim_prefetch(key):
+            return
+
+        def run():
+            try:
+                self.fetch_data(url, headers, next_params)
+            finally:
+                self.upstream_cache.release_prefetch(key)
+
+        try:
+            self.executor.submit(run)
+        except Exception:
+            self.upstream_cache.release_prefetch(key)
+            raise
+
+    def fetch_page(self, url, headers, params, page):
+        """Returns the data of an upstream page.
+
+        :raises UpstreamPageError: if the upstream does not answer the page with JSON data
+        """
+        status, data, has_data = self.fetch_data(url, headers, dict(params, **{self.page_param: str(page)}))
+        if status >= 400 or not has_data:
+            raise UpstreamPageError(page, status)
+        return data
+
+    def fetch_all(self):
+        """Yields the items of every upstream page, in order. After the first page, the next ones are requested
+        concurrently, `fetch_all_workers` at most, if the upstream returns the total of items. Items added or removed
+        meanwhile can shift the pages.
+
+        :raises UpstreamPageError: if a page request fails
+        """
+        url = self.get_url()
+        headers = self.get_headers()
+        params = self.get_query_params()
+        data = self.fetch_page(url, headers, params, 1)
+        items = self.get_page_items(data)
+        yield from items
+        total = self.get_page_total(data)
+        if total is None or not items:
+            page = 1
+            while self.has_next_page(data):
+                page += 1
+                data = self.fetch_page(url, headers, params, page)
+                yield from self.get_page_items(data)
+            return
+
+        pages = -(-total // len(items))
+        pending = collections.deque()
+        next_page = 2
+        try:
+            while pending or next_page <= pages:
+                while next_page <= pages and len(pending) < self.fetch_all_workers:
+                    pending.append(self.executor.submit(self.fetch_page, url, headers, params, next_page))
+                    next_page += 1
+                yield from self.get_page_items(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def get_single_flight_timeout(self):
+        """Max seconds waiting for an identical request in flight"""
+        if self.single_flight_timeout is not None:
+            return self.single_flight_timeout
+        if isinstance(self.timeout, (tuple, list)):
+            return sum(self.timeout)
+        return self.timeout
+
+    @staticmethod
+    def get_single_flight_key(url, headers, params):
+        """Returns the key identifying identical upstream requests"""
+        return (url, tuple(sorted((str(name), str(value)) for name, value in params.items())),
+                tuple(sorted(headers.items())))
+
+    def get_data(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        """Makes a get request and format data. Concurrent identical requests share the upstream call"""
+        url = self.get_url()
+        headers = self.get_headers()
+        params = self.get_query_params()
+        if self.single_flight is None:
+            return self.fetch_custom_response(url, headers, params)
+        # Views may format the response their own way
+        key = self.get_single_flight_key(url, headers, params) + (type(self), tuple(self.keys_to_remove or ()))
+        custom_response = self.single_flight.do(key, lambda: self.fetch_custom_response(url, headers, params),
+                                                timeout=self.get_single_flight_timeout())
+        # Callers sharing the result get their own copy, so changing it does not change the others
+        return copy.deepcopy(custom_response)
+
+    def iter_content(self, res):
+        """Yields the upstream body in chunks, without `keys_to_remove` if it is JSON, and closes the response"""
+        try:
+            content = res.iter_content(self.stream_chunk_size)
+            if self.keys_to_remove and 'json' in res.headers.get('Content-Type', ''):
+                content = filter_json_keys(content, self.keys_to_remove)
+            for chunk in content:
+                yield chunk
+        finally:
+            res.close()
+
+    def get_streaming_response(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        """Makes a get request and streams the upstream body"""
+        try:
+            res = self.fetch(self.get_url(), self.get_headers(), self.get_query_params(), stream=True)()
+        except CircuitOpenError:
+            return Response(status=503, data=self.get_circuit_open_data())
+        response = StreamingHttpResponse(UpstreamStream(self.iter_content(res), res), status=res.status_code,
+                                         content_type=res.headers.get('Content-Type', 'application/json'))
+        for name in STREAM_FORWARDED_HEADERS:
+            if name in res.headers:
+                response[name] = res.headers[name]
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/') and self.keys_to_remove and 'json' in response['Content-Type']:
+            # The body is not the upstream one byte by byte, but it is equivalent
+            response['ETag'] = 'W/' + etag
+        return response
 
     def get(self, request, *args, **kwargs):  # pylint: disable=unused-argument
         """Makes a get request and format the response"""
+        if self.stream_response:
+            return self.get_streaming_response(request, *args, **kwargs)
         custom_response = self.get_data(request, *args, **kwargs)
         return Response(**custom_response)
 
 
+class ProxyAggregateViewMixin(ProxyGetViewMixin, ProxyBaseViewMixin):
+    """
+    Proxy view that gets several upstreams concurrently and merges their data in one response, by upstream name.
+    Some fields to define:
+    - upstreams: dict by name of dicts with:
+        - upstream: destination endpoint, as the `upstream` of ProxyBaseViewMixin
+        - query_params: dict, view method name or function receiving the view that returns the query parameters
+        - keys_to_remove: keys to remove from response JSON
+        - timeout: timeout of this request, up to the `aggregation_timeout`. The view `timeout` by default
+        - on_error: if the upstream fails (connection error, error status or deadline), `ON_ERROR_FAIL` (default)
+          makes the view fail with its status (502 on connection errors, 504 on deadline), `ON_ERROR_NULL` returns
+          None as its data and `ON_ERROR_OMIT` leaves it out. Errors are returned in `_errors` by upstream name,
+          along with the data of the rest of upstreams, even if the view fails
+    - aggregation_timeout: max seconds waiting for all the upstreams. The sum of the request timeout by default
+    - executor: thread pool making the upstream requests
+    """
+    upstreams = {}
+    aggregation_timeout = getattr(settings, 'REQUESTS_AGGREGATION_TIMEOUT', None)
+    executor = AGGREGATION_EXECUTOR
+
+    def get_upstream_query_params(self, options):
+        """Returns the query parameters of an upstream"""
+        query_params = options.get('query_params')
+        if query_params is None:
+            return {}
+        if isinstance(query_params, str):
+            return getattr(self, query_params)()
+        if callable(query_params):
+            return query_params(self)
+        return copy.deepcopy(query_params)
+
+    def fetch_upstream(self, url, headers, params, timeout):
+        """Gets the status, data and if there is data of an upstream, sharing identical requests in flight"""
+        if self.single_flight is None:
+            return self.fetch_data(url, headers, params, timeout)
+        return copy.deepcopy(self.single_flight.do(self.get_single_flight_key(url, headers, params),
+                                                   lambda: self.fetch_data(url, headers, params, timeout),
+                                                   timeout=self.get_single_flight_timeout()))
+
+    def get_aggregation_timeout(self):
+        """Max seconds waiting for all the upstreams"""
+        if self.aggregation_timeout is not None:
+            return self.aggregation_timeout
+        if isinstance(self.timeout, (tuple, list)):
+            return sum(self.timeout)
+        return self.timeout
+
+    def get_upstream_timeout(self, options):
+        """Returns the timeout of an upstream request, not longer than the aggregation timeout, as the view does not
+        wait for it after that"""
+        timeout = options.get('timeout')
+        timeout = self.timeout if timeout is None else timeout
+        aggregation_timeout = self.get_aggregation_timeout()
+        if timeout is None or aggregation_timeout is None:
+            return timeout if aggregation_timeout is None else aggregation_timeout
+        if isinstance(timeout, (tuple, list)):
+            return tuple(min(part, aggregation_timeout) for part in timeout)
+        return min(timeout, aggregation_timeout)
+
+    def merge_data(self, results):
+        """Returns the response data of the data by upstream name. Override it for other layouts"""
+        return results
+
+    def get_data(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        """Makes the upstream get requests concurrently and merges their data"""
+        # Language and request bound values are read in the request thread
+        headers = self.get_headers()
+        futures = {}
+        for name, options in self.upstreams.items():
+            futures[name] = self.executor.submit(
+                self.fetch_upstream, self.get_url(options['upstream']), headers,
+                self.get_upstream_query_params(options), self.get_upstream_timeout(options))
+        wait(futures.values(), timeout=self.get_aggregation_timeout())
+
+        results = {}
+        errors = {}
+        status = 200
+        for name, future in futures.items():
+            options = self.upstreams[name]
+            if not future.done():
+                future.cancel()
+                error = {'status': 504, 'detail': 'Upstream deadline exceeded'}
+            elif future.exception() is not None:
+                error = {'status': 502, 'detail': str(future.exception())}
+            else:
+                upstream_status, data, has_data = future.result()
+                custom_response = self.get_custom_response(upstream_status, data, has_data,
+                                                           options.get('keys_to_remove', ()))
+                if upstream_status < 400:
+                    results[name] = custom_response.get('data')
+                    continue
+                error = {'status': upstream_status, 'detail': custom_response.get('data')}
+            errors[name] = error
+            on_error = options.get('on_error', ON_ERROR_FAIL)
+            if on_error == ON_ERROR_NULL:
+                results[name] = None
+            elif on_error == ON_ERROR_FAIL and status == 200:
+                status = error['status']
+
+        data = self.merge_data(results)
+        if errors:
+            if isinstance(data, dict):
+                data['_errors'] = errors
+            elif status != 200:
+                data = {'_errors': errors}
+        return {'status': status, 'data': data}
+
+
 class GetUserObjectMixin():  # pylint: disable=too-few-public-methods
     """
     Mixin class that overrides the get_object to use the user in the request
@@ -0,0 +1,233 @@
+"""
+Response cache for Eve GET endpoints. Encoded responses are stored by resource, lookup, query arguments (where,
+projection, sort, page...), Accept and Authorization headers. Every key includes a generation of the resource
+collection, that `MyMongo` increments on every write, so writes invalidate all the responses of every resource sharing
+the collection at once. Cached responses are served only to requests that Eve authorizes for the endpoint.
+
+Enable it passing a `ResponseCache` as `RESPONSE_CACHE` setting to an Eve app using `MyMongo`
+"""
+import collections
+import hashlib
+import threading
+import time
+
+from eve.auth import requires_auth
+from flask import current_app, g, request
+
+try:
+    from django.core.cache import caches
+except ImportError:  # pragma: no cover
+    caches = None
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 60
+DEFAULT_KEY_PREFIX = 'eve_response'
+CACHED_ENDPOINTS = ('resource', 'item_lookup', 'item_additional_lookup')
+# Auth configuration of the cached endpoints
+ENDPOINT_CLASSES = {'resource': 'resource', 'item_lookup': 'item', 'item_additional_lookup': 'item'}
+# Headers of the response not stored with it
+SKIPPED_HEADERS = ('content-length', 'set-cookie')
+
+
+class LocalCacheBackend:
+    """
+    In process cache, bounded by number of entries (least recently used are evicted) and time to live.
+    Generations are only incremented in the process writing, so with several processes (gunicorn workers) the others
+    serve outdated responses until their TTL: use `DjangoCacheBackend` there
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Returns the value of a key, or None if it is not stored or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Stores a value"""
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_generation(self, name):
+        """Returns the current generation of a name"""
+        return self.generations.get(name, 0)
+
+    def incr_generation(self, name):
+        """Increments the generation of a name"""
+        with self.lock:
+            self.generations[name] = self.generations.get(name, 0) + 1
+
+    def stats(self):
+        """Returns a dict with the number of entries, evictions and expirations"""
+        return {'entries': len(self.entries), 'evictions': self.evictions, 'expirations': self.expirations}
+
+
+class DjangoCacheBackend:
+    """Backend on a Django cache, shared by all the processes using it. Bounds are the ones of the Django cache"""
+
+    def __init__(self, alias='default', ttl=DEFAULT_TTL, key_prefix=DEFAULT_KEY_PREFIX):
+        if caches is None:
+            raise ImportError('django is required for DjangoCacheBackend')
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        """Returns the value of a key, or None if it is not stored or expired"""
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        """Stores a value"""
+        self.cache.set(key, value, self.ttl)
+
+    def get_generation(self, name):
+        """Returns the current generation of a name"""
+        return self.cache.get('{}:generation:{}'.format(self.key_prefix, name), 0)
+
+    def incr_generation(self, name):
+        """Increments the generation of a name"""
+        key = '{}:generation:{}'.format(self.key_prefix, name)
+        # Generations never expire, or old responses would be valid again
+        if not self.cache.add(key, 1, None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, None)
+
+    def stats(self):
+        """No stats available"""
+        return {}
+
+
+class ResponseCache:
+    """
+    Caches encoded responses of Eve GET endpoints, with their ETag. Some parameters:
+    - backend: `LocalCacheBackend` (default, for single process apps) or `DjangoCacheBackend`
+    - resources: names of the cached resources. All of them if not set
+
+    Responses embedding documents of other collections are not invalidated by writes on them, only by their TTL.
+    """
+
+    def __init__(self, backend=None, resources=None, key_prefix=DEFAULT_KEY_PREFIX):
+        self.backend = backend or LocalCacheBackend()
+        self.resources = set(resources) if resources is not None else None
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Registers the request hooks in the Flask app"""
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def get_resource(self):
+        """Returns the cached resource the current request gets, or None"""
+        if request.method != 'GET' or not request.endpoint:
+            return None
+        resource, _, endpoint = request.endpoint.partition('|')
+        if endpoint not in CACHED_ENDPOINTS or (self.resources is not None and resource not in self.resources):
+            return None
+        return resource
+
+    @staticmethod
+    def get_source(resource):
+        """Returns the collection of a resource"""
+        return current_app.config['SOURCES'][resource]['source']
+
+    def get_key(self, resource):
+        """Returns the cache key of the current request"""
+        source = self.get_source(resource)
+        parts = (
+            resource,
+            sorted(request.view_args.items()),
+            sorted(request.args.items(multi=True)),
+            request.headers.get('Accept'),
+            request.headers.get('Authorization'),
+        )
+        digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+        return '{}:{}:{}:{}'.format(self.key_prefix, source, self.backend.get_generation(source), digest)
+
+    def before_request(self):
+        """Returns the cached response of the request, if any"""
+        resource = self.get_resource()
+        if resource is None:
+            return None
+        key = self.get_key(resource)
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            # Kept with the generation read before getting the documents, so a response read before a write is not
+            # stored as valid after it
+            g.response_cache_key = key
+            return None
+        if 'DOMAIN' not in current_app.config:
+            return self.get_cached_response(entry)
+        # Eve authorizes requests in the endpoint, after this hook, so the cached response goes through the same check
+        endpoint_class = ENDPOINT_CLASSES[request.endpoint.partition('|')[2]]
+        return requires_auth(endpoint_class)(lambda resource: self.get_cached_response(entry))(resource)
+
+    def get_cached_response(self, entry):
+        """Returns the response of a cache entry, or 304 if the client has it"""
+        self.hits += 1
+        body, etag, headers = entry
+        if request.if_none_match.contains(etag):
+            self.not_modified += 1
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        return current_app.response_class(body, status=200, headers=headers)
+
+    def after_request(self, response):
+        """Stores successful responses of cache misses"""
+        key = g.pop('response_cache_key', None)
+        if key is None or response.status_code != 200 or response.is_streamed:
+            return response
+        body = response.get_data()
+        etag = response.get_etag()[0]
+        if etag is None:
+            etag = hashlib.sha1(body).hexdigest()
+            response.set_etag(etag)
+        headers = [(name, value) for name, value in response.headers if name.lower() not in SKIPPED_HEADERS]
+        self.backend.set(key, (body, etag, headers))
+        self.stores += 1
+        return response
+
+    def invalidate(self, resource):
+        """Invalidates the responses of every resource on the resource collection"""
+        self.backend.incr_generation(self.get_source(resource))
+        self.invalidations += 1
+
+    def stats(self):
+        """Returns a dict with hits, misses, 304 responses, stores, invalidations and backend stats"""
+        out = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'stores': self.stores,
+            'invalidations': self.invalidations,
+        }
+        out.update(self.backend.stats())
+        return out
@@ -1,19 +1,72 @@
 """Eve datetime manage utils"""
 import datetime
 import decimal
+import functools
 import json
 
+import pymongo
 from bson import ObjectId, decimal128
 from bson.dbref import DBRef
+from bson.errors import InvalidId
 from eve.io.mongo.mongo import Mongo, MongoJSONEncoder
+from eve.utils import config
+from flask import abort, current_app, stream_with_context
 
+from python_utils.eve.utils.serialization import (DEFAULT_CHUNK_SIZE, compile_plan, resolve_schema,
+                                                  serialize_documents)
 from python_utils.generic.datetime_utils import parse_datetime, print_datetime
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# Max number of formatted datetimes kept by the JSON encoders
+DATETIME_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def format_datetime(obj, tzinfo, fold):  # pylint: disable=unused-argument
+    """`print_datetime` of a datetime, cached by value, timezone and fold, as equal instants in other timezones are
+    printed differently. Stats in `format_datetime.cache_info()`"""
+    return print_datetime(obj)
+
+
+def encode_datetime(obj):
+    """Encodes a `datetime.datetime` in ISO_8601 format, from the cache of recently formatted ones"""
+    return format_datetime(obj, obj.tzinfo, obj.fold)
+
+
+def encode_dbref(obj):
+    """Encodes a `DBRef` as `eve.io.mongo.mongo.MongoJSONEncoder` does"""
+    out = {"$id": str(obj.id), "$ref": obj.collection}
+    if obj.database:
+        out["$db"] = obj.database
+    return out
+
 
 class MyMongoJSONEncoder(MongoJSONEncoder):
-    """Overwrites `eve.io.mongo.mongo.MongoJSONEncoder` to encode `datetime.datetime` objects to ISO_8601 format."""
+    """Overwrites `eve.io.mongo.mongo.MongoJSONEncoder` to encode `datetime.datetime` objects to ISO_8601 format.
+
+    Values are encoded looking up their exact type in `dispatch`, and any other value, subclasses included, goes
+    through the `MongoJSONEncoder` chain. Formatted datetimes are kept in an LRU cache of `DATETIME_CACHE_SIZE`.
+    """
+
+    dispatch = {
+        datetime.datetime: lambda self, obj: encode_datetime(obj),
+        ObjectId: lambda self, obj: str(obj),
+        DBRef: lambda self, obj: encode_dbref(obj),
+        decimal128.Decimal128: lambda self, obj: str(obj),
+        datetime.date: lambda self, obj: obj.isoformat(),
+        datetime.time: lambda self, obj: obj.isoformat(),
+        set: lambda self, obj: list(obj),
+    }
 
     def default(self, obj):  # pylint: disable=E0202
+        encode = self.dispatch.get(type(obj))
+        if encode is not None:
+            return encode(self, obj)
         if isinstance(obj, datetime.datetime):
             # convert any datetime to ISO_8601 format
             return print_datetime(obj)
@@ -21,27 +74,223 @@ class MyMongoJSONEncoder(MongoJSONEncoder):
         return super(MyMongoJSONEncoder, self).default(obj)
 
 
+class MyMongoORJSONEncoder(MyMongoJSONEncoder):
+    """`MyMongoJSONEncoder` that encodes with [orjson](https://github.com/ijl/orjson) if it is installed.
+    Output is compact and not ASCII escaped. Pretty printed responses, and any value orjson can not encode, are encoded
+    with `json`
+    """
+
+    def encode(self, o):
+        if orjson is None or self.indent is not None:
+            return super().encode(o)
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(o, default=self.default, option=option).decode('utf-8')
+        except TypeError:
+            return super().encode(o)
+
+
+# Documents read from the database at once by exports
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+# Min size in bytes of the NDJSON chunks yielded by exports
+DEFAULT_EXPORT_CHUNK_SIZE = 64 * 1024
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+BOOLEANS = {"1": True, "true": True, "0": False, "false": False}
+
+
+def serialize_objectid(value):
+    """Converts a value to `ObjectId`"""
+    return ObjectId(value) if value else None
+
+
+def serialize_integer(value):
+    """Converts a value to int"""
+    return int(value) if value is not None else None
+
+
+def serialize_float(value):
+    """Converts a value to float"""
+    return float(value) if value is not None else None
+
+
+def serialize_number(value):
+    """Converts a JSON number. Plain integers skip the JSON parser"""
+    if value is None:
+        return None
+    if type(value) is str and value.isdigit() and value.isascii() and (  # pylint: disable=unidiomatic-typecheck
+            value[0] != "0" or len(value) == 1):
+        return int(value)
+    return json.loads(value)
+
+
+def serialize_boolean(value):
+    """Converts a boolean or its string representation"""
+    return BOOLEANS[str(value).lower()]
+
+
+def serialize_dbref(value):
+    """Converts a dict to `DBRef`"""
+    if value is None:
+        return None
+    return DBRef(value["$col"], value["$id"], value["$db"] if "$db" in value else None)
+
+
+def serialize_decimal(value):
+    """Converts a value to `Decimal128`"""
+    return decimal128.Decimal128(decimal.Decimal(str(value))) if value is not None else None
+
+
 class MyMongo(Mongo):
     """Overwrites `eve.io.mongo.mongo.Mongo` to change datetime serializer and json encoder class.
-    This class can be passed to Eve constructor as `data` argument - -> app = Eve(data=MyMongo)"""
+    This class can be passed to Eve constructor as `data` argument - -> app = Eve(data=MyMongo)
+
+    `serialize_documents` converts batches of documents with a plan compiled once per resource schema, with the same
+    results as Eve `serialize`.
+
+    A `python_utils.eve.utils.cache.ResponseCache` passed as `RESPONSE_CACHE` setting caches GET responses, and writes
+    invalidate them.
+
+    `export_ndjson` streams a whole resource as NDJSON."""
 
     serializers = {
-        "objectid": lambda value: ObjectId(value) if value else None,
+        "objectid": serialize_objectid,
         "datetime": parse_datetime,
-        "integer": lambda value: int(value) if value is not None else None,
-        "float": lambda value: float(value) if value is not None else None,
-        "number": lambda val: json.loads(val) if val is not None else None,
-        "boolean": lambda v: {"1": True, "true": True, "0": False, "false": False}[
-            str(v).lower()
-        ],
-        "dbref": lambda value: DBRef(
-            value["$col"], value["$id"], value["$db"] if "$db" in value else None
-        )
-        if value is not None
-        else None,
-        "decimal": lambda value: decimal128.Decimal128(decimal.Decimal(str(value)))
-        if value is not None
-        else None,
+        "integer": serialize_integer,
+        "float": serialize_float,
+        "number": serialize_number,
+        "boolean": serialize_boolean,
+        "dbref": serialize_dbref,
+        "decimal": serialize_decimal,
     }
 
     json_encoder_class = MyMongoJSONEncoder
+
+    def __init__(self, app):
+        self.serialization_plans = {}
+        self.response_cache = None
+        super().__init__(app)
+
+    def init_app(self, app):
+        super().init_app(app)
+        self.response_cache = app.config.get("RESPONSE_CACHE")
+        if self.response_cache is not None:
+            self.response_cache.init_app(app)
+
+    def invalidate_response_cache(self, resource):
+        """Invalidates the cached responses of the resource collection"""
+        if self.response_cache is not None:
+            self.response_cache.invalidate(resource)
+
+    def insert(self, resource, doc_or_docs):
+        try:
+            return super().insert(resource, doc_or_docs)
+        finally:
+            self.invalidate_response_cache(resource)
+
+    def update(self, resource, id_, updates, original):
+        try:
+            return super().update(resource, id_, updates, original)
+        finally:
+            self.invalidate_response_cache(resource)
+
+    def replace(self, resource, id_, document, original):
+        try:
+            return super().replace(resource, id_, document, original)
+        finally:
+            self.invalidate_response_cache(resource)
+
+    def remove(self, resource, lookup):
+        try:
+            return super().remove(resource, lookup)
+        finally:
+            self.invalidate_response_cache(resource)
+
+    def get_serialization_plan(self, resource):
+        """Returns the serialization plan of a resource, compiled the first time"""
+        plan = self.serialization_plans.get(resource)
+        if plan is None:
+            schema = resolve_schema(config.DOMAIN[resource]["schema"])
+            plan = self.serialization_plans[resource] = compile_plan(schema, self.serializers)
+        return plan
+
+    def serialize_documents(self, resource, documents, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Converts a list of documents of a resource in place as Eve `serialize` does, and returns them.
+        Optionally in `workers` threads, by chunks of `chunk_size` documents
+        """
+        plan = self.get_serialization_plan(resource)
+        return serialize_documents(documents, plan, resource, workers=workers, chunk_size=chunk_size)
+
+    def parse_resume_token(self, resource, resume_token):
+        """Returns the id a resume token (the id of the last exported document, as encoded) refers to.
+
+        :raises ValueError: if the token is empty or does not convert to an id, not to restart the export
+        """
+        if resume_token == "":
+            raise ValueError("Empty resume token")
+        id_field = config.DOMAIN[resource]["id_field"]
+        id_schema = config.DOMAIN[resource]["schema"].get(id_field) or {}
+        serializer = self.serializers.get(id_schema.get("type", "objectid"))
+        try:
+            after = serializer(resume_token) if serializer is not None else resume_token
+        except (InvalidId, TypeError) as error:
+            raise ValueError("Invalid resume token") from error
+        if after is None:
+            raise ValueError("Invalid resume token")
+        return after
+
+    def export_ndjson(self, resource, lookup=None, resume_token=None, batch_size=DEFAULT_EXPORT_BATCH_SIZE,
+                      chunk_size=DEFAULT_EXPORT_CHUNK_SIZE):
+        """Returns a generator of UTF-8 NDJSON chunks with the documents of a resource, encoded with
+        `json_encoder_class`. Documents are read by batches of `batch_size` sorted by id, so memory is bounded and
+        an export can be resumed passing the id of the last document received as `resume_token`.
+
+        :param dict lookup: optional MongoDB query. Resource filter, soft deletes and user restricted access apply
+        :param int chunk_size: min size in bytes of the chunks, that always end with a complete line
+        :raises ValueError: if the resume token is empty or not a valid id of the resource
+        """
+        after = self.parse_resume_token(resource, resume_token) if resume_token is not None else None
+        return self.iter_ndjson(resource, lookup, after, batch_size, chunk_size)
+
+    def iter_ndjson(self, resource, lookup, after, batch_size, chunk_size):
+        """Generator of `export_ndjson`"""
+        id_field = config.DOMAIN[resource]["id_field"]
+        datasource, query, projection, _ = self._datasource_ex(resource, lookup)
+        if config.DOMAIN[resource]["soft_delete"]:
+            deleted_query = {config.DELETED: {"$ne": True}}
+            query = self.combine_queries(query, deleted_query) if query else deleted_query
+        collection = self.pymongo(resource).db[datasource]
+        encoder = self.json_encoder_class()
+
+        lines = []
+        size = 0
+        while True:
+            batch_query = query
+            if after is not None:
+                after_query = {id_field: {"$gt": after}}
+                batch_query = self.combine_queries(query, after_query) if query else after_query
+            cursor = collection.find(batch_query, projection or None).sort(id_field, pymongo.ASCENDING)
+            documents = list(cursor.limit(batch_size))
+            for document in documents:
+                line = (encoder.encode(document) + "\n").encode("utf-8")
+                lines.append(line)
+                size += len(line)
+                if size >= chunk_size:
+                    yield b"".join(lines)
+                    lines = []
+                    size = 0
+            if len(documents) < batch_size:
+                break
+            after = documents[-1][id_field]
+        if lines:
+            yield b"".join(lines)
+
+    def export_response(self, resource, lookup=None, resume_token=None, **kwargs):
+        """Returns a streaming Flask response with `export_ndjson` output. Invalid resume tokens get a 400 response"""
+        try:
+            chunks = self.export_ndjson(resource, lookup, resume_token, **kwargs)
+        except ValueError:
+            abort(400, description="Invalid resume token")
+        return current_app.response_class(stream_with_context(chunks), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,149 @@
+"""
+Serialization plans. Eve `serialize` walks the resource schema for every field of every document it receives. A plan
+is that walk done once: the fields that need a conversion with the converter to apply, nested plans for embedded
+documents, and Eve `serialize` itself for the less usual rules (`*of` rules, `items`, `valueschema`, lists of lists...)
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from bson.errors import InvalidId
+from cerberus import rules_set_registry, schema_registry
+from eve.methods.common import normalize_dotted_fields, serialize
+from eve.utils import config
+from flask import current_app
+
+X_OF_RULES = ('allof', 'anyof', 'oneof', 'noneof', 'allof_type', 'anyof_type', 'oneof_type', 'noneof_type')
+# Errors that leave the value as is, to be reported by validation, as `eve.methods.common.serialize_value` does
+SERIALIZE_ERRORS = (KeyError, ValueError, TypeError, InvalidId)
+
+# Every step of a plan is a tuple of: kind, if single values are converted to lists (`AUTO_CREATE_LISTS` setting),
+# converter or nested plan, and field schema
+STEP_VALUE = 'value'
+STEP_LIST = 'list'
+STEP_DICT = 'dict'
+STEP_DICTS = 'dicts'
+STEP_SERIALIZE = 'serialize'
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def resolve_schema(schema):
+    """Returns the schema, looking it up in the registry if it is a name"""
+    return schema if isinstance(schema, dict) else schema_registry.get(schema)
+
+
+def compile_step(field_schema, serializers):
+    """Returns the step of a field schema, or None if its values are not converted"""
+    if not isinstance(field_schema, dict):
+        field_schema = rules_set_registry.get(field_schema)
+        if not isinstance(field_schema, dict):
+            return (STEP_SERIALIZE, False, None, field_schema)
+    field_type = field_schema.get('type')
+    if (not isinstance(field_type, str) or 'items' in field_schema or 'valueschema' in field_schema
+            or any(rule in field_schema for rule in X_OF_RULES)):
+        return (STEP_SERIALIZE, False, None, field_schema)
+    auto_list = field_type == 'list'
+    if 'schema' not in field_schema:
+        if field_type in serializers:
+            return (STEP_VALUE, auto_list, serializers[field_type], field_schema)
+        return (STEP_VALUE, auto_list, None, field_schema) if auto_list else None
+
+    inner_schema = resolve_schema(field_schema['schema'])
+    if not isinstance(inner_schema, dict):
+        return (STEP_SERIALIZE, False, None, field_schema)
+    if field_type == 'dict':
+        if 'schema' in inner_schema:
+            return (STEP_SERIALIZE, False, None, field_schema)
+        return (STEP_DICT, False, compile_plan(inner_schema, serializers), field_schema)
+    inner_type = inner_schema.get('type')
+    if field_type != 'list' or not isinstance(inner_type, str) or inner_type == 'list':
+        return (STEP_SERIALIZE, False, None, field_schema)
+    if inner_type == 'dict':
+        if not isinstance(inner_schema.get('schema'), dict):
+            return (STEP_SERIALIZE, False, None, field_schema)
+        return (STEP_DICTS, True, compile_plan(inner_schema['schema'], serializers), field_schema)
+    return (STEP_LIST, True, serializers.get(inner_type), field_schema)
+
+
+def compile_plan(schema, serializers):
+    """Returns a dict with the steps of the fields of a schema that need any conversion.
+
+    :param dict schema: Eve resource schema
+    :param dict serializers: converters by field type, as `eve.io.base.DataLayer.serializers`
+    """
+    plan = {}
+    for field, field_schema in schema.items():
+        step = compile_step(field_schema, serializers)
+        if step is not None:
+            plan[field] = step
+    return plan
+
+
+def apply_plan(document, plan, auto_create_lists, resource=None):
+    """Converts the fields of a document in place, with the same results as Eve `serialize`"""
+    for field, value in document.items():
+        if value is None:
+            continue
+        step = plan.get(field)
+        if step is None:
+            continue
+        kind, auto_list, converter, field_schema = step
+        if auto_list and auto_create_lists and not isinstance(value, list):
+            value = document[field] = [value]
+        if kind is STEP_VALUE:
+            if converter is not None:
+                try:
+                    document[field] = converter(value)
+                except SERIALIZE_ERRORS:
+                    pass
+        elif kind is STEP_DICT:
+            if type(value) is dict:  # pylint: disable=unidiomatic-typecheck
+                normalize_dotted_fields(value)
+                apply_plan(value, converter, auto_create_lists)
+        elif kind is STEP_SERIALIZE or not isinstance(value, list):
+            # Eve iterates other values in its own way, or fails
+            serialize(document, resource, schema={field: field_schema}, fields=[field])
+        elif kind is STEP_LIST:
+            if converter is not None:
+                for position, item in enumerate(value):
+                    try:
+                        value[position] = converter(item)
+                    except SERIALIZE_ERRORS:
+                        pass
+        else:
+            for subdocument in value:
+                if type(subdocument) is dict:  # pylint: disable=unidiomatic-typecheck
+                    normalize_dotted_fields(subdocument)
+                    apply_plan(subdocument, converter, auto_create_lists)
+    return document
+
+
+def serialize_documents(documents, plan, resource, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Converts a list of documents of a resource in place with its plan, and returns them.
+
+    :param int workers: threads to convert chunks of `chunk_size` documents with. They only help with converters that
+        release the GIL, the default is to convert in the calling thread
+    """
+    resource_normalize = config.DOMAIN[resource]['normalize_dotted_fields']
+    auto_create_lists = config.AUTO_CREATE_LISTS
+
+    def serialize_chunk(chunk):
+        for document in chunk:
+            if resource_normalize:
+                normalize_dotted_fields(document)
+            apply_plan(document, plan, auto_create_lists, resource)
+
+    if not workers or len(documents) <= chunk_size:
+        serialize_chunk(documents)
+        return documents
+
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+
+    def serialize_chunk_in_app(chunk):
+        with app.app_context():
+            serialize_chunk(chunk)
+
+    chunks = [documents[start:start + chunk_size] for start in range(0, len(documents), chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(serialize_chunk_in_app, chunks):
+            pass
+    return documents
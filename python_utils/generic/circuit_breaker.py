@@ -0,0 +1,108 @@
+"""
+Circuit breakers: once the error rate of an upstream crosses a threshold, calls to it fail fast for a while instead of
+waiting for timeouts, and then a single trial call decides if it is healthy again.
+"""
+import collections
+import threading
+import time
+
+from python_utils.generic.defaults import (DEFAULT_CIRCUIT_FAILURE_THRESHOLD, DEFAULT_CIRCUIT_MIN_REQUESTS,
+                                           DEFAULT_CIRCUIT_RESET_TIMEOUT, DEFAULT_CIRCUIT_WINDOW)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Call rejected because the circuit of the upstream is open"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one upstream. Thread safe. Some parameters:
+    - failure_threshold: ratio of failed calls, of the last `window` ones, that opens the circuit
+    - min_requests: calls needed in the window before opening it
+    - reset_timeout: seconds the circuit stays open before a trial call
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_CIRCUIT_FAILURE_THRESHOLD, window=DEFAULT_CIRCUIT_WINDOW,
+                 min_requests=DEFAULT_CIRCUIT_MIN_REQUESTS, reset_timeout=DEFAULT_CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.reset_timeout = reset_timeout
+        self.outcomes = collections.deque(maxlen=window)
+        self.failures = 0
+        self.state = STATE_CLOSED
+        self.opened_at = None
+        self.lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        """Returns if a call can be made. When the reset timeout is over, only one trial call is allowed"""
+        with self.lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and time.monotonic() >= self.opened_at + self.reset_timeout:
+                self.state = STATE_HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success):
+        """Records the outcome of an allowed call"""
+        with self.lock:
+            if self.state == STATE_HALF_OPEN:
+                if success:
+                    self.state = STATE_CLOSED
+                    self.outcomes.clear()
+                    self.failures = 0
+                else:
+                    self.open()
+                return
+            if len(self.outcomes) == self.outcomes.maxlen and not self.outcomes[0]:
+                self.failures -= 1
+            self.outcomes.append(success)
+            if not success:
+                self.failures += 1
+                if (self.state == STATE_CLOSED and len(self.outcomes) >= self.min_requests
+                        and self.failures >= self.failure_threshold * len(self.outcomes)):
+                    self.open()
+
+    def open(self):
+        """Opens the circuit. Called with the lock held"""
+        self.state = STATE_OPEN
+        self.opened_at = time.monotonic()
+        self.opened += 1
+
+    def stats(self):
+        """Returns a dict with the state, calls and failures in the window, rejected calls and times opened"""
+        return {
+            'state': self.state,
+            'requests': len(self.outcomes),
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'opened': self.opened,
+        }
+
+
+class CircuitBreakerRegistry:
+    """Circuit breakers by key (upstream host), created with the same parameters the first time they are used"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the circuit breaker of a key"""
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            with self.lock:
+                breaker = self.breakers.setdefault(key, CircuitBreaker(**self.kwargs))
+        return breaker
+
+    def stats(self):
+        """Returns a dict with the stats of every circuit breaker by key"""
+        return {key: breaker.stats() for key, breaker in list(self.breakers.items())}
@@ -11,8 +11,14 @@ import re
 
 import pytz
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
 utc = pytz.utc
 ZERO = datetime.timedelta(0)
+ONE_MINUTE = datetime.timedelta(minutes=1)
 
 DATETIME_RE = re.compile(
     r'(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})'
@@ -29,7 +35,10 @@ class FixedOffset(datetime.tzinfo):
     Kept as close as possible to the reference version. __init__ was changed
     to make its arguments optional, according to Python's requirement that
     tzinfo subclasses can be instantiated without arguments.
+
+    Instances are compared and hashed by offset, and shared through `get_fixed_timezone`.
     """
+    __slots__ = ('__offset', '__name')
 
     def __init__(self, offset=None, name=None):
         if offset is not None:
@@ -46,27 +55,49 @@ class FixedOffset(datetime.tzinfo):
     def dst(self, dt):
         return ZERO
 
+    def __eq__(self, other):
+        if not isinstance(other, FixedOffset):
+            return NotImplemented
+        return getattr(self, '_FixedOffset__offset', None) == getattr(other, '_FixedOffset__offset', None)
+
+    def __hash__(self):
+        return hash(getattr(self, '_FixedOffset__offset', None))
+
+    def __reduce__(self):
+        offset = getattr(self, '_FixedOffset__offset', None)
+        if offset is not None:
+            offset = offset // datetime.timedelta(minutes=1)
+        return (self.__class__, (offset, getattr(self, '_FixedOffset__name', None)))
+
+    def __repr__(self):
+        return '<FixedOffset {}>'.format(getattr(self, '_FixedOffset__name', None))
+
+
+# Shared FixedOffset instances by offset in minutes
+FIXED_TIMEZONES = {}
+MAX_FIXED_OFFSET = 24 * 60
+
 
 def get_fixed_timezone(offset):
     """
-    Returns a tzinfo instance with a fixed offset from UTC.
+    Returns a tzinfo instance with a fixed offset from UTC. Instances are shared by offset.
     """
     if isinstance(offset, datetime.timedelta):
         offset = offset.seconds // 60
+    tzinfo = FIXED_TIMEZONES.get(offset)
+    if tzinfo is not None:
+        return tzinfo
     sign = '-' if offset < 0 else '+'
     hhmm = '%02d%02d' % divmod(abs(offset), 60)
     name = sign + hhmm
-    return FixedOffset(offset, name)
-
-
-def parse_datetime(value):
-    """Parses a string and return a datetime.datetime.
+    tzinfo = FixedOffset(offset, name)
+    if abs(offset) < MAX_FIXED_OFFSET:
+        tzinfo = FIXED_TIMEZONES.setdefault(offset, tzinfo)
+    return tzinfo
 
-    This function supports time zone offsets. When the input contains one,
-    the output uses a timezone with a fixed offset from UTC.
 
-    Raises ValueError if the input is well formatted but not a valid datetime.
-    Returns None if the input isn't well formatted.
+def parse_datetime_regex(value):
+    """Parses a string and return a datetime.datetime with `DATETIME_RE`. See `parse_datetime`
 
     Copied from https://github.com/django/django/blob/1.11.16/django/utils/dateparse.py#L23
     """
@@ -89,6 +120,69 @@ def parse_datetime(value):
         return datetime.datetime(**kw)
 
 
+def parse_datetime_fast(value):
+    """Parses the usual fixed width ISO_8601 strings, `YYYY-MM-DDTHH:MM:SS[.ffffff][Z|+HH:MM|+HHMM|+HH]`, with
+    C implemented `datetime.datetime.fromisoformat`. Returns False for any other string or any error, so it is parsed
+    with `parse_datetime_regex` keeping its exact semantics.
+    """
+    length = len(value)
+    if (length < 19 or value[4] != '-' or value[7] != '-' or value[10] not in 'T ' or value[13] != ':'
+            or value[16] != ':' or not value.isascii()):
+        return False
+    try:
+        out = datetime.datetime.fromisoformat(value[:19])
+    except ValueError:
+        return False
+    if length == 19:
+        return out
+    position = 19
+    microsecond = 0
+    if value[position] == '.':
+        fraction = value[position + 1:]
+        fraction_length = len(fraction) - len(fraction.lstrip('0123456789'))
+        if not 0 < fraction_length <= 12:
+            return False
+        microsecond = int(fraction[:min(fraction_length, 6)].ljust(6, '0'))
+        position += fraction_length + 1
+    tzinfo = None
+    if position < length:
+        tz_value = value[position:]
+        if tz_value == 'Z':
+            tzinfo = pytz.utc
+        elif tz_value[0] in '+-' and len(tz_value) in (3, 5, 6) and tz_value[1:3].isdigit():
+            if len(tz_value) == 3:
+                offset_mins = 0
+            elif len(tz_value) == 6 and tz_value[3] != ':':
+                return False
+            elif tz_value[-2:].isdigit():
+                offset_mins = int(tz_value[-2:])
+            else:
+                return False
+            offset = 60 * int(tz_value[1:3]) + offset_mins
+            tzinfo = get_fixed_timezone(-offset if tz_value[0] == '-' else offset)
+        else:
+            return False
+    return datetime.datetime(out.year, out.month, out.day, out.hour, out.minute, out.second, microsecond, tzinfo)
+
+
+def parse_datetime(value):
+    """Parses a string and return a datetime.datetime.
+
+    This function supports time zone offsets. When the input contains one,
+    the output uses a timezone with a fixed offset from UTC.
+
+    Raises ValueError if the input is well formatted but not a valid datetime.
+    Returns None if the input isn't well formatted.
+
+    Usual fixed width strings are parsed by position, and the rest with the regex copied from
+    https://github.com/django/django/blob/1.11.16/django/utils/dateparse.py#L23
+    """
+    out = parse_datetime_fast(value)
+    if out is False:
+        return parse_datetime_regex(value)
+    return out
+
+
 def dt_is_aware(dt_value):
     """Check if a `datetime.datetime` object is timezone aware or not."""
     return dt_value.tzinfo is not None and dt_value.tzinfo.utcoffset(dt_value) is not None
@@ -110,6 +204,79 @@ def print_datetime(value):
     return value
 
 
+def parse_datetimes(values):
+    """Parses every string of an iterable with `parse_datetime`, lazily, so generators are not materialized.
+    Yields a `(datetime, error)` pair for every value instead of raising: `error` is the exception `parse_datetime`
+    would raise, or None. As in `parse_datetime`, `datetime` is None for values that are not well formatted.
+    """
+    for value in values:
+        try:
+            yield parse_datetime(value), None
+        except (TypeError, ValueError) as error:
+            yield None, error
+
+
+def print_datetimes(values):
+    """Formats every `datetime.datetime` of an iterable with `print_datetime`, lazily.
+    Yields a `(string, error)` pair for every value instead of raising: `error` is the exception `print_datetime`
+    would raise, or None.
+    """
+    for value in values:
+        try:
+            yield print_datetime(value), None
+        except (AttributeError, TypeError, ValueError) as error:
+            yield None, error
+
+
+def check_numpy():
+    """Raises ImportError if numpy is not installed"""
+    if np is None:
+        raise ImportError('numpy is required for datetime64 arrays')
+
+
+def parse_datetimes_array(values):
+    """Parses an iterable of strings to a NumPy `datetime64[us]` array in UTC. Offsets are removed in one vectorized
+    subtraction and naive datetimes are taken as UTC, as `print_datetime` does.
+    Returns the array and a boolean error mask, True (and NaT in the array) for the values that `parse_datetime`
+    returns None or raises for.
+    """
+    check_numpy()
+    naive = []
+    offsets = []
+    for value in values:
+        try:
+            out = parse_datetime(value)
+        except (TypeError, ValueError):
+            out = None
+        offset = out.utcoffset() if out is not None else None
+        if offset is None:
+            naive.append(out)
+            offsets.append(0)
+        else:
+            naive.append(out.replace(tzinfo=None))
+            offsets.append(offset // ONE_MINUTE)
+    out = np.array(naive, dtype='datetime64[us]')
+    mask = np.isnat(out)
+    out -= np.array(offsets, dtype='timedelta64[m]')
+    return out, mask
+
+
+def print_datetimes_array(values):
+    """Formats a NumPy `datetime64` array in UTC to ISO_8601 strings like `print_datetime` does, vectorized.
+    Returns a string array and a boolean error mask, True (and an empty string in the array) for NaT values.
+    """
+    check_numpy()
+    values = np.asarray(values, dtype='datetime64[us]')
+    mask = np.isnat(values)
+    seconds = values.astype('datetime64[s]')
+    microseconds = (values - seconds).astype(np.int64)
+    out = np.char.add(np.datetime_as_string(seconds, unit='s'),
+                      np.where(microseconds != 0, np.char.mod('.%06d', microseconds), ''))
+    out = np.char.add(out, 'Z')
+    out[mask] = ''
+    return out, mask
+
+
 def avoid_wrapping(value):
     """
     Avoid text wrapping in the middle of a phrase by adding non-breaking
@@ -215,3 +382,93 @@ def timeuntil(d, now=None, time_strings=None):
     Like timesince, but return a string measuring the time until the given time.
     """
     return timesince(d, now, reversed=True, time_strings=time_strings)
+
+
+def get_leapdays(d, now):
+    """Leap days to subtract from the time between d and now, as `timesince` does"""
+    leapdays = calendar.leapdays(d.year, now.year)
+    if leapdays != 0:
+        if calendar.isleap(d.year):
+            leapdays -= 1
+        elif calendar.isleap(now.year):
+            leapdays += 1
+    return leapdays
+
+
+def timesince_many(values, now=None, reversed=False, time_strings=None, use_numpy=False):
+    """
+    Like `timesince` for a sequence of datetimes and one `now`, returning a list of strings equal to the ones of
+    `timesince`. Templates are rendered once, leap days are computed once per pair of years and, if `now` is not
+    given, the current time is taken once. With `use_numpy` the units are computed with NumPy, for long sequences.
+    """
+    if time_strings is None:
+        time_strings = TIME_STRINGS
+    templates = [avoid_wrapping(time_strings[name]) for _, name in TIMESINCE_CHUNKS]
+    chunk_seconds = [seconds for seconds, _ in TIMESINCE_CHUNKS]
+    zero = avoid_wrapping('0 minutes')
+
+    if now and not isinstance(now, datetime.datetime):
+        now = datetime.datetime(now.year, now.month, now.day)
+    nows = {}
+    leapdays_by_years = {}
+    since_values = []
+    for d in values:
+        if not isinstance(d, datetime.datetime):
+            d = datetime.datetime(d.year, d.month, d.day)
+        d_now = now
+        if not d_now:
+            aware = is_aware(d)
+            d_now = nows.get(aware)
+            if d_now is None:
+                d_now = nows[aware] = datetime.datetime.now(utc if aware else None)
+        start, end = (d_now, d) if reversed else (d, d_now)
+        delta = end - start
+        years = (start.year, end.year)
+        leapdays = leapdays_by_years.get(years)
+        if leapdays is None:
+            leapdays = leapdays_by_years[years] = get_leapdays(start, end)
+        # ignore microseconds
+        since_values.append((delta.days - leapdays) * 24 * 60 * 60 + delta.seconds)
+
+    last = len(TIMESINCE_CHUNKS) - 1
+    if use_numpy:
+        check_numpy()
+        since = np.array(since_values, dtype=np.int64).reshape(-1)
+        seconds = np.array(chunk_seconds, dtype=np.int64)
+        counts = since[:, None] // seconds
+        indexes = np.argmax(counts != 0, axis=1)
+        first_counts = counts[np.arange(len(since)), indexes]
+        second_indexes = np.minimum(indexes + 1, last)
+        remainders = since - seconds[indexes] * first_counts
+        second_counts = np.where(indexes < last, remainders // seconds[second_indexes], 0)
+        rows = zip(since_values, indexes.tolist(), first_counts.tolist(), second_counts.tolist())
+    else:
+        rows = []
+        for since in since_values:
+            if since <= 0:
+                rows.append((since, 0, 0, 0))
+                continue
+            for i, seconds in enumerate(chunk_seconds):
+                count = since // seconds
+                if count != 0:
+                    break
+            count2 = (since - seconds * count) // chunk_seconds[i + 1] if i < last else 0
+            rows.append((since, i, count, count2))
+
+    out = []
+    for since, i, count, count2 in rows:
+        if since <= 0:
+            # d is in the future compared to now
+            out.append(zero)
+        elif count2 != 0:
+            out.append(templates[i] % count + ', ' + templates[i + 1] % count2)
+        else:
+            out.append(templates[i] % count)
+    return out
+
+
+def timeuntil_many(values, now=None, time_strings=None, use_numpy=False):
+    """
+    Like `timesince_many`, but returns strings measuring the time until the given times.
+    """
+    return timesince_many(values, now, reversed=True, time_strings=time_strings, use_numpy=use_numpy)
@@ -3,3 +3,35 @@ Generic constant defaults
 """
 
 DEFAULT_REQUEST_TIMEOUT = (3.05, 27)
+
+# Pooled requests sessions, see `python_utils.generic.sessions.SessionRegistry`
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_POOL_BLOCK = False
+DEFAULT_RETRY_TOTAL = 0
+DEFAULT_RETRY_BACKOFF_FACTOR = 0.1
+DEFAULT_RETRY_STATUSES = (502, 503, 504)
+# Bytes of the chunks of streamed upstream bodies
+DEFAULT_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Circuit breakers of upstreams, see `python_utils.generic.circuit_breaker.CircuitBreaker`
+DEFAULT_CIRCUIT_FAILURE_THRESHOLD = 0.5
+DEFAULT_CIRCUIT_WINDOW = 50
+DEFAULT_CIRCUIT_MIN_REQUESTS = 20
+DEFAULT_CIRCUIT_RESET_TIMEOUT = 30
+
+# Hedged upstream requests, see `python_utils.generic.hedging`
+DEFAULT_LATENCY_WINDOW = 1000
+DEFAULT_LATENCY_MIN_SAMPLES = 20
+DEFAULT_HEDGE_MAX_RATIO = 0.1
+DEFAULT_HEDGE_BURST = 10
+DEFAULT_HEDGE_WORKERS = 64
+
+# Threads of the proxy aggregation views
+DEFAULT_AGGREGATION_WORKERS = 32
+# Pages requested at once fetching whole collections
+DEFAULT_FETCH_ALL_WORKERS = 4
+
+# Async upstream clients, see `python_utils.generic.sessions.AsyncClientRegistry`
+DEFAULT_ASYNC_MAX_CONNECTIONS = 1000
+DEFAULT_ASYNC_KEEPALIVE_EXPIRY = 5.0
@@ -0,0 +1,137 @@
+"""
+Hedged calls to cut tail latency: when a call takes longer than a delay (usually a high percentile of the upstream
+latency), a duplicate call is made and the first one answering wins. Only for idempotent calls.
+"""
+import bisect
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from python_utils.generic.defaults import (DEFAULT_HEDGE_BURST, DEFAULT_HEDGE_MAX_RATIO, DEFAULT_HEDGE_WORKERS,
+                                           DEFAULT_LATENCY_MIN_SAMPLES, DEFAULT_LATENCY_WINDOW)
+
+
+class LatencyTracker:
+    """Latencies of the last `window` calls by key (upstream host), to get their percentiles. Failed calls are recorded
+    too, so an upstream timing out raises its percentiles. Thread safe"""
+
+    def __init__(self, window=DEFAULT_LATENCY_WINDOW, min_samples=DEFAULT_LATENCY_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self.samples = {}
+        self.sorted_samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, key, seconds):
+        """Records the latency of a call"""
+        with self.lock:
+            samples = self.samples.get(key)
+            if samples is None:
+                samples = self.samples[key] = collections.deque(maxlen=self.window)
+                self.sorted_samples[key] = []
+            sorted_samples = self.sorted_samples[key]
+            if len(samples) == self.window:
+                del sorted_samples[bisect.bisect_left(sorted_samples, samples[0])]
+            samples.append(seconds)
+            bisect.insort(sorted_samples, seconds)
+
+    def percentile(self, key, percentile):
+        """Returns the latency percentile (0-100) of a key, or None without `min_samples` latencies"""
+        with self.lock:
+            sorted_samples = self.sorted_samples.get(key)
+            if sorted_samples is None or len(sorted_samples) < self.min_samples:
+                return None
+            position = min(len(sorted_samples) - 1, int(len(sorted_samples) * percentile / 100))
+            return sorted_samples[position]
+
+    def stats(self):
+        """Returns a dict by key with the number of samples and latency percentiles 50, 90, 99"""
+        return {key: {'samples': len(samples), 'p50': self.percentile(key, 50), 'p90': self.percentile(key, 90),
+                      'p99': self.percentile(key, 99)}
+                for key, samples in list(self.samples.items())}
+
+
+class Hedger:
+    """
+    Makes hedged calls on a thread pool. Some parameters:
+    - max_ratio: ratio of calls that can be hedged, so hedging does not double the load of an upstream that is slow
+      for all. It is a token bucket: every call adds `max_ratio` tokens and every hedge takes one
+    - burst: max tokens, the hedges that can be made in a row after a quiet period
+    - workers: threads of the pool. Calls lost keep running until they finish
+    """
+
+    def __init__(self, max_ratio=DEFAULT_HEDGE_MAX_RATIO, workers=DEFAULT_HEDGE_WORKERS, burst=DEFAULT_HEDGE_BURST):
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.tokens = burst
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hedging')
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+
+    def call(self, func, delay, discard=None):
+        """Calls `func`, and calls it again if it takes more than `delay` seconds. Returns the first result, or the
+        first error if both fail. Without budget for a hedge the call runs in the caller's thread, as the pool only
+        helps to answer with the hedge
+
+        :param callable discard: called with the result of the call lost, for example to release it
+        """
+        with self.lock:
+            self.calls += 1
+            self.tokens = min(self.burst, self.tokens + self.max_ratio)
+            can_hedge = self.tokens >= 1
+        if not can_hedge:
+            return self.call_without_hedge(func, delay)
+        first = self.executor.submit(func)
+        if wait([first], timeout=delay).done:
+            return first.result()
+        with self.lock:
+            if self.tokens < 1:
+                self.over_budget += 1
+                hedge = False
+            else:
+                self.tokens -= 1
+                self.hedged += 1
+                hedge = True
+        if not hedge:
+            return first.result()
+        second = self.executor.submit(func)
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return self.get_winner_result(future, second if future is first else first, future is second,
+                                                  discard)
+        raise first.exception()
+
+    def call_without_hedge(self, func, delay):
+        """Calls `func` in the caller's thread, counting it as over budget if it takes more than `delay` seconds"""
+        start = time.monotonic()
+        try:
+            return func()
+        finally:
+            if time.monotonic() - start > delay:
+                with self.lock:
+                    self.over_budget += 1
+
+    def get_winner_result(self, winner, loser, hedge_won, discard):
+        """Returns the result of the call answering first, discarding the other one when it finishes"""
+        if hedge_won:
+            with self.lock:
+                self.hedge_wins += 1
+        if discard is not None:
+            loser.add_done_callback(lambda lost: lost.exception() is None and discard(lost.result()))
+        return winner.result()
+
+    def stats(self):
+        """Returns a dict with calls, hedged calls, hedges answering first and hedges skipped by the budget"""
+        return {
+            'calls': self.calls,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'over_budget': self.over_budget,
+        }
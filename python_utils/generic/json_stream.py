@@ -0,0 +1,173 @@
+"""
+Incremental JSON filters, for streaming big JSON bodies without parsing them whole.
+They scan UTF-8 bytes: every structural character is ASCII, so they never match inside multi-byte characters.
+"""
+import json
+import re
+
+STRING_SPECIAL = re.compile(rb'["\\]')
+STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+try:
+    # Arrays and objects with up to one level of nesting, complete in the chunk. Possessive quantifiers never
+    # backtrack
+    POSSESSIVE_STRING = rb'"[^"\\]*+(?:\\.[^"\\]*+)*+"'
+    CONTAINER = rb'\[(?:[^"{}\[\]]++|%s)*+\]|\{(?:[^"{}\[\]]++|%s)*+\}' % (POSSESSIVE_STRING, POSSESSIVE_STRING)
+    NESTED_CONTAINER = rb'\[(?:[^"{}\[\]]++|%s|%s)*+\]|\{(?:[^"{}\[\]]++|%s|%s)*+\}' % (
+        POSSESSIVE_STRING, CONTAINER, POSSESSIVE_STRING, CONTAINER)
+    # Runs of a value without structural characters, skipping whole strings and containers. Commas only matter at
+    # the top level
+    SKIP_NESTED = re.compile(rb'(?:[^"{}\[\]]++|%s|%s)*+' % (POSSESSIVE_STRING, NESTED_CONTAINER))
+    SKIP_MEMBER = re.compile(rb'(?:[^"{}\[\],]++|%s|%s)*+' % (POSSESSIVE_STRING, NESTED_CONTAINER))
+except re.error:  # pragma: no cover
+    # Python < 3.11 has no possessive quantifiers: only strings are skipped whole
+    SKIP_NESTED = re.compile(rb'(?:[^"{}\[\]]+|%s)*' % STRING)
+    SKIP_MEMBER = re.compile(rb'(?:[^"{}\[\],]+|%s)*' % STRING)
+NOT_WHITESPACE = re.compile(rb'[^ \t\r\n]')
+
+STATE_START = 0
+STATE_KEY_OR_END = 1
+STATE_KEY = 2
+STATE_COLON = 3
+STATE_VALUE = 4
+STATE_PASSTHROUGH = 5
+
+
+def filter_json_keys(chunks, keys):
+    """Yields the chunks of a JSON object without its top level `keys`, keeping the rest of the bytes as they are.
+    Bodies that are not a JSON object are yielded unchanged, and so is the rest of the body from a key that is not a
+    valid JSON string. Only keys are buffered, never values.
+
+    :param chunks: iterable of bytes of the JSON document
+    :param keys: keys to remove
+    """
+    keys = frozenset(keys)
+    state = STATE_START
+    key = []
+    escape = False
+    in_string = False
+    depth = 0
+    keep = True
+    members = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if state == STATE_PASSTHROUGH:
+            yield chunk
+            continue
+        out = []
+        position = 0
+        length = len(chunk)
+        while position < length:
+            if state == STATE_PASSTHROUGH:
+                out.append(chunk[position:])
+                break
+            if state == STATE_VALUE:
+                start = position
+                while position < length:
+                    if escape:
+                        escape = False
+                        position += 1
+                        continue
+                    if in_string:
+                        match = STRING_SPECIAL.search(chunk, position)
+                        if match is None:
+                            position = length
+                            break
+                        position = match.start()
+                        if chunk[position:position + 1] == b'\\':
+                            escape = True
+                        else:
+                            in_string = False
+                        position += 1
+                        continue
+                    position = (SKIP_NESTED if depth else SKIP_MEMBER).match(chunk, position).end()
+                    if position == length:
+                        break
+                    char = chunk[position:position + 1]
+                    if char == b'"':
+                        # A string going on in the next chunk
+                        in_string = True
+                    elif char in b'{[':
+                        depth += 1
+                    elif depth:
+                        if char in b'}]':
+                            depth -= 1
+                    else:
+                        # End of the member value: a comma or the end of the object
+                        break
+                    position += 1
+                if keep:
+                    out.append(chunk[start:position])
+                if position < length:
+                    if chunk[position:position + 1] == b'}':
+                        out.append(b'}')
+                        state = STATE_PASSTHROUGH
+                    else:
+                        state = STATE_KEY_OR_END
+                    position += 1
+                continue
+            if state == STATE_KEY:
+                start = position
+                while position < length:
+                    if escape:
+                        escape = False
+                        position += 1
+                        continue
+                    match = STRING_SPECIAL.search(chunk, position)
+                    if match is None:
+                        position = length
+                        break
+                    position = match.start()
+                    if chunk[position:position + 1] == b'"':
+                        break
+                    escape = True
+                    position += 1
+                key.append(chunk[start:position])
+                if position < length:
+                    state = STATE_COLON
+                    position += 1
+                continue
+
+            match = NOT_WHITESPACE.search(chunk, position)
+            if match is None:
+                break
+            position = match.start()
+            char = chunk[position:position + 1]
+            if state == STATE_START:
+                if char != b'{':
+                    state = STATE_PASSTHROUGH
+                    out.append(chunk[position:])
+                    break
+                out.append(chunk[:position + 1])
+                state = STATE_KEY_OR_END
+            elif state == STATE_KEY_OR_END:
+                if char == b'"':
+                    key = []
+                    state = STATE_KEY
+                elif char == b'}':
+                    out.append(b'}')
+                    state = STATE_PASSTHROUGH
+            elif state == STATE_COLON:
+                raw_key = b''.join(key)
+                try:
+                    keep = json.loads(b'"' + raw_key + b'"') not in keys
+                except ValueError:
+                    # Invalid key: the rest of the body is yielded as it is
+                    out.append(b'"' + raw_key + b'"' if not members else b',"' + raw_key + b'"')
+                    out.append(chunk[position:])
+                    state = STATE_PASSTHROUGH
+                    break
+                if keep:
+                    out.append(b'"' + raw_key + b'":' if not members else b',"' + raw_key + b'":')
+                    members += 1
+                state = STATE_VALUE
+                in_string = False
+                depth = 0
+                # The colon, or the first character of the value if it is missing
+                if char != b':':
+                    continue
+            position += 1
+        if out:
+            data = b''.join(out)
+            if data:
+                yield data
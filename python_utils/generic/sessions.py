@@ -0,0 +1,216 @@
+"""
+Process wide registry of `requests.Session` objects by upstream host, so connections are pooled and kept alive
+between requests instead of opening a new TCP/TLS connection for every call.
+Sessions are shared by all the threads of a process, and recreated in forked processes.
+
+`AsyncClientRegistry` does the same for asyncio code with an `httpx.AsyncClient` per event loop.
+"""
+import asyncio
+import http.cookiejar
+import os
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from python_utils.generic.defaults import (DEFAULT_ASYNC_KEEPALIVE_EXPIRY, DEFAULT_ASYNC_MAX_CONNECTIONS,
+                                           DEFAULT_POOL_BLOCK, DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE,
+                                           DEFAULT_RETRY_BACKOFF_FACTOR, DEFAULT_RETRY_STATUSES, DEFAULT_RETRY_TOTAL)
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+class RejectCookiesPolicy(http.cookiejar.DefaultCookiePolicy):
+    """Cookie policy that neither stores nor sends cookies, as sessions are shared by the requests of every user"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+def get_host_key(url):
+    """Returns the scheme, host and port of an url"""
+    parts = urlsplit(url)
+    return '{}://{}'.format(parts.scheme, parts.netloc.rpartition('@')[2].lower())
+
+
+class SessionRegistry:
+    """
+    Sessions by upstream host. Some parameters:
+    - pool_connections: number of connection pools cached by every session
+    - pool_maxsize: max connections kept alive to every host
+    - pool_block: waits for a free connection instead of opening one that is discarded after the request
+    - max_retries: retries of idempotent requests (GET, HEAD, OPTIONS...) on connection errors and `retry_statuses`
+    - backoff_factor: retries wait `backoff_factor * 2 ** (retry - 1)` seconds
+    - keep_alive: if False, connections are closed after every request
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=DEFAULT_POOL_BLOCK, max_retries=DEFAULT_RETRY_TOTAL,
+                 backoff_factor=DEFAULT_RETRY_BACKOFF_FACTOR, retry_statuses=DEFAULT_RETRY_STATUSES, keep_alive=True):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.retry_statuses = retry_statuses
+        self.keep_alive = keep_alive
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.requests = {}
+        self.pid = os.getpid()
+
+    def create_session(self):
+        """Returns a new session with the pool and retry settings"""
+        session = requests.Session()
+        session.cookies.set_policy(RejectCookiesPolicy())
+        retry = Retry(total=self.max_retries, backoff_factor=self.backoff_factor,
+                      status_forcelist=self.retry_statuses, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              max_retries=retry, pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def get_session(self, url):
+        """Returns the session of the url host, created the first time"""
+        key = get_host_key(url)
+        if self.pid != os.getpid():
+            self.reset()
+        session = self.sessions.get(key)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(key)
+                if session is None:
+                    session = self.sessions[key] = self.create_session()
+        self.requests[key] = self.requests.get(key, 0) + 1
+        return session
+
+    def reset(self):
+        """Forgets the sessions, for example inherited from a parent process, without closing their sockets"""
+        with self.lock:
+            self.sessions = {}
+            self.requests = {}
+            self.pid = os.getpid()
+
+    def close(self):
+        """Closes every session and its connections"""
+        with self.lock:
+            sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def stats(self):
+        """Returns a dict by host with the number of sessions requested, connections opened, connections in use and
+        idle, and max connections kept alive
+        """
+        out = {}
+        for key, session in list(self.sessions.items()):
+            host_stats = {'requests': self.requests.get(key, 0), 'opened': 0, 'in_use': 0, 'idle': 0,
+                          'maxsize': self.pool_maxsize}
+            for adapter in set(session.adapters.values()):
+                for pool_key in adapter.poolmanager.pools.keys():
+                    pool = adapter.poolmanager.pools.get(pool_key)
+                    if pool is None or pool.pool is None:
+                        continue
+                    # The queue is filled with None placeholders and idle connections
+                    queue = list(pool.pool.queue)
+                    host_stats['opened'] += pool.num_connections
+                    host_stats['in_use'] += pool.pool.maxsize - len(queue)
+                    host_stats['idle'] += sum(1 for connection in queue if connection is not None)
+            out[key] = host_stats
+        return out
+
+
+def get_httpx_timeout(timeout):
+    """Converts a requests timeout, a number or a (connect, read) tuple, to an `httpx.Timeout`"""
+    if isinstance(timeout, (tuple, list)):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class AsyncClientRegistry:
+    """
+    `httpx.AsyncClient` shared by all the coroutines of an event loop, with one connection pool for all the upstream
+    hosts. Clients are bound to their loop, so there is one per loop, closed when the loop shuts down its async
+    generators (as `asyncio.run` and asgiref `async_to_sync` do), so loops run for a single request under WSGI do not
+    leave clients and sockets behind. Some parameters:
+    - max_connections: max concurrent connections of the pool
+    - max_keepalive_connections: max idle connections kept alive
+    - keepalive_expiry: seconds idle connections are kept alive
+    - retries: retries on connection errors
+    """
+
+    def __init__(self, max_connections=DEFAULT_ASYNC_MAX_CONNECTIONS, max_keepalive_connections=DEFAULT_POOL_MAXSIZE,
+                 keepalive_expiry=DEFAULT_ASYNC_KEEPALIVE_EXPIRY, retries=DEFAULT_RETRY_TOTAL):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.retries = retries
+        self.clients = weakref.WeakKeyDictionary()
+        self.lifetimes = weakref.WeakKeyDictionary()
+        self.created = 0
+        self.closed = 0
+
+    def create_client(self):
+        """Returns a new client with the pool settings"""
+        if httpx is None:
+            raise ImportError('httpx is required for async upstream requests')
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_keepalive_connections,
+                              keepalive_expiry=self.keepalive_expiry)
+        transport = httpx.AsyncHTTPTransport(limits=limits, retries=self.retries)
+        # Shared by the requests of every user, so cookies are neither stored nor sent
+        return httpx.AsyncClient(transport=transport, cookies=http.cookiejar.CookieJar(policy=RejectCookiesPolicy()))
+
+    async def client_lifetime(self, loop, client):
+        """Async generator kept suspended while the loop runs. The loop closes it on shutdown, closing the client"""
+        try:
+            yield
+        finally:
+            if self.clients.get(loop) is client:
+                del self.clients[loop]
+            self.lifetimes.pop(loop, None)
+            await self.close_client(client)
+
+    async def close_client(self, client):
+        """Closes a client and its connections"""
+        await client.aclose()
+        self.closed += 1
+
+    async def get_client(self):
+        """Returns the client of the running event loop, created the first time"""
+        loop = asyncio.get_running_loop()
+        client = self.clients.get(loop)
+        if client is None:
+            client = self.clients[loop] = self.create_client()
+            self.created += 1
+            lifetime = self.lifetimes[loop] = self.client_lifetime(loop, client)
+            await lifetime.__anext__()
+        return client
+
+    async def aclose(self):
+        """Closes the client of the running event loop and its connections"""
+        loop = asyncio.get_running_loop()
+        client = self.clients.pop(loop, None)
+        lifetime = self.lifetimes.pop(loop, None)
+        if lifetime is not None:
+            await lifetime.aclose()
+        elif client is not None:
+            await self.close_client(client)
+
+    def stats(self):
+        """Returns a dict with the clients open, created and closed"""
+        return {'clients': len(self.clients), 'created': self.created, 'closed': self.closed,
+                'max_connections': self.max_connections}
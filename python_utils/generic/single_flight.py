@@ -0,0 +1,73 @@
+"""
+Single flight: concurrent calls with the same key wait for the one in flight and share its result, instead of
+repeating it. Useful to not hammer an upstream when many threads miss the same cached value at once.
+"""
+import threading
+
+
+class Flight:  # pylint: disable=too-few-public-methods
+    """A call in flight, with its result or error once finished"""
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls by key. Thread safe"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def do(self, key, func, timeout=None):
+        """Calls `func` or, if a call with the same key is in flight, waits for it and returns its result.
+
+        :param float timeout: max seconds waiting for the call in flight. Then `func` is called, not to wait forever
+            for a stuck call
+        :raises: the exception raised by the call in flight, to every caller waiting for it
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                flight.result = func()
+            except BaseException as error:
+                flight.error = error
+                raise
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.event.set()
+            return flight.result
+        if not flight.event.wait(timeout):
+            with self.lock:
+                self.timeouts += 1
+            return func()
+        if flight.error is not None:
+            with self.lock:
+                self.errors += 1
+            raise flight.error
+        return flight.result
+
+    def stats(self):
+        """Returns a dict with calls made, calls coalesced, waits timed out, errors shared and calls in flight"""
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'in_flight': len(self.flights),
+        }
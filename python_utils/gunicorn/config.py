@@ -0,0 +1,157 @@
+"""
+Gunicorn settings built from the available CPUs and memory (cgroup limits included, as in containers) and a named
+workload profile:
+- io_bound_proxy: few processes with many threads, for views that mostly wait for upstreams or databases
+- cpu_bound_api: one process per CPU and no threads, for views that mostly compute
+- low_memory: as few processes as possible, sharing the app code through `preload_app`
+"""
+import os
+
+CGROUP_V2_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+CGROUP_V1_CPU_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+CGROUP_V1_CPU_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+CGROUP_V2_MEMORY_MAX = '/sys/fs/cgroup/memory.max'
+CGROUP_V1_MEMORY_LIMIT = '/sys/fs/cgroup/memory/memory.limit_in_bytes'
+# cgroup v1 reports no limit as a huge number
+CGROUP_V1_NO_LIMIT = 1 << 60
+
+SHM_DIR = '/dev/shm'
+MB = 1024 * 1024
+
+PROFILE_IO_BOUND_PROXY = 'io_bound_proxy'
+PROFILE_CPU_BOUND_API = 'cpu_bound_api'
+PROFILE_LOW_MEMORY = 'low_memory'
+DEFAULT_PROFILE = PROFILE_IO_BOUND_PROXY
+
+# - workers_per_cpu, extra_workers, min_workers: number of processes is workers_per_cpu * cpus + extra_workers, at
+#   least min_workers
+# - max_workers: max number of processes, if any
+# - threads: threads per process
+# - worker_memory: expected memory of a process in bytes, to fit the processes in the memory limit
+PROFILES = {
+    PROFILE_IO_BOUND_PROXY: {
+        'worker_class': 'gthread',
+        'workers_per_cpu': 1,
+        'extra_workers': 1,
+        'min_workers': 2,
+        'max_workers': None,
+        'threads': 16,
+        'worker_connections': 1000,
+        'worker_memory': 200 * MB,
+        'preload_app': False,
+        'max_requests': 10000,
+        'timeout': 60,
+        'keepalive': 5,
+    },
+    PROFILE_CPU_BOUND_API: {
+        'worker_class': 'sync',
+        'workers_per_cpu': 1,
+        'extra_workers': 0,
+        'min_workers': 2,
+        'max_workers': None,
+        'threads': 1,
+        'worker_connections': 1000,
+        'worker_memory': 200 * MB,
+        'preload_app': False,
+        'max_requests': 5000,
+        'timeout': 30,
+        'keepalive': 2,
+    },
+    PROFILE_LOW_MEMORY: {
+        'worker_class': 'gthread',
+        'workers_per_cpu': 0,
+        'extra_workers': 1,
+        'min_workers': 1,
+        'max_workers': None,
+        'threads': 8,
+        'worker_connections': 500,
+        'worker_memory': 120 * MB,
+        'preload_app': True,
+        'max_requests': 2000,
+        'timeout': 60,
+        'keepalive': 5,
+    },
+}
+
+
+def read_file(path):
+    """Returns the stripped content of a file, or None if it can not be read"""
+    try:
+        with open(path) as opened_file:
+            return opened_file.read().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def get_cpu_count():
+    """Returns the number of CPUs this process can use, taking cgroup quotas and CPU affinity into account"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = period = None
+    cpu_max = read_file(CGROUP_V2_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+    else:
+        quota, period = read_file(CGROUP_V1_CPU_QUOTA), read_file(CGROUP_V1_CPU_PERIOD)
+    try:
+        quota, period = int(quota), int(period)
+    except (TypeError, ValueError):
+        # No quota (`max` in cgroup v2) or no cgroup files
+        return cpus
+    if quota <= 0 or period <= 0:
+        return cpus
+    return max(1, min(cpus, -(-quota // period)))
+
+
+def get_memory_limit():
+    """Returns the cgroup memory limit in bytes, or None if there is no limit"""
+    for path in (CGROUP_V2_MEMORY_MAX, CGROUP_V1_MEMORY_LIMIT):
+        try:
+            limit = int(read_file(path))
+        except (TypeError, ValueError):
+            continue
+        if limit < CGROUP_V1_NO_LIMIT:
+            return limit
+    return None
+
+
+def get_settings(profile=None, cpus=None, memory_limit=None, **overrides):
+    """Returns a dict with gunicorn settings for the profile and the available resources.
+
+    :param str profile: profile name, `DEFAULT_PROFILE` if not set
+    :param int cpus: number of CPUs. Detected if not set
+    :param int memory_limit: memory limit in bytes. Detected if not set
+    :param overrides: settings that replace the computed ones
+    """
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ValueError('profile has to be one of {}'.format(', '.join(PROFILES)))
+    config = PROFILES[profile]
+    cpus = cpus or get_cpu_count()
+    memory_limit = memory_limit or get_memory_limit()
+
+    workers = max(config['min_workers'], config['workers_per_cpu'] * cpus + config['extra_workers'])
+    if config['max_workers']:
+        workers = min(workers, config['max_workers'])
+    if memory_limit:
+        workers = max(1, min(workers, memory_limit // config['worker_memory']))
+
+    settings = {
+        'worker_class': config['worker_class'],
+        'workers': workers,
+        'threads': config['threads'],
+        'worker_connections': config['worker_connections'],
+        'preload_app': config['preload_app'],
+        'max_requests': config['max_requests'],
+        # Workers restart at different moments
+        'max_requests_jitter': config['max_requests'] // 10,
+        'timeout': config['timeout'],
+        'keepalive': config['keepalive'],
+    }
+    if os.path.isdir(SHM_DIR):
+        # Heartbeat file in memory, to not block workers on a slow disk
+        settings['worker_tmp_dir'] = SHM_DIR
+    settings.update(overrides)
+    return settings
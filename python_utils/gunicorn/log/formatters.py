@@ -11,5 +11,6 @@ class GunicornRequestGELFFormatter(BasicGELFFormatter):
 
     def __init__(self):
         extra_fields = EXTRA_FIELDS + ['remote_addr', 'http_user_agent', 'request_method',
-                                       'path_info', 'server_protocol', 'status_code']
+                                       'path_info', 'server_protocol', 'status_code', 'request_time_us',
+                                       'response_bytes', 'worker_pid', 'sample_rate']
         super().__init__(extra_fields=extra_fields)
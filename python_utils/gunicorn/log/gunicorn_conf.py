@@ -1,14 +1,28 @@
-"""Gunicorn specific settings"""
+"""
+Gunicorn specific settings. Process settings are computed from the available CPUs and memory for the workload
+profile in `GUNICORN_PROFILE` environment variable (see `python_utils.gunicorn.config`)
+"""
+import os
 import sys
 
+from python_utils.gunicorn.config import get_settings
 from python_utils.gunicorn.log.formatters import GunicornRequestGELFFormatter
 from python_utils.gunicorn.log.loggers import GunicornLogger
 
+PROFILE_SETTINGS = get_settings(os.environ.get('GUNICORN_PROFILE'))
+
 logger_class = GunicornLogger
-worker_class = 'gthread'
 accesslog = '-'
-workers = 1
-worker_connections = 1000
+worker_class = PROFILE_SETTINGS['worker_class']
+workers = PROFILE_SETTINGS['workers']
+threads = PROFILE_SETTINGS['threads']
+worker_connections = PROFILE_SETTINGS['worker_connections']
+preload_app = PROFILE_SETTINGS['preload_app']
+max_requests = PROFILE_SETTINGS['max_requests']
+max_requests_jitter = PROFILE_SETTINGS['max_requests_jitter']
+timeout = PROFILE_SETTINGS['timeout']
+keepalive = PROFILE_SETTINGS['keepalive']
+worker_tmp_dir = PROFILE_SETTINGS.get('worker_tmp_dir')
 
 LOG_LEVEL = 'INFO'
 loglevel = LOG_LEVEL.lower()
@@ -28,7 +42,7 @@ logconfig_dict = {
     'handlers': {
         'server_request': {
             'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
+            'class': 'python_utils.log.handlers.QueuedGELFHandler',
             'formatter': 'request_gelf',
             'stream': sys.stdout
         }
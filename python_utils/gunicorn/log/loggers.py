@@ -1,18 +1,86 @@
+import logging
+import os
 import traceback
 from gunicorn import glogging
 
+from python_utils.gunicorn import metrics
+from python_utils.gunicorn.log import sampling
+
+
+def get_status(resp):
+    """Status code of the response as string, as in gunicorn atoms"""
+    status = resp.status
+    if isinstance(status, str):
+        return status.split(None, 1)[0]
+    return status
+
+
+def get_duration_us(request_time):
+    """Request duration in microseconds"""
+    return request_time.days * 86400000000 + request_time.seconds * 1000000 + request_time.microseconds
+
+
+ACCESS_FIELD_GETTERS = {
+    'remote_addr': lambda resp, req, environ, request_time: environ.get('REMOTE_ADDR', '-'),
+    'status_code': lambda resp, req, environ, request_time: get_status(resp),
+    'http_user_agent': lambda resp, req, environ, request_time: environ.get('HTTP_USER_AGENT', '-'),
+    'http_referer': lambda resp, req, environ, request_time: environ.get('HTTP_REFERER', '-'),
+    'request_method': lambda resp, req, environ, request_time: environ.get('REQUEST_METHOD'),
+    'path_info': lambda resp, req, environ, request_time: environ.get('PATH_INFO'),
+    'query_string': lambda resp, req, environ, request_time: environ.get('QUERY_STRING'),
+    'server_protocol': lambda resp, req, environ, request_time: environ.get('SERVER_PROTOCOL'),
+    'request_time_us': lambda resp, req, environ, request_time: get_duration_us(request_time),
+    'response_bytes': lambda resp, req, environ, request_time: getattr(resp, 'sent', None),
+    'worker_pid': lambda resp, req, environ, request_time: os.getpid(),
+}
+
 
 class GunicornLogger(glogging.Logger):
+    """
+    Gunicorn logger that adds some extra fields to the access log. To log only some requests, set `access_sampler` to
+    an `python_utils.gunicorn.log.sampling.AccessLogSampler` in a subclass, or the `GUNICORN_ACCESS_LOG_*` variables
+    in the gunicorn `raw_env` setting or the environment
+    """
+    metrics = None
+    access_sampler = None
+
+    def setup(self, cfg):
+        """Opens the shared latency histograms if `GUNICORN_METRICS_FILE` is set, and reads the sampling rules of the
+        gunicorn environment. Workers inherit them"""
+        super().setup(cfg)
+        if self.access_sampler is None:
+            self.access_sampler = sampling.get_sampler_from_env(dict(os.environ, **cfg.env))
+        if metrics.METRICS_FILE and self.metrics is None:
+            self.metrics = metrics.SharedHistograms(metrics.METRICS_FILE, create=True)
+
+    def record_metrics(self, resp, environ, request_time):
+        """Records the request duration by route and status. The route is set by `MetricsMiddleware` in Django
+        apps, otherwise it is the path with ids replaced. Errors are logged, never raised to the worker"""
+        try:
+            route = environ.get(metrics.ROUTE_ENVIRON_KEY) or metrics.normalize_route(environ.get('PATH_INFO', ''))
+            self.metrics.record(route, get_status(resp), get_duration_us(request_time))
+        except Exception:
+            self.error(traceback.format_exc())
+
     def access(self, resp, req, environ, request_time):
         """ See http://httpd.apache.org/docs/2.0/logs.html#combined
         for format details
         """
+        if self.metrics is not None:
+            self.record_metrics(resp, environ, request_time)
 
         if not (self.cfg.accesslog or self.cfg.logconfig or
                 self.cfg.logconfig_dict or
                 (self.cfg.syslog and not self.cfg.disable_redirect_access_to_syslog)):
             return
 
+        sample_rate = None
+        if self.access_sampler is not None:
+            sample_rate = self.access_sampler.sample(environ.get('PATH_INFO'), get_status(resp),
+                                                     get_duration_us(request_time))
+            if sample_rate is None:
+                return
+
         # wrap atoms:
         # - make sure atoms will be test case insensitively
         # - if atom doesn't exist replace it by '-'
@@ -26,8 +94,45 @@ class GunicornLogger(glogging.Logger):
                                         'http_user_agent': safe_atoms.get('a'),
                                         'request_method': safe_atoms.get('m'),
                                         'path_info': safe_atoms.get('U'),
-                                        'server_protocol': safe_atoms.get('H')
+                                        'server_protocol': safe_atoms.get('H'),
+                                        'sample_rate': sample_rate
                                         }
                                  )
         except:
             self.error(traceback.format_exc())
+
+
+class StructuredGunicornLogger(GunicornLogger):
+    """
+    Gunicorn logger whose access log skips atoms and `access_log_format` templating: only the `access_fields` are
+    built, straight from the response, request and environ, and the message is just method, path and status.
+    Available fields are the keys of `ACCESS_FIELD_GETTERS`. Set it as `logger_class` in gunicorn settings
+    """
+    access_fields = ('remote_addr', 'status_code', 'http_user_agent', 'request_method', 'path_info',
+                     'server_protocol', 'request_time_us', 'response_bytes', 'worker_pid')
+
+    def setup(self, cfg):
+        """Checks once if access log is enabled and compiles the access fields"""
+        super().setup(cfg)
+        self.access_enabled = bool(cfg.accesslog or cfg.logconfig or cfg.logconfig_dict or
+                                   (cfg.syslog and not cfg.disable_redirect_access_to_syslog))
+        self.access_plan = tuple((field, ACCESS_FIELD_GETTERS[field]) for field in self.access_fields)
+
+    def access(self, resp, req, environ, request_time):
+        if self.metrics is not None:
+            self.record_metrics(resp, environ, request_time)
+        if not self.access_enabled or not self.access_log.isEnabledFor(logging.INFO):
+            return
+        sample_rate = None
+        if self.access_sampler is not None:
+            sample_rate = self.access_sampler.sample(environ.get('PATH_INFO'), get_status(resp),
+                                                     get_duration_us(request_time))
+            if sample_rate is None:
+                return
+        try:
+            extra = {field: getter(resp, req, environ, request_time) for field, getter in self.access_plan}
+            extra['sample_rate'] = sample_rate
+            self.access_log.info('%s %s %s', environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'),
+                                 get_status(resp), extra=extra)
+        except Exception:
+            self.error(traceback.format_exc())
@@ -0,0 +1,113 @@
+"""
+Gunicorn access log sampling. Rules are set in the `access_sampler` of the logger class, or with environment variables
+in the gunicorn config (`raw_env`) or the environment of the process:
+- GUNICORN_ACCESS_LOG_SUPPRESSED_PATHS: comma separated paths never logged. `probes` stands for `DEFAULT_PROBE_PATHS`
+- GUNICORN_ACCESS_LOG_SAMPLE_RATES: JSON list of [path regex, rate] pairs
+- GUNICORN_ACCESS_LOG_SAMPLE_RATE: rate of the rest of paths
+- GUNICORN_ACCESS_LOG_SLOW_US: microseconds after which requests are always logged
+"""
+import json
+import random
+import re
+
+try:
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+except ImportError:  # pragma: no cover
+    settings = None
+
+ENV_PREFIX = 'GUNICORN_ACCESS_LOG_'
+PROBES = 'probes'
+
+
+def get_probe_paths():
+    """Returns the paths of the probes of `HealthCheckMiddleware`, from the Django settings if they are configured"""
+    paths = ('/healthz', '/readyz')
+    if settings is None:  # pragma: no cover
+        return paths
+    try:
+        return (getattr(settings, 'HEALTHZ_PATH', paths[0]), getattr(settings, 'READYZ_PATH', paths[1]))
+    except ImproperlyConfigured:  # pragma: no cover
+        return paths
+
+
+DEFAULT_PROBE_PATHS = get_probe_paths()
+
+
+class AccessLogSampler:
+    """
+    Decides which requests are access logged, before building anything for the log record. Some parameters:
+    - suppressed_paths: paths that are never logged, like probes
+    - sample_rates: sequence of (path regex, rate) pairs. The first regex matching the beginning of the path sets the
+      rate at which successful and fast requests are logged
+    - default_sample_rate: rate for paths without a matching regex
+    - slow_threshold_us: requests that take at least these microseconds are always logged
+
+    Client errors are always logged, except in suppressed paths, and server errors always. Rules are compiled once into
+    a single regex.
+    """
+
+    def __init__(self, suppressed_paths=(), sample_rates=(), default_sample_rate=1.0, slow_threshold_us=None):
+        self.suppressed_paths = frozenset(suppressed_paths)
+        self.rates = tuple(rate for _, rate in sample_rates)
+        self.routes_re = re.compile('|'.join('(?P<r{}>{})'.format(position, pattern)
+                                             for position, (pattern, _) in enumerate(sample_rates))) \
+            if sample_rates else None
+        self.default_sample_rate = default_sample_rate
+        self.slow_threshold_us = slow_threshold_us
+
+    def get_rate(self, path):
+        """Returns the sample rate of the path"""
+        if self.routes_re is not None:
+            match = self.routes_re.match(path)
+            if match is not None:
+                return self.rates[int(match.lastgroup[1:])]
+        return self.default_sample_rate
+
+    def sample(self, path, status, duration_us):
+        """Returns the sample rate the request is logged with, or None if it must not be logged
+
+        :param str path: request path
+        :param status: response status code, as integer or string
+        :param int duration_us: request duration in microseconds
+        """
+        try:
+            status = int(status)
+        except (TypeError, ValueError):
+            return 1.0
+        if status >= 500:
+            return 1.0
+        if path in self.suppressed_paths:
+            return None
+        if status >= 400:
+            return 1.0
+        if self.slow_threshold_us is not None and duration_us >= self.slow_threshold_us:
+            return 1.0
+        rate = self.get_rate(path)
+        if rate >= 1:
+            return 1.0
+        if rate <= 0 or random.random() >= rate:
+            return None
+        return rate
+
+
+def get_sampler_from_env(env):
+    """Returns an `AccessLogSampler` with the rules of the `GUNICORN_ACCESS_LOG_*` variables of `env`, or None if
+    there is none"""
+    if not any(name.startswith(ENV_PREFIX) for name in env):
+        return None
+    suppressed_paths = []
+    for path in env.get(ENV_PREFIX + 'SUPPRESSED_PATHS', '').split(','):
+        path = path.strip()
+        if path == PROBES:
+            suppressed_paths.extend(DEFAULT_PROBE_PATHS)
+        elif path:
+            suppressed_paths.append(path)
+    sample_rates = json.loads(env.get(ENV_PREFIX + 'SAMPLE_RATES', '[]'))
+    slow_threshold_us = env.get(ENV_PREFIX + 'SLOW_US')
+    return AccessLogSampler(
+        suppressed_paths=suppressed_paths,
+        sample_rates=[(pattern, float(rate)) for pattern, rate in sample_rates],
+        default_sample_rate=float(env.get(ENV_PREFIX + 'SAMPLE_RATE', 1)),
+        slow_threshold_us=int(slow_threshold_us) if slow_threshold_us else None,
+    )
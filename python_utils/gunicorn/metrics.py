@@ -0,0 +1,278 @@
+"""
+Request latency histograms shared by all gunicorn workers through a memory mapped file.
+Every worker claims its own shard of counters, so recording only takes an uncontended per process lock, and readers
+sum the shards. Series (route and status) are registered once in the file under a file lock.
+Enable it setting `GUNICORN_METRICS_FILE` environment variable to a path, better in a memory filesystem like /dev/shm
+"""
+import bisect
+import fcntl
+import functools
+import mmap
+import os
+import re
+import struct
+import threading
+from contextlib import contextmanager
+
+METRICS_FILE = os.environ.get('GUNICORN_METRICS_FILE')
+
+DEFAULT_BUCKETS_US = (5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000, 2500000, 5000000, 10000000)
+DEFAULT_MAX_SERIES = 256
+DEFAULT_MAX_WORKERS = 64
+# Series kept for routes registered once the table is almost full
+RESERVED_SERIES = 16
+
+ROUTE_ENVIRON_KEY = 'python_utils.route'
+OTHER_ROUTE = '__other__'
+METRIC_NAME = 'http_request_duration_seconds'
+
+MAGIC = b'PUHIST01'
+HEADER = struct.Struct('<8sIIII')
+HEADER_SIZE = 64
+KEY_SIZE = 128
+UINT64_SIZE = 8
+# Longer routes are cut, so they fit in a key and are found in the index of series
+MAX_ROUTE_LENGTH = 100
+ROUTE_CACHE_SIZE = 1024
+
+ID_SEGMENT_RE = re.compile(r'/(?:\d+|[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}'
+                           r'|[0-9a-fA-F]{24})(?=/|$)')
+
+
+@functools.lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def normalize_route(path):
+    """Replaces numeric, UUID and ObjectId path segments with `:id` to keep the number of series bounded. Cached, as
+    most requests go to a few paths"""
+    return ID_SEGMENT_RE.sub('/:id', path)
+
+
+def escape_label(value):
+    """Escapes a Prometheus label value"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class SharedHistograms:
+    """
+    Latency histograms by route and status in a memory mapped file. Some parameters:
+    - path: file path. With `create` a new file is written under a temporary name and renamed into place, so
+      processes still mapping a previous file are not affected. Otherwise its configuration is read from it
+    - buckets_us: histogram upper bounds in microseconds
+    - max_series: max number of route and status pairs
+    - max_workers: max number of processes recording at the same time
+    """
+
+    def __init__(self, path, create=False, buckets_us=DEFAULT_BUCKETS_US, max_series=DEFAULT_MAX_SERIES,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        self.path = path
+        if create:
+            self.bounds = tuple(buckets_us)
+            self.max_series = max_series
+            self.max_workers = max_workers
+            self.compute_layout()
+            self.create_file()
+        self.fd = os.open(path, os.O_RDWR)
+        self.mm = mmap.mmap(self.fd, 0)
+        magic, self.max_workers, self.max_series, n_buckets, _ = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError('{} is not a metrics file'.format(path))
+        self.bounds = struct.unpack_from('<{}Q'.format(n_buckets), self.mm, HEADER_SIZE)
+        self.compute_layout()
+        self.pids = memoryview(self.mm)[self.pids_offset:self.keys_offset].cast('Q')
+        self.counters = memoryview(self.mm)[self.counters_offset:self.size].cast('Q')
+        self.lock = threading.Lock()
+        self.lock_fd = self.fd
+        self.lock_pid = os.getpid()
+        self.pid = None
+        self.shard_base = None
+        self.index = {}
+        self.indexed = 0
+
+    def compute_layout(self):
+        """Computes the offsets of every region of the file"""
+        self.stride = len(self.bounds) + 2  # buckets, +Inf bucket and sum
+        self.sum_offset = len(self.bounds) + 1
+        self.bounds_offset = HEADER_SIZE
+        self.pids_offset = self.bounds_offset + len(self.bounds) * UINT64_SIZE
+        self.keys_offset = self.pids_offset + self.max_workers * UINT64_SIZE
+        self.counters_offset = self.keys_offset + self.max_series * KEY_SIZE
+        self.size = self.counters_offset + self.max_workers * self.max_series * self.stride * UINT64_SIZE
+
+    def create_file(self):
+        """Writes an empty metrics file to a temporary path and renames it into place"""
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'wb') as metrics_file:
+            metrics_file.truncate(self.size)
+            metrics_file.write(HEADER.pack(MAGIC, self.max_workers, self.max_series, len(self.bounds), 0))
+            metrics_file.seek(self.bounds_offset)
+            metrics_file.write(struct.pack('<{}Q'.format(len(self.bounds)), *self.bounds))
+        os.replace(tmp_path, self.path)
+
+    def get_lock_fd(self):
+        """Returns a descriptor of the file opened by the current process. `flock` locks belong to the open file
+        description, which forked workers share with their parent, so they need their own to exclude each other"""
+        pid = os.getpid()
+        if self.lock_pid != pid:
+            with self.lock:
+                if self.lock_pid != pid:
+                    self.lock_fd = os.open(self.path, os.O_RDWR)
+                    self.lock_pid = pid
+        return self.lock_fd
+
+    @contextmanager
+    def file_lock(self):
+        """Locks the file between processes"""
+        lock_fd = self.get_lock_fd()
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+    def claim_shard(self):
+        """Takes a free shard, or the one of a dead process keeping its counts, for the current process"""
+        pid = os.getpid()
+        shard_base = None
+        with self.file_lock():
+            for shard, owner in enumerate(self.pids):
+                if owner == pid or owner == 0 or not self.is_alive(owner):
+                    self.pids[shard] = pid
+                    shard_base = shard * self.max_series * self.stride
+                    break
+        self.index = {}
+        self.indexed = 0
+        self.shard_base = shard_base
+        # Set last, so other threads claiming at the same time find the same shard
+        self.pid = pid
+
+    @staticmethod
+    def is_alive(pid):
+        """Checks if a process exists"""
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @staticmethod
+    def encode_key(route, status):
+        """Fixed size key of a series"""
+        return '{}\n{}'.format(route, status).encode('utf-8')[:KEY_SIZE].ljust(KEY_SIZE, b'\0')
+
+    def get_keys(self):
+        """Returns the registered series as a list of route and status pairs"""
+        n_series = HEADER.unpack_from(self.mm)[4]
+        keys = []
+        for series in range(n_series):
+            offset = self.keys_offset + series * KEY_SIZE
+            key = self.mm[offset:offset + KEY_SIZE].rstrip(b'\0').decode('utf-8', 'replace')
+            route, _, status = key.rpartition('\n')
+            keys.append((route, status))
+        return keys
+
+    def register(self, route, status):
+        """Finds or adds the series under the file lock. Returns its counters index, or None if there is no room"""
+        key = self.encode_key(route, status)
+        with self.file_lock():
+            n_series = HEADER.unpack_from(self.mm)[4]
+            for series in range(n_series):
+                offset = self.keys_offset + series * KEY_SIZE
+                if self.mm[offset:offset + KEY_SIZE] == key:
+                    break
+            else:
+                if n_series >= self.get_series_limit(route):
+                    return None
+                series = n_series
+                offset = self.keys_offset + series * KEY_SIZE
+                self.mm[offset:offset + KEY_SIZE] = key
+                struct.pack_into('<I', self.mm, HEADER.size - 4, n_series + 1)
+        return self.shard_base + series * self.stride
+
+    def get_series_limit(self, route):
+        """Number of series after which a route is not registered"""
+        return self.max_series - (0 if route == OTHER_ROUTE else RESERVED_SERIES)
+
+    def update_index(self):
+        """Adds the series registered since the last update to the index of this process, without the file lock, as
+        keys are written before the number of series. The index only holds registered series, so it is bounded by
+        `max_series`. Returns the number of series"""
+        n_series = HEADER.unpack_from(self.mm)[4]
+        with self.lock:
+            for series in range(self.indexed, n_series):
+                offset = self.keys_offset + series * KEY_SIZE
+                key = self.mm[offset:offset + KEY_SIZE].rstrip(b'\0').decode('utf-8', 'replace')
+                route, _, status = key.rpartition('\n')
+                self.index[(route, status)] = self.shard_base + series * self.stride
+            self.indexed = max(self.indexed, n_series)
+        return n_series
+
+    def find(self, route, status):
+        """Returns the counters index of a series not in the index. Routes without room go to `OTHER_ROUTE` without
+        taking the file lock once the table is full"""
+        n_series = self.update_index()
+        base = self.index.get((route, status))
+        if base is None and n_series < self.get_series_limit(route):
+            base = self.register(route, status)
+            self.update_index()
+        if base is None and route != OTHER_ROUTE:
+            base = self.index.get((OTHER_ROUTE, status))
+            if base is None:
+                base = self.find(OTHER_ROUTE, status)
+        return base
+
+    def record(self, route, status, duration_us):
+        """Records a request duration. Only the first request of every series in a process takes the file lock"""
+        if self.pid != os.getpid():
+            self.claim_shard()
+        if self.shard_base is None:
+            return
+        if len(route) > MAX_ROUTE_LENGTH:
+            route = route[:MAX_ROUTE_LENGTH]
+        base = self.index.get((route, status))
+        if base is None:
+            base = self.find(route, status)
+            if base is None:
+                return
+        bucket = bisect.bisect_left(self.bounds, duration_us)
+        with self.lock:
+            self.counters[base + bucket] += 1
+            self.counters[base + self.sum_offset] += duration_us
+
+    def collect(self):
+        """Returns a dict of route and status pairs with their buckets counts (not cumulative) and sum, of all
+        shards"""
+        out = {}
+        shard_size = self.max_series * self.stride
+        for series, key in enumerate(self.get_keys()):
+            totals = [0] * self.stride
+            for shard in range(self.max_workers):
+                base = shard * shard_size + series * self.stride
+                for position, value in enumerate(self.counters[base:base + self.stride]):
+                    totals[position] += value
+            out[key] = totals
+        return out
+
+    def to_prometheus(self):
+        """Renders the histograms in Prometheus text exposition format"""
+        bounds = ['{:g}'.format(bound / 1000000) for bound in self.bounds] + ['+Inf']
+        lines = ['# HELP {} Request duration in seconds by route and status'.format(METRIC_NAME),
+                 '# TYPE {} histogram'.format(METRIC_NAME)]
+        for (route, status), totals in sorted(self.collect().items()):
+            labels = 'route="{}",status="{}"'.format(escape_label(route), escape_label(status))
+            count = 0
+            for bound, value in zip(bounds, totals):
+                count += value
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(METRIC_NAME, labels, bound, count))
+            lines.append('{}_sum{{{}}} {:g}'.format(METRIC_NAME, labels, totals[self.sum_offset] / 1000000))
+            lines.append('{}_count{{{}}} {}'.format(METRIC_NAME, labels, count))
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """Releases the memory map"""
+        self.pids.release()
+        self.counters.release()
+        self.mm.close()
+        if self.lock_fd != self.fd:
+            os.close(self.lock_fd)
+        os.close(self.fd)
@@ -0,0 +1,34 @@
+"""
+Log context shared by all the records emitted while it is set, for example during a request.
+It is stored in a `contextvars.ContextVar`, so every thread and every asyncio task sees its own context.
+"""
+import contextvars
+
+LOG_CONTEXT = contextvars.ContextVar('log_context', default=None)
+
+
+def set_log_context(fields, dynamic_fields=None):
+    """Sets the log context and returns the token to reset it.
+
+    :param dict fields: fields added to every record emitted while the context is set
+    :param callable dynamic_fields: optional callable that returns more fields, called every time the context is read
+    """
+    return LOG_CONTEXT.set((fields, dynamic_fields))
+
+
+def reset_log_context(token):
+    """Restores the log context that was set before the one that returned the token"""
+    LOG_CONTEXT.reset(token)
+
+
+def get_log_context():
+    """Returns a dict with the current log context fields, or None if there is no context set"""
+    context = LOG_CONTEXT.get()
+    if context is None:
+        return None
+    fields, dynamic_fields = context
+    if dynamic_fields is None:
+        return fields
+    out = dict(fields)
+    out.update(dynamic_fields())
+    return out
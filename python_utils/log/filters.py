@@ -0,0 +1,68 @@
+"""
+Filters decide which log records are passed on. They run before any formatting, so discarded records cost almost
+nothing.
+"""
+import collections
+import logging
+import threading
+import time
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Rate limits repeated records with a token bucket per fingerprint: logger name, level, message template (not the
+    formatted message) and exception type. Some parameters:
+    - rate: records per second allowed for every fingerprint once its burst is consumed
+    - burst: records allowed at once for every fingerprint
+    - max_fingerprints: max fingerprints remembered. The least recently seen ones are evicted
+    - by_location: fingerprint by file and line instead of by message template, for messages formatted before
+      logging them
+
+    The first record let through after some have been suppressed gets their count in a `suppressed` attribute,
+    emitted as `_suppressed` field by GELF formatters.
+    """
+
+    def __init__(self, name='', rate=1.0, burst=10, max_fingerprints=1000, by_location=False):
+        super().__init__(name)
+        self.rate = rate
+        self.burst = burst
+        self.max_fingerprints = max_fingerprints
+        self.by_location = by_location
+        self.buckets = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.suppressed = 0
+
+    def fingerprint(self, record):
+        """Returns the key that identifies repeated records"""
+        exc_type = record.exc_info[0] if record.exc_info else None
+        if self.by_location:
+            return (record.name, record.levelno, record.pathname, record.lineno, exc_type)
+        msg = record.msg if isinstance(record.msg, str) else str(record.msg)
+        return (record.name, record.levelno, msg, exc_type)
+
+    def filter(self, record):
+        if not super().filter(record):
+            return False
+        key = self.fingerprint(record)
+        now = time.monotonic()
+        with self.lock:
+            # Every bucket is a list of: available tokens, last refill time and suppressed records
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = [self.burst, now, 0]
+                self.buckets[key] = bucket
+                if len(self.buckets) > self.max_fingerprints:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
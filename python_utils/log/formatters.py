@@ -2,14 +2,26 @@
 Formatters specify the layout of log records in the final output. 
 GELF formatters are based on this spec: http://docs.graylog.org/en/2.4/pages/gelf.html#gelf-payload-specification
 """
+import collections
+import hashlib
 import json
 import logging
 import socket
 import syslog
-import time
+import threading
+
+from python_utils.log.context import get_log_context
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
 
 GELF_VERSION = '1.1'
 
+JSON_BACKEND_JSON = 'json'
+JSON_BACKEND_ORJSON = 'orjson'
+
 SYSLOG_LEVELS = {
     logging.CRITICAL: syslog.LOG_CRIT,
     logging.ERROR: syslog.LOG_ERR,
@@ -20,15 +32,160 @@ SYSLOG_LEVELS = {
 
 EXTRA_FIELDS = ['line', 'file']
 
+DEFAULT_EXC_CACHE_SIZE = 128
+
+
+def get_traceback_key(exc_info):
+    """Returns the code objects and line numbers along the frames of the exception and its chained ones, and their
+    messages. Walking the frames is much cheaper than rendering the traceback, which reads the source lines.
+
+    :param tuple exc_info: exception info as returned by `sys.exc_info()`
+    :return: tuple with a frames key and a messages key
+    """
+    frames_key = []
+    messages_key = []
+    exc_type, exc, tb = exc_info
+    seen = set()
+    while True:
+        frames = []
+        while tb is not None:
+            frames.append((tb.tb_frame.f_code, tb.tb_lineno))
+            tb = tb.tb_next
+        frames_key.append((exc_type, tuple(frames)))
+        try:
+            messages_key.append(str(exc))
+        except Exception:
+            messages_key.append(None)
+        if exc is None:
+            break
+        seen.add(id(exc))
+        if exc.__cause__ is not None:
+            exc = exc.__cause__
+        elif exc.__context__ is not None and not exc.__suppress_context__:
+            exc = exc.__context__
+        else:
+            break
+        if id(exc) in seen:
+            break
+        exc_type, tb = type(exc), exc.__traceback__
+    return tuple(frames_key), tuple(messages_key)
+
+
+def get_traceback_fingerprint(frames_key):
+    """Returns a stable hash of the frames key, the same for the same error in every process"""
+    parts = []
+    for exc_type, frames in frames_key:
+        parts.append(getattr(exc_type, '__qualname__', str(exc_type)))
+        parts.extend('{}:{}:{}'.format(code.co_filename, code.co_name, lineno) for code, lineno in frames)
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def notify_change(method):
+    """Wraps a list method to call the `on_change` callback of the list after it"""
+    def wrapper(self, *args, **kwargs):
+        out = method(self, *args, **kwargs)
+        self.on_change()
+        return out
+    return wrapper
+
+
+class ExtraFields(list):
+    """List of extra fields of a formatter, that calls `on_change` whenever it is changed in place"""
+
+    def __init__(self, fields, on_change):
+        super().__init__(fields)
+        self.on_change = on_change
+
+    append = notify_change(list.append)
+    extend = notify_change(list.extend)
+    insert = notify_change(list.insert)
+    pop = notify_change(list.pop)
+    remove = notify_change(list.remove)
+    clear = notify_change(list.clear)
+    sort = notify_change(list.sort)
+    reverse = notify_change(list.reverse)
+    __setitem__ = notify_change(list.__setitem__)
+    __delitem__ = notify_change(list.__delitem__)
+    __iadd__ = notify_change(list.__iadd__)
+    __imul__ = notify_change(list.__imul__)
+
 
 class BasicGELFFormatter(logging.Formatter):
-    """A GELF formatter to format a :class:`logging.LogRecord`."""
+    """
+    A GELF formatter to format a :class:`logging.LogRecord`. Some parameters:
+    - null_character: ends every message with a null character, as needed by GELF TCP inputs
+    - encoder_cls: JSON encoder class. With `orjson` backend only its `default` method is used
+    - extra_fields: record attributes to add as additional fields. The plan of fields is compiled again when it is
+      replaced or changed in place
+    - json_backend: `json` (default) or `orjson`. `orjson` is faster but its output is compact and not ASCII escaped,
+      and it falls back to `json` if it is not installed
+    - exc_cache_size: number of rendered tracebacks to reuse, by traceback fingerprint and message. 0 disables it
+
+    Records with exception get an `_exc_fingerprint` field that identifies the code path that raised it.
+    """
 
-    def __init__(self, null_character=False, encoder_cls=json.JSONEncoder, extra_fields=EXTRA_FIELDS):
+    def __init__(self, null_character=False, encoder_cls=json.JSONEncoder, extra_fields=EXTRA_FIELDS,
+                 json_backend=JSON_BACKEND_JSON, exc_cache_size=DEFAULT_EXC_CACHE_SIZE):
         self.null_character = null_character
         self.encoder_cls = encoder_cls
+        self.hostname = socket.gethostname()
+        self.encoder = encoder_cls()
+        self.use_orjson = json_backend == JSON_BACKEND_ORJSON and orjson is not None
+        self.exc_cache_size = exc_cache_size
+        self.exc_cache = collections.OrderedDict()
+        self.exc_cache_lock = threading.Lock()
+        self.exc_cache_hits = 0
+        self.exc_cache_misses = 0
         self.extra_fields = extra_fields
 
+    @property
+    def extra_fields(self):
+        """Record attributes to add as additional fields"""
+        return self._extra_fields
+
+    @extra_fields.setter
+    def extra_fields(self, extra_fields):
+        self._extra_fields = ExtraFields(extra_fields, self.compile_fields)
+        self.compile_fields()
+
+    def compile_fields(self):
+        """Builds once from `extra_fields` the plan of record attributes to copy as additional fields"""
+        self.extra_line = 'line' in self.extra_fields
+        self.extra_file = 'file' in self.extra_fields
+        extra_fields = list(set(self.extra_fields) - set(['line', 'file']))
+        self.extra_plan = tuple((field, '_' + field) for field in extra_fields)
+
+    def format_exception_cached(self, exc_info):
+        """Returns the traceback fingerprint and the rendered traceback, reusing it for repeated exceptions
+
+        :param tuple exc_info: exception info as returned by `sys.exc_info()`
+        :return: tuple with the fingerprint and the rendered traceback
+        """
+        key = get_traceback_key(exc_info)
+        with self.exc_cache_lock:
+            cached = self.exc_cache.get(key)
+            if cached is not None:
+                self.exc_cache.move_to_end(key)
+                self.exc_cache_hits += 1
+                return cached
+            self.exc_cache_misses += 1
+        cached = (get_traceback_fingerprint(key[0]), self.formatException(exc_info))
+        if self.exc_cache_size > 0:
+            with self.exc_cache_lock:
+                self.exc_cache[key] = cached
+                if len(self.exc_cache) > self.exc_cache_size:
+                    self.exc_cache.popitem(last=False)
+        return cached
+
+    def exc_cache_stats(self):
+        """Returns the exception cache counters"""
+        return {
+            'hits': self.exc_cache_hits,
+            'misses': self.exc_cache_misses,
+            'size': len(self.exc_cache),
+            'max_size': self.exc_cache_size,
+        }
+
     @staticmethod
     def to_syslog_level(record):
         """Map from python level representation to syslog one"""
@@ -50,30 +207,47 @@ class BasicGELFFormatter(logging.Formatter):
         :param :class:`logging.LogRecord` record: record emitted by logger. Its attribures can be seen
         in https://docs.python.org/3/library/logging.html#logrecord-attributes
         """
+        try:
+            short_message = record.message
+        except AttributeError:
+            short_message = record.getMessage()
         # Always wanted fields
         out = {
             'version': GELF_VERSION,
-            'host': getattr(record, 'host', socket.gethostname()),
-            'short_message':  getattr(record, 'message', record.getMessage()),
-            'timestamp': getattr(record, 'created', time.time()),
+            'host': getattr(record, 'host', self.hostname),
+            'short_message': short_message,
+            'timestamp': record.created,
             'level': self.to_syslog_level(record)
         }
-        out['_logger_name'] = getattr(record, 'name')
-        out['_levelname'] = getattr(record, 'levelname')
-        if getattr(record, 'exc_info', None):
-            out['full_message'] = self.formatException(getattr(record, 'exc_info'))
+        out['_logger_name'] = record.name
+        out['_levelname'] = record.levelname
+        if record.exc_info:
+            fingerprint, out['full_message'] = self.format_exception_cached(record.exc_info)
+            out['_exc_fingerprint'] = fingerprint
+        suppressed = getattr(record, 'suppressed', None)
+        if suppressed:
+            # Records suppressed by `python_utils.log.filters.RateLimitFilter` since this one was let through
+            out['_suppressed'] = suppressed
+
+        # Log context fields. Queued handlers capture the context in the emitting thread
+        context = record.__dict__.get('log_context')
+        if context is None:
+            context = get_log_context()
+        if context:
+            for field, value in context.items():
+                if value:
+                    out['_' + field] = value
 
         # Extra fields
-        if 'line' in self.extra_fields and getattr(record, 'lineno', None):
-            out['_line'] = getattr(record, 'lineno')
-        if 'file' in self.extra_fields and getattr(record, 'pathname', None):
-            out['_file'] = getattr(record, 'pathname')
+        if self.extra_line and record.lineno:
+            out['_line'] = record.lineno
+        if self.extra_file and record.pathname:
+            out['_file'] = record.pathname
 
-        extra_fields = list(set(self.extra_fields) - set(['line', 'file']))
-        for field in extra_fields:
+        for field, key in self.extra_plan:
             value = getattr(record, field, None)
             if value:
-                out['_' + field] = value
+                out[key] = value
 
         return out
 
@@ -86,11 +260,31 @@ class BasicGELFFormatter(logging.Formatter):
         """
         self.set_more_extra_fields(record)
         record_dict = self.get_gelf_fields(record)
-        out = json.dumps(record_dict, cls=self.encoder_cls)
+        if self.use_orjson:
+            out = orjson.dumps(record_dict, default=self.encoder.default).decode('utf-8')
+        else:
+            out = self.encoder.encode(record_dict)
         if self.null_character is True:
             out += '\0'
         return out
 
+    def format_bytes(self, record):
+        """Like `format` but returns UTF-8 encoded bytes, ready to be sent through a socket
+
+        :param logging.LogRecord record: Contains all the information pertinent to the event being logged.
+        :return: A JSON dump of the record.
+        :rtype: bytes
+        """
+        self.set_more_extra_fields(record)
+        record_dict = self.get_gelf_fields(record)
+        if self.use_orjson:
+            out = orjson.dumps(record_dict, default=self.encoder.default)
+        else:
+            out = self.encoder.encode(record_dict).encode('utf-8')
+        if self.null_character is True:
+            out += b'\0'
+        return out
+
 
 class BasicRequestGELFFormatter(BasicGELFFormatter):
     """A GELF formatter to format a :class:`logging.LogRecord` into GELF, adding the request status code"""
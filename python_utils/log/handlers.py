@@ -0,0 +1,399 @@
+"""
+Handlers send the log records to the appropriate destination.
+Queued handlers take formatting and writing off the thread that emits the record: records are put in a bounded
+queue and a background listener formats and flushes them in batches.
+"""
+import gzip
+import logging
+import os
+import queue
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from python_utils.log.context import get_log_context
+
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK)
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+GELF_CHUNK_MAGIC = b'\x1e\x0f'
+GELF_CHUNK_HEADER_SIZE = 12
+GELF_MAX_CHUNKS = 128
+GELF_CHUNK_SIZE_WAN = 1420
+GELF_CHUNK_SIZE_LAN = 8154
+
+COMPRESSION_ZLIB = 'zlib'
+COMPRESSION_GZIP = 'gzip'
+COMPRESSIONS = (None, COMPRESSION_ZLIB, COMPRESSION_GZIP)
+
+DEFAULT_SOCKET_TIMEOUT = 5
+DEFAULT_RECONNECT_BACKOFF = 0.5
+DEFAULT_RECONNECT_MAX_BACKOFF = 30
+
+_STOP = object()
+
+
+class BatchQueueListener(threading.Thread):
+    """
+    Daemon thread that drains a queue in batches and passes every batch to `handle_batch`.
+    A batch is handed over as soon as `batch_size` records are available or `flush_interval` seconds have passed
+    since its first record.
+    """
+
+    def __init__(self, records_queue, handle_batch, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        super().__init__(name='BatchQueueListener', daemon=True)
+        self.queue = records_queue
+        self.handle_batch = handle_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            if record is _STOP:
+                break
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            self.handle_batch(batch)
+
+    def stop(self, timeout=None):
+        """Asks the thread to finish once the records already queued are handled and waits for it"""
+        self.queue.put(_STOP)
+        self.join(timeout)
+
+
+class QueuedHandler(logging.Handler):
+    """
+    Base handler that enqueues records in a bounded queue and handles them in batches from a background thread, so
+    the emitting thread never pays for formatting nor for a slow destination. Some parameters:
+    - queue_size: max number of pending records
+    - batch_size: max number of records formatted and written at once
+    - flush_interval: max seconds a record waits for its batch to be completed
+    - overflow: what to do when the queue is full. One of `drop_oldest`, `drop_newest` or `block`
+    - block_timeout: with `block` policy, seconds to wait before dropping the record. None waits forever
+
+    Subclasses have to implement `write_batch`. When `binary` is set, it receives the messages as UTF-8 bytes, using
+    the formatter `format_bytes` method if it has one.
+    """
+    binary = False
+
+    def __init__(self, level=logging.NOTSET, queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, overflow=OVERFLOW_BLOCK, block_timeout=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow has to be one of {}'.format(', '.join(OVERFLOW_POLICIES)))
+        super().__init__(level)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.queue = None
+        self.listener = None
+        self._pid = None
+
+    def start(self):
+        """
+        Creates the queue and starts the listener. It is done lazily on first emit and again after a fork (gunicorn
+        configures logging in the master process), as threads and queue locks do not survive it.
+        """
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = BatchQueueListener(self.queue, self.handle_batch, self.batch_size, self.flush_interval)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def enqueue(self, record):
+        """Puts the record in the queue applying the overflow policy. Returns whether it was queued"""
+        if self.overflow == OVERFLOW_BLOCK:
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+            except queue.Full:
+                return False
+            return True
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == OVERFLOW_DROP_NEWEST:
+                return False
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                # Emptied by the listener meanwhile, nothing was dropped
+                pass
+            else:
+                self.dropped += 1
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                return False
+        return True
+
+    def prepare(self, record):
+        """Captures in the record what is only available in the emitting thread, as the log context"""
+        record.log_context = get_log_context() or {}
+        return record
+
+    def emit(self, record):
+        """Enqueues the record. Counters are safe as `logging.Handler.handle` holds the handler lock"""
+        try:
+            if self._pid != os.getpid():
+                self.start()
+            if self.enqueue(self.prepare(record)):
+                self.queued += 1
+            else:
+                self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def format_bytes(self, record):
+        """Formats the record into UTF-8 bytes"""
+        format_bytes = getattr(self.formatter, 'format_bytes', None)
+        if format_bytes is not None:
+            return format_bytes(record)
+        return self.format(record).encode('utf-8')
+
+    def format_batch(self, records):
+        """Formats a batch of records into a list of messages, skipping those that can not be formatted"""
+        format_record = self.format_bytes if self.binary else self.format
+        out = []
+        for record in records:
+            try:
+                out.append(format_record(record))
+            except Exception:
+                self.handleError(record)
+        return out
+
+    def write_batch(self, messages):
+        """Sends a list of formatted messages to its destination and returns how many of them were sent"""
+        raise NotImplementedError('write_batch must be implemented by QueuedHandler subclasses')
+
+    def handle_batch(self, records):
+        """Called from the listener thread with every batch of records"""
+        messages = self.format_batch(records)
+        if not messages:
+            return
+        try:
+            written = self.write_batch(messages)
+        except Exception:
+            self.failed += len(messages)
+            self.handleError(records[-1])
+            return
+        self.written += written
+        self.failed += len(messages) - written
+
+    def stats(self):
+        """Returns the counters to watch backpressure"""
+        return {
+            'queued': self.queued,
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed,
+            'pending': self.queue.qsize() if self.queue is not None else 0,
+        }
+
+    def close(self):
+        """Waits for the queued records to be written and stops the listener"""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+        self.listener = None
+        self._pid = None
+        super().close()
+
+
+class QueuedGELFHandler(QueuedHandler):
+    """
+    Queued handler that writes the formatted records to a stream, one per line, with a single write and flush per
+    batch. `stream` defaults to `sys.stdout`, and the rest of parameters are the ones of `QueuedHandler`.
+
+    It can replace a `logging.StreamHandler` in a `logging.config.dictConfig` configuration just by changing its class.
+    """
+    terminator = '\n'
+
+    def __init__(self, stream=None, **kwargs):
+        super().__init__(**kwargs)
+        self.stream = stream if stream is not None else sys.stdout
+
+    def write_batch(self, messages):
+        """Writes formatted messages to the stream with a single write and flush"""
+        self.stream.write(''.join(message + self.terminator for message in messages))
+        self.stream.flush()
+        return len(messages)
+
+
+class GELFUDPHandler(QueuedHandler):
+    """
+    Queued handler that sends every formatted record as a GELF UDP message. Messages are compressed and split in
+    chunks following the spec: http://docs.graylog.org/en/2.4/pages/gelf.html#gelf-via-udp. Some parameters:
+    - host, port: Graylog GELF UDP input address
+    - chunk_size: max size of every datagram, headers included. Use `GELF_CHUNK_SIZE_LAN` inside a LAN
+    - compression: `zlib`, `gzip` or None
+    - compress_level: compression level, from 0 to 9
+
+    Messages that would need more than 128 chunks are discarded, as Graylog would drop them. The rest of parameters
+    are the ones of `QueuedHandler`.
+    """
+    binary = True
+
+    def __init__(self, host, port=12201, chunk_size=GELF_CHUNK_SIZE_WAN, compression=COMPRESSION_ZLIB,
+                 compress_level=6, **kwargs):
+        if compression not in COMPRESSIONS:
+            raise ValueError('compression has to be one of {}'.format(', '.join(str(c) for c in COMPRESSIONS)))
+        if chunk_size <= GELF_CHUNK_HEADER_SIZE:
+            raise ValueError('chunk_size has to be greater than {}'.format(GELF_CHUNK_HEADER_SIZE))
+        super().__init__(**kwargs)
+        self.address = (host, port)
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.compress_level = compress_level
+        self.sock = None
+
+    def compress(self, data):
+        """Compresses a single message"""
+        if self.compression == COMPRESSION_ZLIB:
+            return zlib.compress(data, self.compress_level)
+        if self.compression == COMPRESSION_GZIP:
+            return gzip.compress(data, self.compress_level)
+        return data
+
+    def chunks(self, data):
+        """Returns the datagrams needed to send the data, or an empty list if it is too big"""
+        if len(data) <= self.chunk_size:
+            return [data]
+        payload_size = self.chunk_size - GELF_CHUNK_HEADER_SIZE
+        total = (len(data) + payload_size - 1) // payload_size
+        if total > GELF_MAX_CHUNKS:
+            return []
+        header = GELF_CHUNK_MAGIC + struct.pack('!Q', random.getrandbits(64))
+        return [header + struct.pack('!BB', sequence, total) + data[start:start + payload_size]
+                for sequence, start in enumerate(range(0, len(data), payload_size))]
+
+    def write_batch(self, messages):
+        """Sends every message in its datagrams. Oversized messages are not sent"""
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        written = 0
+        for message in messages:
+            datagrams = self.chunks(self.compress(message))
+            for datagram in datagrams:
+                self.sock.sendto(datagram, self.address)
+            written += bool(datagrams)
+        return written
+
+    def disconnect(self):
+        """Closes the socket, if any"""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def start(self):
+        """Sockets inherited from a parent process are not reused"""
+        self.disconnect()
+        super().start()
+
+    def close(self):
+        super().close()
+        self.disconnect()
+
+
+class GELFTCPHandler(QueuedHandler):
+    """
+    Queued handler that sends formatted records as null terminated GELF TCP messages through a persistent
+    connection, with a single `sendall` per batch. Use it with a formatter without `null_character`. Some parameters:
+    - host, port: Graylog GELF TCP input address
+    - timeout: connect and send timeout in seconds
+    - reconnect_backoff: seconds to wait before reconnecting after the first failure. Doubled on every failure
+    - reconnect_max_backoff: max seconds to wait before reconnecting
+
+    Batches that can not be sent while the connection is down are counted as failed, and only the first error is
+    reported. The rest of parameters are the ones of `QueuedHandler`.
+    """
+    binary = True
+    terminator = b'\0'
+
+    def __init__(self, host, port=12201, timeout=DEFAULT_SOCKET_TIMEOUT, reconnect_backoff=DEFAULT_RECONNECT_BACKOFF,
+                 reconnect_max_backoff=DEFAULT_RECONNECT_MAX_BACKOFF, **kwargs):
+        super().__init__(**kwargs)
+        self.address = (host, port)
+        self.timeout = timeout
+        self.reconnect_backoff = reconnect_backoff
+        self.reconnect_max_backoff = reconnect_max_backoff
+        self.sock = None
+        self.backoff = 0
+        self.next_connect = 0
+        self.down = False
+
+    def connect(self):
+        """Opens the connection if it is not open and the backoff time has passed"""
+        if self.sock is not None:
+            return
+        if time.monotonic() < self.next_connect:
+            raise ConnectionError('GELF TCP connection to {}:{} is backing off'.format(*self.address))
+        try:
+            self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        except OSError:
+            self.backoff = min(max(self.backoff * 2, self.reconnect_backoff), self.reconnect_max_backoff)
+            self.next_connect = time.monotonic() + self.backoff
+            raise
+        self.backoff = 0
+
+    def disconnect(self):
+        """Closes the connection, if any"""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def write_batch(self, messages):
+        """Sends all messages at once. A broken connection is reopened and the send retried once. While the connection
+        is down only the first error is raised, the rest of batches are dropped"""
+        if self.sock is None and time.monotonic() < self.next_connect:
+            return 0
+        data = b''.join(message + self.terminator for message in messages)
+        try:
+            for retry in (True, False):
+                self.connect()
+                try:
+                    self.sock.sendall(data)
+                    self.down = False
+                    return len(messages)
+                except OSError:
+                    self.disconnect()
+                    if not retry:
+                        raise
+        except OSError:
+            if self.down:
+                return 0
+            self.down = True
+            raise
+
+    def start(self):
+        """Connections inherited from a parent process are not reused"""
+        self.disconnect()
+        super().start()
+
+    def close(self):
+        super().close()
+        self.disconnect()
@@ -16,11 +16,24 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/thegreendog/python-utils",
     packages=setuptools.find_packages(exclude=['tests*']),
+    python_requires='>=3.7',
     install_requires=[
         'pytz',
     ],
+    extras_require={
+        # AsyncProxyGetViewMixin, with Django >= 3.1
+        'async': ['httpx'],
+        'numpy': ['numpy'],
+        'orjson': ['orjson'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
@@ -0,0 +1,75 @@
+"""Request log context tests"""
+import asyncio
+import json
+import logging
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils.functional import SimpleLazyObject
+
+from python_utils.django.log.formatters import DjangoRequestGELFFormatter
+from python_utils.django.middleware.log_context import RequestLogContextMiddleware
+from python_utils.log.context import get_log_context
+
+
+class User:
+    id = 7
+    username = 'dog'
+
+
+def make_record(**extra):
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, 'message', None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_request_log_context_middleware():
+    formatter = DjangoRequestGELFFormatter()
+    formatted = []
+
+    def view(request):
+        formatted.append(json.loads(formatter.format(make_record())))
+        request.user = User()
+        formatted.append(json.loads(formatter.format(make_record())))
+        return HttpResponse()
+
+    request = RequestFactory().get('/path/', HTTP_X_REQUEST_ID='abc')
+    request.user = SimpleLazyObject(AnonymousUser)
+    RequestLogContextMiddleware(view)(request)
+
+    assert get_log_context() is None
+    assert formatted[0]['_request_id'] == 'abc'
+    assert formatted[0]['_method'] == 'GET'
+    assert formatted[0]['_scheme'] == 'http'
+    assert formatted[0]['_path'] == '/path/'
+    # Lazy user is not loaded by logging
+    assert '_user_id' not in formatted[0]
+    assert formatted[1]['_user_id'] == '7'
+    assert formatted[1]['_username'] == 'dog'
+
+
+def test_request_log_context_middleware_async():
+    async def view(request):
+        await asyncio.sleep(0)
+        return get_log_context()
+
+    middleware = RequestLogContextMiddleware(view)
+    assert asyncio.iscoroutinefunction(middleware)
+    context = asyncio.run(middleware(RequestFactory().post('/async/')))
+    assert context['method'] == 'POST'
+    assert context['path'] == '/async/'
+    assert len(context['request_id']) == 32
+    assert get_log_context() is None
+
+
+def test_django_request_gelf_formatter_does_not_grow_extra_fields():
+    formatter = DjangoRequestGELFFormatter()
+    extra_fields = list(formatter.extra_fields)
+    request = RequestFactory().get('/')
+    request.user = User()
+    for _ in range(3):
+        out = json.loads(formatter.format(make_record(request=request)))
+    assert formatter.extra_fields == extra_fields
+    assert out['_method'] == 'GET'
+    assert out['_user_id'] == '7'
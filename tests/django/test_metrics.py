@@ -0,0 +1,34 @@
+"""Metrics middleware tests"""
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from python_utils.django.middleware import metrics as metrics_middleware
+from python_utils.django.middleware.metrics import MetricsMiddleware
+from python_utils.gunicorn.metrics import ROUTE_ENVIRON_KEY, SharedHistograms
+
+
+class ResolverMatch:
+    route = 'items/<int:pk>/'
+    view_name = 'item-detail'
+
+
+def view(request):
+    request.resolver_match = ResolverMatch()
+    return HttpResponse()
+
+
+def test_metrics_middleware(tmp_path, monkeypatch):
+    middleware = MetricsMiddleware(view)
+    assert middleware(RequestFactory().get('/metrics')).status_code == 404
+
+    path = str(tmp_path / 'metrics')
+    monkeypatch.setattr(metrics_middleware, 'METRICS_FILE', path)
+    histograms = SharedHistograms(path, create=True)
+    histograms.record('items/<int:pk>/', '200', 1000)
+    response = middleware(RequestFactory().get('/metrics'))
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert b'http_request_duration_seconds_count{route="items/<int:pk>/",status="200"} 1' in response.content
+
+    request = RequestFactory().get('/items/1/')
+    middleware(request)
+    assert request.META[ROUTE_ENVIRON_KEY] == 'items/<int:pk>/'
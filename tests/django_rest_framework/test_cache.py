@@ -0,0 +1,143 @@
+"""Upstream cache tests"""
+import time
+import types
+
+import requests
+import responses
+from rest_framework.views import APIView
+
+from python_utils.django_rest_framework import cache as cache_module
+from python_utils.django_rest_framework.cache import (DjangoUpstreamCacheBackend, UpstreamCache,
+                                                      parse_cache_control)
+from python_utils.django_rest_framework.mixins.view import ProxyDjangoViewMixin, ProxyGetViewMixin
+from python_utils.generic.circuit_breaker import CircuitBreakerRegistry
+
+from .test_mixins_view import get_initialised_view_object
+
+URL = 'https://api2.dev.domain.com/api/v1/cached/'
+
+
+class CachedProxyView(ProxyGetViewMixin, ProxyDjangoViewMixin, APIView):
+    upstream = URL
+    parameters = ('is_published',)
+    upstream_cache = None
+    cache_ttl = 30
+
+
+class Clock:
+    """Controlled `time.time` and `time.monotonic` of the cache module"""
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(cache_module, 'time', types.SimpleNamespace(time=lambda: self.now,
+                                                                       monotonic=lambda: self.now))
+
+
+def get(path=URL, headers=None):
+    view = get_initialised_view_object(CachedProxyView, path)
+    if headers:
+        view.request.META.update(headers)
+    return view.get_data(view.request)
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_parse_cache_control():
+    assert parse_cache_control('public, max-age=60, stale-while-revalidate="30", no-cache') == {
+        'public': True, 'max-age': 60, 'stale-while-revalidate': 30, 'no-cache': True}
+    assert parse_cache_control(None) == {}
+
+
+def test_fresh_and_keys(monkeypatch):
+    clock = Clock(monkeypatch)
+    CachedProxyView.upstream_cache = UpstreamCache()
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, URL, json={'results': [1], 'count': 1})
+        assert get() == {'status': 200, 'data': {'results': [1]}}
+        assert get() == {'status': 200, 'data': {'results': [1]}}
+        # Other query parameters are other keys
+        get(URL + '?is_published=true')
+        clock.now += 31
+        get()
+        assert len(rsps.calls) == 3
+    assert CachedProxyView.upstream_cache.stats() == {'hits': 1, 'stale_hits': 0, 'misses': 3, 'revalidations': 0,
+                                                      'refreshes': 0, 'circuit_open_hits': 0}
+
+
+def test_keys_by_headers_and_copies():
+    cache = UpstreamCache()
+    assert cache.get_key(URL, {}, {'Accept-Language': 'en'}) != cache.get_key(URL, {}, {'Accept-Language': 'es'})
+    # Responses to other credentials are not shared
+    assert (cache.get_key(URL, {}, {'Authorization': 'Token a'}) !=
+            cache.get_key(URL, {}, {'Authorization': 'Token b'}))
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, URL, json={'results': [1]})
+        _, data, _ = cache.get('key', lambda headers: requests.get(URL, headers=headers))
+        data['results'].append(2)
+        assert cache.get('key', None) == (200, {'results': [1]}, True)
+
+
+def test_cache_control_and_revalidation(monkeypatch):
+    clock = Clock(monkeypatch)
+    CachedProxyView.upstream_cache = UpstreamCache()
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, URL, json={'results': [1]}, headers={'Cache-Control': 'max-age=5', 'ETag': '"v1"'})
+        rsps.add(responses.GET, URL, status=304, headers={'Cache-Control': 'max-age=10'})
+        assert get()['data'] == {'results': [1]}
+        clock.now += 6
+        assert get()['data'] == {'results': [1]}
+        assert rsps.calls[1].request.headers['If-None-Match'] == '"v1"'
+        clock.now += 9
+        assert get()['data'] == {'results': [1]}
+        assert len(rsps.calls) == 2
+    assert CachedProxyView.upstream_cache.revalidations == 1
+
+
+def test_not_cacheable(monkeypatch):
+    Clock(monkeypatch)
+    CachedProxyView.upstream_cache = UpstreamCache()
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, URL, json={}, headers={'Cache-Control': 'no-store'})
+        rsps.add(responses.GET, URL, body='error', status=500)
+        assert get() == {'status': 200, 'data': {}}
+        assert get() == {'status': 500}
+        assert get() == {'status': 500}
+        assert len(rsps.calls) == 3
+
+
+def test_stale_while_revalidate(monkeypatch):
+    clock = Clock(monkeypatch)
+    CachedProxyView.upstream_cache = UpstreamCache(backend=DjangoUpstreamCacheBackend(), stale_while_revalidate=60)
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, URL, json={'version': 1})
+        rsps.add(responses.GET, URL, json={'version': 2})
+        assert get()['data'] == {'version': 1}
+        clock.now += 31
+        assert get()['data'] == {'version': 1}
+        wait_for(lambda: CachedProxyView.upstream_cache.refreshes == 1)
+        assert get()['data'] == {'version': 2}
+        assert len(rsps.calls) == 2
+    assert CachedProxyView.upstream_cache.stats()['stale_hits'] == 1
+
+
+def test_circuit_open_serves_cache(monkeypatch):
+    clock = Clock(monkeypatch)
+    CachedProxyView.upstream_cache = UpstreamCache()
+    monkeypatch.setattr(CachedProxyView, 'circuit_breakers', CircuitBreakerRegistry(min_requests=2))
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, URL, json={'version': 1}, headers={'ETag': '"v1"'})
+        rsps.add(responses.GET, URL + '?is_published=true', body='error', status=500)
+        assert get()['data'] == {'version': 1}
+        assert get(URL + '?is_published=true') == {'status': 500}
+        clock.now += 31
+        # The circuit of the host is open: cached responses are served even if stale, the others fail fast
+        assert get()['data'] == {'version': 1}
+        assert get(URL + '?is_published=true') == {
+            'status': 503, 'data': {'detail': 'Upstream temporarily unavailable'}}
+        assert len(rsps.calls) == 2
+    assert CachedProxyView.upstream_cache.stats()['circuit_open_hits'] == 1
@@ -0,0 +1,120 @@
+"""Async proxy view tests"""
+import asyncio
+import http.server
+import json
+import threading
+import time
+
+import pytest
+from django.test import RequestFactory
+from django.views import View
+
+from python_utils.django_rest_framework.mixins.async_view import AsyncProxyGetViewMixin
+from python_utils.django_rest_framework.mixins.view import ProxyDjangoViewMixin
+from python_utils.generic.sessions import AsyncClientRegistry
+
+pytest.importorskip('httpx')
+
+DELAY = 0.2
+
+
+class SlowUpstreamHandler(http.server.BaseHTTPRequestHandler):
+    """Keep alive handler that answers the query string after a delay"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.cookies.append(self.headers.get('Cookie'))
+        time.sleep(DELAY)
+        if self.path.startswith('/empty/'):
+            body = b'not json'
+        else:
+            body = json.dumps({'path': self.path, 'count': 1, 'results': []}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'sessionid={}; Path=/'.format(self.path))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name='slow_upstream')
+def slow_upstream_fixture():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowUpstreamHandler)
+    server.daemon_threads = True
+    server.cookies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_view(base_url, path, **kwargs):
+    class AsyncProxyViewTest(AsyncProxyGetViewMixin, ProxyDjangoViewMixin, View):
+        upstream = base_url + '/items/{id}/'
+        parameters = ('is_published',)
+        clients = AsyncClientRegistry()
+
+    view = AsyncProxyViewTest()
+    request = RequestFactory().get(path)
+    view.setup(request, **kwargs)
+    return view, request
+
+
+def test_async_proxy_get_view(slow_upstream):
+    view, request = get_view(slow_upstream.url, '/items/?is_published=true&other=1', id='1')
+
+    async def run():
+        try:
+            # Two users: the cookie set for the first one is not sent for the second one
+            first = await view.get(request, id='1')
+            await view.get(request, id='1')
+            return first, view.clients.stats()
+        finally:
+            await view.clients.aclose()
+
+    response, stats = asyncio.run(run())
+    assert response.status_code == 200
+    # keys_to_remove and query parameters of the proxy mixin
+    assert json.loads(response.content) == {'path': '/items/1/?is_published=true', 'results': []}
+    assert stats == {'clients': 1, 'created': 1, 'closed': 0, 'max_connections': 1000}
+    assert slow_upstream.cookies == [None, None]
+    assert view.clients.stats()['closed'] == 1
+
+    view, request = get_view(slow_upstream.url, '/empty/')
+    view.upstream = slow_upstream.url + '/empty/'
+    response = asyncio.run(view.get(request))
+    assert response.status_code == 200
+    assert response.content == b''
+
+
+def test_async_proxy_concurrent_requests(slow_upstream):
+    views = [get_view(slow_upstream.url, '/items/', id=str(position)) for position in range(50)]
+    clients = AsyncClientRegistry()
+
+    async def run():
+        try:
+            for view, _ in views:
+                view.clients = clients
+            return await asyncio.gather(*(view.get(request) for view, request in views))
+        finally:
+            await clients.aclose()
+
+    start = time.monotonic()
+    responses = asyncio.run(run())
+    elapsed = time.monotonic() - start
+    assert [json.loads(response.content)['path'] for response in responses] == [
+        '/items/{}/'.format(position) for position in range(50)]
+    # Sequential requests would take 50 * DELAY seconds
+    assert elapsed < 50 * DELAY / 4
+
+
+def test_async_clients_closed_with_their_loop(slow_upstream):
+    view, request = get_view(slow_upstream.url, '/items/', id='1')
+    # A loop for every request, as async views under WSGI
+    for _ in range(3):
+        assert asyncio.run(view.get(request)).status_code == 200
+    assert view.clients.stats() == {'clients': 0, 'created': 3, 'closed': 3, 'max_connections': 1000}
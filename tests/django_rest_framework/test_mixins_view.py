@@ -1,16 +1,24 @@
 """Mixin view tests"""
 import json
+import threading
+import time
 from functools import partial
 
+from django.http import StreamingHttpResponse
 from rest_framework.test import APIRequestFactory
 from rest_framework import status as rfstatus
 from rest_framework.views import APIView
 import pytest
+import requests
 import responses
 
+from python_utils.django_rest_framework.cache import UpstreamCache
 from python_utils.django_rest_framework.mixins.view import (
-    ProxyDjangoViewMixin, ProxyEveViewMixin, ProxyBaseViewMixin,
-    OpenViewMixin, ProxyGetViewMixin)
+    ON_ERROR_NULL, ON_ERROR_OMIT, ProxyAggregateViewMixin, ProxyDjangoViewMixin, ProxyEveViewMixin, ProxyBaseViewMixin,
+    OpenViewMixin, ProxyGetViewMixin, UpstreamPageError)
+from python_utils.generic.circuit_breaker import CircuitBreakerRegistry
+from python_utils.generic.hedging import Hedger, LatencyTracker
+from python_utils.generic.single_flight import SingleFlight
 
 
 class ProxyBaseViewMixinTest(ProxyBaseViewMixin, APIView):
@@ -138,10 +146,13 @@ def test_view_proxy_get_view_mixin():
     # Check get method
     newsfeed_view = get_initialised_view_object(
         ProxyGetViewMixinTest, ProxyGetViewMixinTest.upstream)
+    host_stats = ProxyGetViewMixinTest.sessions.stats().get('https://api2.dev.domain.com', {})
+    requests_before = host_stats.get('requests', 0)
     with responses.RequestsMock() as rsps:
         url = ProxyGetViewMixinTest.upstream
         mocked_response = {'results': [], 'count': 0, 'previous': None, 'next': None}
-        rsps.add(responses.GET, url, json=mocked_response, status=rfstatus.HTTP_200_OK, content_type='application/json')
+        rsps.add(responses.GET, url, json=mocked_response, status=rfstatus.HTTP_200_OK,
+                 content_type='application/json')
 
         method_call_result = newsfeed_view.get(newsfeed_view.request)
         for keys_to_remove in ProxyGetViewMixinTest.keys_to_remove:
@@ -150,3 +161,351 @@ def test_view_proxy_get_view_mixin():
         ProxyGetViewMixinTest.keys_to_remove = ()
         method_call_result = newsfeed_view.get(newsfeed_view.request)
         assert mocked_response == method_call_result.data
+
+    # Upstream requests share the pooled session of the host
+    assert ProxyGetViewMixinTest.sessions.stats()['https://api2.dev.domain.com']['requests'] == requests_before + 2
+
+
+def test_view_proxy_get_view_mixin_single_flight():
+    single_flight = SingleFlight()
+
+    class SingleFlightView(ProxyGetViewMixin, ProxyDjangoViewMixin, APIView):
+        upstream = 'https://api2.dev.domain.com/api/v1/single-flight/'
+
+    SingleFlightView.single_flight = single_flight
+
+    def slow_upstream(request):  # pylint: disable=unused-argument
+        time.sleep(0.3)
+        return (200, {}, json.dumps({'results': [1], 'count': 1}))
+
+    views = [get_initialised_view_object(SingleFlightView, SingleFlightView.upstream) for _ in range(5)]
+    results = [None] * len(views)
+
+    def get_data(position):
+        results[position] = views[position].get_data(views[position].request)
+
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, SingleFlightView.upstream, callback=slow_upstream)
+        threads = [threading.Thread(target=get_data, args=(position,)) for position in range(len(views))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(rsps.calls) == 1
+    assert results == [{'status': 200, 'data': {'results': [1]}}] * len(views)
+    assert results[0]['data']['results'] is not results[1]['data']['results']
+    assert single_flight.stats()['coalesced'] == len(views) - 1
+
+
+class ProxyAggregateViewMixinTest(ProxyAggregateViewMixin, APIView):
+    single_flight = None
+    upstreams = {
+        'community': {
+            'upstream': 'https://api2.dev.domain.com/api/v1/communities/{id}/',
+        },
+        'contents': {
+            'upstream': partial('{base_url}/contents/'.format, base_url='https://api2.dev.domain.com/api/v1'),
+            'query_params': lambda view: {'community': view.kwargs['id']},
+            'keys_to_remove': ('_meta', '_links'),
+            'on_error': ON_ERROR_NULL,
+        },
+        'members': {
+            'upstream': 'https://api2.dev.domain.com/api/v1/members/',
+            'query_params': 'get_members_query_params',
+            'on_error': ON_ERROR_OMIT,
+        },
+    }
+
+    def get_members_query_params(self):
+        return {'community': self.kwargs['id'], 'page_size': 5}
+
+
+def slow_json_callback(body, delay=0.3, status=200):
+    def callback(request):  # pylint: disable=unused-argument
+        time.sleep(delay)
+        return (status, {}, json.dumps(body))
+    return callback
+
+
+def test_view_proxy_aggregate_view_mixin():
+    view = get_initialised_view_object(ProxyAggregateViewMixinTest, '/aggregate/', id='7')
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, 'https://api2.dev.domain.com/api/v1/communities/7/',
+                          callback=slow_json_callback({'id': 7}))
+        rsps.add_callback(responses.GET, 'https://api2.dev.domain.com/api/v1/contents/',
+                          callback=slow_json_callback({'_items': [1], '_meta': {}, '_links': {}}))
+        rsps.add_callback(responses.GET, 'https://api2.dev.domain.com/api/v1/members/',
+                          callback=slow_json_callback({'results': ['a']}))
+        start = time.monotonic()
+        response = view.get(view.request)
+        # Upstreams are fetched concurrently
+        assert time.monotonic() - start < 0.8
+        assert sorted(call.request.url for call in rsps.calls) == [
+            'https://api2.dev.domain.com/api/v1/communities/7/',
+            'https://api2.dev.domain.com/api/v1/contents/?community=7',
+            'https://api2.dev.domain.com/api/v1/members/?community=7&page_size=5',
+        ]
+    assert response.status_code == 200
+    assert response.data == {'community': {'id': 7}, 'contents': {'_items': [1]}, 'members': {'results': ['a']}}
+
+
+def test_view_proxy_aggregate_view_mixin_errors():
+    view = get_initialised_view_object(ProxyAggregateViewMixinTest, '/aggregate/', id='7')
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        rsps.add_callback(responses.GET, 'https://api2.dev.domain.com/api/v1/communities/7/',
+                          callback=slow_json_callback({'id': 7}, delay=0))
+        rsps.add_callback(responses.GET, 'https://api2.dev.domain.com/api/v1/contents/',
+                          callback=slow_json_callback({'detail': 'Error'}, delay=0, status=500))
+        rsps.add(responses.GET, 'https://api2.dev.domain.com/api/v1/members/', body=ConnectionError('refused'))
+        response = view.get(view.request)
+        # Optional upstreams are null or omitted, with their errors
+        assert response.status_code == 200
+        assert response.data == {
+            'community': {'id': 7},
+            'contents': None,
+            '_errors': {
+                'contents': {'status': 500, 'detail': {'detail': 'Error'}},
+                'members': {'status': 502, 'detail': 'refused'},
+            },
+        }
+
+        # Required upstreams make the view fail with their status
+        rsps.replace(responses.GET, 'https://api2.dev.domain.com/api/v1/communities/7/',
+                     json={'detail': 'Not found'}, status=404)
+        response = view.get(view.request)
+        assert response.status_code == 404
+        assert response.data['_errors']['community'] == {'status': 404, 'detail': {'detail': 'Not found'}}
+        # Along with the data of the rest of upstreams
+        assert response.data['contents'] is None
+
+        # Overall deadline
+        rsps.remove(responses.GET, 'https://api2.dev.domain.com/api/v1/communities/7/')
+        rsps.add_callback(responses.GET, 'https://api2.dev.domain.com/api/v1/communities/7/',
+                          callback=slow_json_callback({'id': 7}, delay=0.5))
+        view.aggregation_timeout = 0.1
+        response = view.get(view.request)
+        assert response.status_code == 504
+        assert response.data['_errors']['community'] == {'status': 504, 'detail': 'Upstream deadline exceeded'}
+
+
+def test_view_proxy_aggregate_view_mixin_upstream_timeout():
+    view = get_initialised_view_object(ProxyAggregateViewMixinTest, '/aggregate/', id='7')
+    view.timeout = 5
+    view.aggregation_timeout = 2
+    assert view.get_upstream_timeout({}) == 2
+    assert view.get_upstream_timeout({'timeout': 1}) == 1
+    assert view.get_upstream_timeout({'timeout': (1, 10)}) == (1, 2)
+    view.aggregation_timeout = None
+    assert view.get_upstream_timeout({}) == 5
+
+
+def test_view_proxy_get_view_mixin_stream_response():
+    class StreamView(ProxyGetViewMixin, ProxyEveViewMixin, APIView):
+        upstream = 'https://api2.dev.domain.com/api/v1/stream/'
+        stream_response = True
+        stream_chunk_size = 7
+
+    view = get_initialised_view_object(StreamView, StreamView.upstream)
+    body = {'_items': [{'title': 'a' * 20, 'n': index} for index in range(20)], '_meta': {'total': 20}, '_links': {}}
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, StreamView.upstream, json=body, status=rfstatus.HTTP_200_OK,
+                 headers={'ETag': '"v1"', 'Cache-Control': 'max-age=60', 'Set-Cookie': 'sessionid=1'})
+        response = view.get(view.request)
+        assert isinstance(response, StreamingHttpResponse)
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/json'
+        assert json.loads(b''.join(response.streaming_content)) == {'_items': body['_items']}
+        # Only safe headers are forwarded, and the ETag of a filtered body is weak
+        assert (response['ETag'], response['Cache-Control']) == ('W/"v1"', 'max-age=60')
+        assert not response.has_header('Set-Cookie')
+
+        # Without keys to remove the body is passed through as is
+        StreamView.keys_to_remove = ()
+        response = view.get(view.request)
+        assert b''.join(response.streaming_content) == json.dumps(body).encode('utf-8')
+        assert response['ETag'] == '"v1"'
+
+        rsps.replace(responses.GET, StreamView.upstream, body='Not found', status=404, content_type='text/plain')
+        response = view.get(view.request)
+        assert response.status_code == 404
+        assert b''.join(response.streaming_content) == b'Not found'
+
+
+def test_view_proxy_get_view_mixin_stream_response_closed_without_iterating(monkeypatch):
+    class StreamView(ProxyGetViewMixin, ProxyEveViewMixin, APIView):
+        upstream = 'https://api2.dev.domain.com/api/v1/stream/'
+        stream_response = True
+
+    closed = []
+    response_close = requests.Response.close
+    monkeypatch.setattr(requests.Response, 'close', lambda res: closed.append(res) or response_close(res))
+    view = get_initialised_view_object(StreamView, StreamView.upstream)
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, StreamView.upstream, json={'_items': []}, status=rfstatus.HTTP_200_OK)
+        response = view.get(view.request)
+        assert not closed
+        # As Django does when the client disconnects before the body is sent
+        response.close()
+        assert len(closed) == 1
+
+
+def test_view_proxy_get_view_mixin_hedging_and_circuit_breaker():
+    class HedgedView(ProxyGetViewMixin, ProxyDjangoViewMixin, APIView):
+        upstream = 'https://api2.dev.domain.com/api/v1/hedged/'
+        single_flight = None
+        latencies = LatencyTracker(min_samples=5)
+        hedger = Hedger(max_ratio=1)
+        hedge_percentile = 90
+        circuit_breakers = CircuitBreakerRegistry(min_requests=5, reset_timeout=60)
+
+    calls = []
+
+    def upstream(request):  # pylint: disable=unused-argument
+        calls.append(1)
+        # One slow replica
+        time.sleep(1 if len(calls) == 6 else 0.01)
+        return (200, {}, json.dumps({'results': [len(calls)]}))
+
+    view = get_initialised_view_object(HedgedView, HedgedView.upstream)
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, HedgedView.upstream, callback=upstream)
+        for _ in range(5):
+            view.get_data(view.request)
+        # Once the latency percentiles are known, slow requests are hedged after the percentile 90
+        start = time.monotonic()
+        assert view.get_data(view.request) == {'status': 200, 'data': {'results': [7]}}
+        assert time.monotonic() - start < 0.5
+    assert HedgedView.hedger.stats()['hedge_wins'] == 1
+    assert HedgedView.latencies.stats()['https://api2.dev.domain.com']['samples'] >= 6
+
+    HedgedView.circuit_breakers = CircuitBreakerRegistry(min_requests=5, reset_timeout=60)
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, HedgedView.upstream, body='error', status=500)
+        for _ in range(5):
+            assert view.get_data(view.request) == {'status': 500}
+        # Failing upstreams fail fast
+        assert view.get_data(view.request) == {'status': 503, 'data': {'detail': 'Upstream temporarily unavailable'}}
+        assert len(rsps.calls) == 5
+    assert HedgedView.circuit_breakers.stats()['https://api2.dev.domain.com']['state'] == 'open'
+
+
+def test_view_proxy_get_view_mixin_records_failed_latencies():
+    class FailingView(ProxyGetViewMixin, ProxyDjangoViewMixin, APIView):
+        upstream = 'https://api3.dev.domain.com/api/v1/failing/'
+        latencies = LatencyTracker(min_samples=1)
+
+    view = get_initialised_view_object(FailingView, FailingView.upstream)
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, FailingView.upstream, body=requests.ConnectionError('Connection refused'))
+        with pytest.raises(requests.ConnectionError):
+            view.fetch(FailingView.upstream, {}, {})()
+    assert FailingView.latencies.stats()['https://api3.dev.domain.com']['samples'] == 1
+
+
+class FetchAllDjangoView(ProxyGetViewMixin, ProxyDjangoViewMixin, APIView):
+    upstream = 'https://api2.dev.domain.com/api/v1/all/'
+    page_size = 3
+    single_flight = None
+
+
+class PagesUpstream:
+    """Django paginated upstream of 10 items, recording the requests in flight at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def __call__(self, request):
+        page = int(request.params.get('page', 1))
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.2)
+        with self.lock:
+            self.in_flight -= 1
+        results = list(range((page - 1) * 3, min(page * 3, 10)))
+        if not results:
+            return (404, {}, json.dumps({'detail': 'Invalid page.'}))
+        return (200, {}, json.dumps({'count': 10, 'next': 'next' if page < 4 else None, 'results': results}))
+
+
+def test_view_proxy_fetch_all_pages_concurrently():
+    view = get_initialised_view_object(FetchAllDjangoView, '/all/?page=3')
+    upstream = PagesUpstream()
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, FetchAllDjangoView.upstream, callback=upstream)
+        assert list(view.fetch_all()) == list(range(10))
+        # The first page, and then the other 3 at once
+        assert rsps.calls[0].request.params['page'] == '1'
+        assert sorted(call.request.params['page'] for call in rsps.calls[1:]) == ['2', '3', '4']
+        assert upstream.max_in_flight == 3
+
+        rsps.replace(responses.GET, FetchAllDjangoView.upstream, json={'detail': 'Error'}, status=500)
+        with pytest.raises(UpstreamPageError):
+            list(view.fetch_all())
+
+
+def test_view_proxy_fetch_all_eve_without_total():
+    class FetchAllEveView(ProxyGetViewMixin, ProxyEveViewMixin, APIView):
+        upstream = 'https://api2.dev.domain.com/api/v1/eve-all/'
+        single_flight = None
+
+    def eve_pages(request):
+        page = int(request.params.get('page', 1))
+        links = {'next': {'href': 'next'}} if page < 3 else {}
+        return (200, {}, json.dumps({'_items': [page], '_meta': {'page': page}, '_links': links}))
+
+    view = get_initialised_view_object(FetchAllEveView, '/eve-all/')
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, FetchAllEveView.upstream, callback=eve_pages)
+        assert list(view.fetch_all()) == [1, 2, 3]
+
+
+def test_view_proxy_prefetch_next_page():
+    class DeferredExecutor:
+        """Keeps the prefetches to run them when asked"""
+        pending = []
+
+        def submit(self, func):
+            self.pending.append(func)
+
+        def run(self):
+            """Runs the pending prefetches, returning how many there were"""
+            pending = list(self.pending)
+            self.pending.clear()
+            for func in pending:
+                func()
+            return len(pending)
+
+    class PrefetchView(FetchAllDjangoView):
+        upstream_cache = UpstreamCache()
+        prefetch_next_page = True
+        executor = DeferredExecutor()
+
+    def get_data(path):
+        view = get_initialised_view_object(PrefetchView, path)
+        return view.get_data(view.request)['data']
+
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, PrefetchView.upstream, callback=PagesUpstream())
+        assert get_data('/all/?page=2') == {'results': [3, 4, 5]}
+        # The next page is prefetched once while it is in flight
+        assert get_data('/all/?page=2') == {'results': [3, 4, 5]}
+        assert PrefetchView.executor.run() == 1
+        # The next page is served from the cache
+        assert get_data('/all/?page=3') == {'results': [6, 7, 8]}
+        assert PrefetchView.upstream_cache.stats()['hits'] == 2
+        assert PrefetchView.executor.run() == 1
+        # Next pages already fresh in the cache are not prefetched again
+        assert get_data('/all/?page=2') == {'results': [3, 4, 5]}
+        assert PrefetchView.executor.run() == 0
+        assert [call.request.params['page'] for call in rsps.calls] == ['2', '3', '4']
+        assert not PrefetchView.upstream_cache.prefetching
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, PrefetchView.upstream, json={'count': 10, 'next': 'next', 'results': []})
+        # Pages that are not numbers are not prefetched
+        assert get_data('/all/?page=last') == {'results': []}
+        assert len(rsps.calls) == 1
+        assert PrefetchView.executor.run() == 0
@@ -1,4 +1,8 @@
 from django.conf.urls import url
 
+from tests.django_test_app import views
+
 urlpatterns = [
+    url(r'^bench/io/$', views.io_view),
+    url(r'^bench/cpu/$', views.cpu_view),
 ]
@@ -0,0 +1,15 @@
+"""Views used by the benchmarks"""
+import time
+
+from django.http import JsonResponse
+
+
+def io_view(request):
+    """Simulates a view that waits for an upstream"""
+    time.sleep(0.02)
+    return JsonResponse({'results': []})
+
+
+def cpu_view(request):
+    """Simulates a view that computes"""
+    return JsonResponse({'result': sum(i * i for i in range(20000))})
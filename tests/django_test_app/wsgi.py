@@ -0,0 +1,8 @@
+"""WSGI config for the test project, used by the benchmarks"""
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.django_test_app.settings")
+
+application = get_wsgi_application()
@@ -0,0 +1,129 @@
+"""Eve response cache tests"""
+import time
+
+import pytest
+from eve import Eve
+from eve.auth import BasicAuth
+from eve.io.mongo.mongo import Mongo
+from flask import Flask, jsonify
+
+from python_utils.eve.utils.cache import DjangoCacheBackend, LocalCacheBackend, ResponseCache
+from python_utils.eve.utils.datetime_utils import MyMongo
+
+
+@pytest.fixture(name='cached_app')
+def cached_app_fixture():
+    """Flask app with Eve like endpoints, and the number of times their views are called"""
+    app = Flask(__name__)
+    app.config['SOURCES'] = {'items': {'source': 'items'}, 'active_items': {'source': 'items'},
+                             'users': {'source': 'users'}}
+    calls = []
+
+    def resource_view(resource):
+        calls.append(resource)
+        return jsonify({'_items': [], 'calls': len(calls)})
+
+    for resource in ('items', 'active_items', 'users'):
+        app.add_url_rule('/{}'.format(resource), '{}|resource'.format(resource),
+                         lambda resource=resource: resource_view(resource), methods=['GET', 'POST'])
+    app.add_url_rule('/items/<item_id>', 'items|item_lookup', lambda item_id: resource_view(item_id))
+    cache = ResponseCache(LocalCacheBackend(max_entries=3, ttl=60))
+    cache.init_app(app)
+    return app, cache, calls
+
+
+def test_hits_and_keys(cached_app):
+    app, cache, calls = cached_app
+    client = app.test_client()
+    first = client.get('/items?where={"a":1}&page=2')
+    assert first.get_json()['calls'] == 1
+    assert first.headers['ETag']
+    second = client.get('/items?page=2&where={"a":1}')
+    assert second.get_data() == first.get_data()
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.headers['Content-Type'] == 'application/json'
+    client.get('/items?where={"a":1}&page=3')
+    client.get('/items?where={"a":1}&page=2', headers={'Authorization': 'Basic other'})
+    client.post('/items')
+    assert len(calls) == 4
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'not_modified': 0, 'stores': 3, 'invalidations': 0,
+                             'entries': 3, 'evictions': 0, 'expirations': 0}
+
+
+def test_not_modified(cached_app):
+    app, cache, _ = cached_app
+    client = app.test_client()
+    etag = client.get('/items/1').headers['ETag']
+    response = client.get('/items/1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert cache.not_modified == 1
+
+
+def test_invalidation_by_collection(cached_app):
+    app, cache, calls = cached_app
+    client = app.test_client()
+    for path in ('/items', '/active_items', '/users'):
+        client.get(path)
+    with app.app_context():
+        cache.invalidate('active_items')
+    for path in ('/items', '/active_items', '/users'):
+        client.get(path)
+    assert calls == ['items', 'active_items', 'users', 'items', 'active_items']
+
+
+def test_cached_responses_authorized(cached_app):
+    app, cache, calls = cached_app
+    users = {'admin'}
+
+    class UsersAuth(BasicAuth):
+        def check_auth(self, username, password, allowed_roles, resource, method):
+            return username in users
+
+    app.config['DOMAIN'] = {
+        'items': {'public_methods': [], 'allowed_roles': [], 'allowed_read_roles': [], 'public_item_methods': [],
+                  'allowed_item_roles': [], 'allowed_item_read_roles': [], 'authentication': UsersAuth}}
+    client = app.test_client()
+    headers = {'Authorization': 'Basic YWRtaW46c2VjcmV0'}
+    assert client.get('/items', headers=headers).status_code == 200
+    assert client.get('/items', headers=headers).status_code == 200
+    # Credentials no longer valid do not get the cached response
+    users.clear()
+    assert client.get('/items', headers=headers).status_code == 401
+    assert (len(calls), cache.hits) == (1, 1)
+
+
+def test_local_backend_bounds(monkeypatch):
+    backend = LocalCacheBackend(max_entries=2, ttl=10)
+    for key in 'abc':
+        backend.set(key, key)
+    assert backend.get('a') is None and backend.get('b') == 'b'
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert backend.get('c') is None
+    assert backend.stats() == {'entries': 1, 'evictions': 1, 'expirations': 1}
+
+
+def test_mymongo_writes_invalidate(monkeypatch):
+    cache = ResponseCache()
+    app = Eve(settings={'DOMAIN': {'items': {'schema': {'a': {'type': 'string'}}}}, 'RESPONSE_CACHE': cache},
+              data=MyMongo)
+    for method in ('insert', 'update', 'replace', 'remove'):
+        monkeypatch.setattr(Mongo, method, lambda *args: None)
+    with app.app_context():
+        app.data.insert('items', {})
+        app.data.update('items', 1, {}, {})
+        app.data.replace('items', 1, {}, {})
+        app.data.remove('items', {})
+    assert cache.invalidations == 4
+    assert cache.backend.get_generation('items') == 4
+
+
+def test_django_backend():
+    backend = DjangoCacheBackend(ttl=10, key_prefix='test_eve_response')
+    backend.set('test_eve_response:key', (b'{}', 'etag', []))
+    assert backend.get('test_eve_response:key') == (b'{}', 'etag', [])
+    assert backend.get_generation('items') == 0
+    backend.incr_generation('items')
+    backend.incr_generation('items')
+    assert backend.get_generation('items') == 2
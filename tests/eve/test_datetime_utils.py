@@ -0,0 +1,69 @@
+"""Eve datetime utils tests"""
+import datetime
+import json
+
+import pytz
+from bson import ObjectId, decimal128
+from bson.dbref import DBRef
+from eve.io.mongo.mongo import MongoJSONEncoder
+
+from python_utils.eve.utils.datetime_utils import (DATETIME_CACHE_SIZE, MyMongo, MyMongoJSONEncoder,
+                                                   MyMongoORJSONEncoder, format_datetime)
+from python_utils.generic.datetime_utils import get_fixed_timezone, print_datetime
+
+
+class ChainJSONEncoder(MongoJSONEncoder):
+    """Previous `MyMongoJSONEncoder`, walking the encoders chain"""
+
+    def default(self, obj):  # pylint: disable=E0202
+        if isinstance(obj, datetime.datetime):
+            return print_datetime(obj)
+        return super().default(obj)
+
+
+class MyDatetime(datetime.datetime):
+    """Datetime subclass, not in the dispatch table"""
+
+
+DOCUMENT = {
+    '_id': ObjectId('5d0b6e1f8f1b2c3d4e5f6a7b'),
+    '_created': datetime.datetime(2019, 6, 15, 10, 20, 30, 123456),
+    '_updated': datetime.datetime(2019, 6, 15, 10, 20, 30, tzinfo=pytz.utc),
+    'local': datetime.datetime(2019, 6, 15, 10, 20, 30, tzinfo=get_fixed_timezone(120)),
+    'subclass': MyDatetime(2019, 6, 15, 10, 20, 30),
+    'day': datetime.date(2019, 6, 15),
+    'time': datetime.time(10, 20),
+    'owner': DBRef('users', ObjectId('5d0b6e1f8f1b2c3d4e5f6a7c'), 'db'),
+    'price': decimal128.Decimal128('10.50'),
+    'tags': {'a'},
+    'name': 'ñandú',
+    'items': [{'at': datetime.datetime(2019, 6, 15, 8, 20, 30, tzinfo=pytz.utc), 'count': 3}],
+}
+
+
+def test_dispatch_matches_encoders_chain():
+    assert json.dumps(DOCUMENT, cls=MyMongoJSONEncoder) == json.dumps(DOCUMENT, cls=ChainJSONEncoder)
+    assert MyMongo.json_encoder_class is MyMongoJSONEncoder
+
+
+def test_datetime_cache_keeps_timezones():
+    encoder = MyMongoJSONEncoder()
+    utc_value = datetime.datetime(2019, 6, 15, 8, tzinfo=pytz.utc)
+    same_instant = datetime.datetime(2019, 6, 15, 10, tzinfo=get_fixed_timezone(120))
+    assert utc_value == same_instant
+    assert encoder.default(utc_value) == '2019-06-15T08:00:00Z'
+    assert encoder.default(same_instant) == '2019-06-15T10:00:00+02:00'
+    assert encoder.default(datetime.datetime(2019, 6, 15, 8)) == '2019-06-15T08:00:00Z'
+    assert encoder.default(utc_value) == '2019-06-15T08:00:00Z'
+    assert format_datetime.cache_info().maxsize == DATETIME_CACHE_SIZE
+
+
+def test_orjson_encoder():
+    expected = json.loads(json.dumps(DOCUMENT, cls=ChainJSONEncoder, sort_keys=True))
+    out = json.dumps(DOCUMENT, cls=MyMongoORJSONEncoder, sort_keys=True)
+    assert json.loads(out) == expected
+    assert list(json.loads(out)) == sorted(DOCUMENT)
+    # Pretty printed and not orjson encodable values fall back to json
+    assert json.dumps(DOCUMENT, cls=MyMongoORJSONEncoder, indent=4) == json.dumps(DOCUMENT, cls=ChainJSONEncoder,
+                                                                                    indent=4)
+    assert json.dumps({1: 2 ** 70}, cls=MyMongoORJSONEncoder) == '{"1": 1180591620717411303424}'
@@ -0,0 +1,120 @@
+"""Eve NDJSON export tests"""
+import datetime
+import json
+
+import pytest
+import pytz
+from bson import ObjectId
+from eve import Eve
+from werkzeug.exceptions import BadRequest
+
+from python_utils.eve.utils.datetime_utils import MyMongo
+
+
+def matches(document, query):
+    """Matches the query operators used by exports"""
+    for field, condition in query.items():
+        if field == '$and':
+            if not all(matches(document, subquery) for subquery in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(field)
+            if '$gt' in condition and not (value is not None and value > condition['$gt']):
+                return False
+            if '$ne' in condition and value == condition['$ne']:
+                return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    """Sorted and limited in memory cursor"""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, limit):
+        self.documents = self.documents[:limit]
+        return self
+
+    def __iter__(self):
+        return iter(self.documents)
+
+
+class FakeCollection:
+    """In memory collection, recording its queries"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    def find(self, query, projection):
+        self.queries.append(query)
+        out = []
+        for document in self.documents:
+            if matches(document, query or {}):
+                out.append({field: value for field, value in document.items()
+                            if projection is None or projection.get(field)})
+        return FakeCursor(out)
+
+
+@pytest.fixture(name='export_app')
+def export_app_fixture(monkeypatch):
+    domain = {'items': {'schema': {'name': {'type': 'string'}, 'at': {'type': 'datetime'}}, 'soft_delete': True}}
+    app = Eve(settings={'DOMAIN': domain}, data=MyMongo)
+    start = datetime.datetime(2019, 1, 1, tzinfo=pytz.utc)
+    documents = [{'_id': ObjectId('5d0b6e1f8f1b2c3d4e5f{:04x}'.format(position)), 'name': 'item {}'.format(position),
+                  'at': start + datetime.timedelta(hours=position), '_deleted': position == 3}
+                 for position in reversed(range(25))]
+    collection = FakeCollection(documents)
+
+    class FakePyMongo:
+        db = {'items': collection}
+
+    monkeypatch.setattr(MyMongo, 'pymongo', lambda self, resource=None, prefix=None: FakePyMongo)
+    with app.test_request_context():
+        yield app, collection
+
+
+def read_lines(chunks):
+    return [json.loads(line) for chunk in chunks for line in chunk.decode('utf-8').splitlines()]
+
+
+def test_export_ndjson(export_app):
+    app, collection = export_app
+    chunks = list(app.data.export_ndjson('items', batch_size=10, chunk_size=200))
+    assert all(chunk.endswith(b'\n') for chunk in chunks)
+    assert 1 < len(chunks) < 24
+    lines = read_lines(chunks)
+    assert [line['name'] for line in lines] == ['item {}'.format(position) for position in range(25) if position != 3]
+    assert lines[0]['at'] == '2019-01-01T00:00:00Z'
+    # Keyset batches: 10 + 10 + 4 documents
+    assert len(collection.queries) == 3
+
+
+def test_export_resume(export_app):
+    app, _ = export_app
+    lines = read_lines(app.data.export_ndjson('items', batch_size=10))
+    resumed = read_lines(app.data.export_ndjson('items', resume_token=lines[9]['_id'], batch_size=10))
+    assert resumed == lines[10:]
+    lookup = read_lines(app.data.export_ndjson('items', lookup={'name': 'item 5'}))
+    assert [line['name'] for line in lookup] == ['item 5']
+
+
+def test_export_response(export_app):
+    app, _ = export_app
+    response = app.data.export_response('items', chunk_size=1)
+    assert response.mimetype == 'application/x-ndjson'
+    assert len(read_lines(response.response)) == 24
+    for resume_token in ('bad', ''):
+        with pytest.raises(BadRequest):
+            app.data.export_response('items', resume_token=resume_token)
+    # Malformed ids raise ValueError to direct callers too
+    for resume_token in ('', 'bad', '5d2f1c3e8a1b2c3d4e5f6a7z', 123):
+        with pytest.raises(ValueError):
+            app.data.export_ndjson('items', resume_token=resume_token)
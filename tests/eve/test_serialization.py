@@ -0,0 +1,127 @@
+"""Eve serialization plans tests"""
+import copy
+import decimal
+import json
+import random
+
+import pytest
+from bson import ObjectId, decimal128
+from bson.dbref import DBRef
+from eve import Eve
+from eve.methods.common import serialize
+
+from python_utils.eve.utils.datetime_utils import MyMongo
+
+# Previous MyMongo serializers
+LAMBDA_SERIALIZERS = {
+    "objectid": lambda value: ObjectId(value) if value else None,
+    "integer": lambda value: int(value) if value is not None else None,
+    "float": lambda value: float(value) if value is not None else None,
+    "number": lambda val: json.loads(val) if val is not None else None,
+    "boolean": lambda v: {"1": True, "true": True, "0": False, "false": False}[str(v).lower()],
+    "dbref": lambda value: DBRef(value["$col"], value["$id"], value["$db"] if "$db" in value else None)
+    if value is not None else None,
+    "decimal": lambda value: decimal128.Decimal128(decimal.Decimal(str(value))) if value is not None else None,
+}
+
+SCHEMA = {
+    'owner': {'type': 'objectid'},
+    'when': {'type': 'datetime'},
+    'count': {'type': 'integer'},
+    'ratio': {'type': 'float'},
+    'amount': {'type': 'number'},
+    'active': {'type': 'boolean'},
+    'price': {'type': 'decimal'},
+    'ref': {'type': 'dbref'},
+    'name': {'type': 'string'},
+    'tags': {'type': 'list', 'schema': {'type': 'objectid'}},
+    'labels': {'type': 'list'},
+    'address': {'type': 'dict', 'schema': {'since': {'type': 'datetime'}, 'floor': {'type': 'integer'}}},
+    'events': {'type': 'list', 'schema': {'type': 'dict', 'schema': {
+        'at': {'type': 'datetime'}, 'by': {'type': 'objectid'},
+        'nested': {'type': 'dict', 'schema': {'flag': {'type': 'boolean'}}}}}},
+    'matrix': {'type': 'list', 'schema': {'type': 'list', 'schema': {'type': 'integer'}}},
+    'pair': {'type': 'list', 'items': [{'type': 'objectid'}, {'type': 'datetime'}]},
+    'by_key': {'type': 'dict', 'valueschema': {'type': 'objectid'}},
+    'either': {'type': 'datetime', 'anyof': [{'type': 'datetime'}, {'type': 'objectid'}]},
+    'mixed': {'type': ['integer', 'string']},
+}
+
+VALUES = {
+    'objectid': ['5d0b6e1f8f1b2c3d4e5f6a7b', 'bad', '', None, 5],
+    'datetime': ['2019-06-15T10:20:30Z', '2019-13-01T00:00:00Z', 'bad', 12],
+    'integer': ['12', '1.5', 'x', 3, 2.5],
+    'float': ['1.5', 'inf', 'x', 1],
+    'number': ['12', '012', '1.5e3', '-3', ' 7 ', '٣', 'x', 4, '0', '99999999999999999999'],
+    'boolean': ['true', 'False', '1', 'yes', True, 0],
+    'decimal': ['10.50', '1e3', 3],
+    'dbref': [{'$col': 'users', '$id': 1}, {'$col': 'users', '$id': 1, '$db': 'db'}, {'$id': 1}, 'x'],
+    'string': ['a'],
+}
+
+
+def get_value(rng, field_type):
+    return rng.choice(VALUES[field_type])
+
+
+def get_document(rng):
+    document = {
+        'owner': get_value(rng, 'objectid'), 'when': get_value(rng, 'datetime'), 'count': get_value(rng, 'integer'),
+        'ratio': get_value(rng, 'float'), 'amount': get_value(rng, 'number'), 'active': get_value(rng, 'boolean'),
+        'price': get_value(rng, 'decimal'), 'ref': get_value(rng, 'dbref'), 'name': 'a', 'unknown': '12',
+        'tags': rng.choice([[get_value(rng, 'objectid') for _ in range(3)], get_value(rng, 'objectid')]),
+        'labels': rng.choice([['a'], 'a']),
+        'address': rng.choice([{'since': get_value(rng, 'datetime'), 'floor': '3', 'x.y': '1'}, 'bad']),
+        'events': rng.choice([[{'at': get_value(rng, 'datetime'), 'by': get_value(rng, 'objectid'),
+                                'nested': {'flag': get_value(rng, 'boolean')}}, 'bad'], 'bad']),
+        'matrix': [['1', 2], ['x']],
+        'pair': [get_value(rng, 'objectid'), get_value(rng, 'datetime')],
+        'by_key': {'a': '5d0b6e1f8f1b2c3d4e5f6a7b'},
+        'either': get_value(rng, 'datetime'),
+        'mixed': '3',
+        'dotted.field': '1',
+    }
+    for field in rng.sample(sorted(document), 3):
+        document[field] = None
+    return document
+
+
+@pytest.fixture(params=[False, True], ids=['default', 'auto_create_lists'])
+def app(request):
+    settings = {'DOMAIN': {'items': {'schema': SCHEMA}}, 'AUTO_CREATE_LISTS': request.param}
+    app = Eve(settings=settings, data=MyMongo)
+    with app.app_context():
+        yield app
+
+
+@pytest.mark.parametrize('workers', [None, 4])
+def test_serialize_documents_matches_eve(app, workers):  # pylint: disable=redefined-outer-name
+    rng = random.Random(0)
+    documents = []
+    expected = []
+    for _ in range(500):
+        document = get_document(rng)
+        try:
+            expected.append(serialize(copy.deepcopy(document), 'items'))
+        except Exception as error:  # pylint: disable=broad-except
+            # Eve fails with some values, as lists of one type that are not lists
+            with pytest.raises(type(error)):
+                app.data.serialize_documents('items', [copy.deepcopy(document)])
+        else:
+            documents.append(document)
+    out = app.data.serialize_documents('items', copy.deepcopy(documents), workers=workers, chunk_size=100)
+    assert len(out) > 100
+    assert out == expected
+    assert app.data.get_serialization_plan('items') is app.data.get_serialization_plan('items')
+
+
+def test_serializers_match_previous_ones(app):  # pylint: disable=unused-argument,redefined-outer-name
+    for field_type, serializer in LAMBDA_SERIALIZERS.items():
+        for value in VALUES[field_type] + [None]:
+            try:
+                expected = serializer(value)
+            except Exception as error:  # pylint: disable=broad-except
+                with pytest.raises(type(error)):
+                    MyMongo.serializers[field_type](value)
+            else:
+                assert repr(MyMongo.serializers[field_type](value)) == repr(expected)
@@ -0,0 +1,40 @@
+"""Gunicorn config profiles tests"""
+import pytest
+
+from python_utils.gunicorn import config
+from python_utils.gunicorn.config import (MB, PROFILE_CPU_BOUND_API, PROFILE_IO_BOUND_PROXY, PROFILE_LOW_MEMORY,
+                                          get_cpu_count, get_memory_limit, get_settings)
+
+
+def test_cgroup_limits(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.os, 'sched_getaffinity', lambda pid: set(range(8)))
+    cpu_max = tmp_path / 'cpu.max'
+    memory_max = tmp_path / 'memory.max'
+    monkeypatch.setattr(config, 'CGROUP_V2_CPU_MAX', str(cpu_max))
+    monkeypatch.setattr(config, 'CGROUP_V2_MEMORY_MAX', str(memory_max))
+    monkeypatch.setattr(config, 'CGROUP_V1_CPU_QUOTA', str(tmp_path / 'missing'))
+    monkeypatch.setattr(config, 'CGROUP_V1_MEMORY_LIMIT', str(tmp_path / 'missing'))
+
+    assert get_cpu_count() == 8
+    assert get_memory_limit() is None
+    cpu_max.write_text('max 100000\n')
+    memory_max.write_text('max\n')
+    assert get_cpu_count() == 8
+    assert get_memory_limit() is None
+    cpu_max.write_text('150000 100000\n')
+    memory_max.write_text('536870912\n')
+    assert get_cpu_count() == 2
+    assert get_memory_limit() == 512 * MB
+
+
+def test_get_settings():
+    assert get_settings(PROFILE_IO_BOUND_PROXY, cpus=4, memory_limit=4096 * MB)['workers'] == 5
+    settings = get_settings(PROFILE_CPU_BOUND_API, cpus=4, memory_limit=4096 * MB)
+    assert (settings['worker_class'], settings['workers'], settings['threads']) == ('sync', 4, 1)
+    # Memory limit caps the workers
+    assert get_settings(PROFILE_CPU_BOUND_API, cpus=4, memory_limit=600 * MB)['workers'] == 3
+    settings = get_settings(PROFILE_LOW_MEMORY, cpus=4, timeout=10)
+    assert (settings['workers'], settings['preload_app'], settings['timeout']) == (1, True, 10)
+    assert settings['max_requests_jitter'] == settings['max_requests'] // 10
+    with pytest.raises(ValueError):
+        get_settings('unknown')
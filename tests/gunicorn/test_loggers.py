@@ -0,0 +1,67 @@
+"""Gunicorn loggers tests"""
+import datetime
+import json
+import logging
+import os
+
+from gunicorn.config import Config
+
+from python_utils.gunicorn.log.formatters import GunicornRequestGELFFormatter
+from python_utils.gunicorn.log.loggers import GunicornLogger, StructuredGunicornLogger
+
+
+class Response:
+    status = '200 OK'
+    sent = 1024
+    headers = [('Content-Type', 'application/json')]
+
+
+class Request:
+    headers = [('HOST', 'localhost')]
+
+
+ENVIRON = {
+    'REMOTE_ADDR': '10.0.0.1',
+    'REQUEST_METHOD': 'GET',
+    'RAW_URI': '/path/?a=1',
+    'PATH_INFO': '/path/',
+    'QUERY_STRING': 'a=1',
+    'SERVER_PROTOCOL': 'HTTP/1.1',
+    'HTTP_USER_AGENT': 'pytest',
+}
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def log_access(logger_class):
+    cfg = Config()
+    cfg.set('accesslog', '-')
+    logger = logger_class(cfg)
+    handler = ListHandler()
+    logger.access_log.handlers = [handler]
+    logger.access(Response(), Request(), ENVIRON, datetime.timedelta(seconds=1, microseconds=500))
+    return handler.records[0] if handler.records else None
+
+
+def test_structured_gunicorn_logger():
+    record = log_access(StructuredGunicornLogger)
+    out = json.loads(GunicornRequestGELFFormatter().format(record))
+
+    assert out['short_message'] == 'GET /path/ 200'
+    assert out['_status_code'] == '200'
+    assert out['_request_time_us'] == 1000500
+    assert out['_response_bytes'] == 1024
+    assert out['_worker_pid'] == os.getpid()
+
+    # Same fields as the templated access log
+    templated = json.loads(GunicornRequestGELFFormatter().format(log_access(GunicornLogger)))
+    for field in ('_remote_addr', '_status_code', '_http_user_agent', '_request_method', '_path_info',
+                  '_server_protocol'):
+        assert out[field] == templated[field]
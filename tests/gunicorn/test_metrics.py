@@ -0,0 +1,99 @@
+"""Gunicorn shared metrics tests"""
+import os
+
+from python_utils.gunicorn import metrics
+from python_utils.gunicorn.log.loggers import StructuredGunicornLogger
+from python_utils.gunicorn.metrics import SharedHistograms, normalize_route
+
+from tests.gunicorn.test_loggers import log_access
+
+
+def test_shared_histograms_across_processes(tmp_path):
+    path = str(tmp_path / 'metrics')
+    histograms = SharedHistograms(path, create=True, buckets_us=(1000, 10000), max_series=2048, max_workers=8)
+    # Workers are forked from the process that opened the file, like gunicorn, and record at the same time
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for worker in range(8):
+        pid = os.fork()
+        if pid == 0:
+            os.close(write_fd)
+            os.read(read_fd, 1)
+            for route in range(200):
+                histograms.record('/shared/{}/'.format(route), '200', 500)
+                histograms.record('/worker/{}/{}/'.format(worker, route), '500', 50000)
+            os._exit(0)
+        pids.append(pid)
+    os.close(read_fd)
+    os.close(write_fd)
+    for pid in pids:
+        assert os.waitpid(pid, 0)[1] == 0
+    histograms.record('/shared/0/', '200', 5000)
+
+    reader = SharedHistograms(path)
+    collected = reader.collect()
+    assert len(reader.get_keys()) == len(collected) == 200 + 8 * 200
+    assert collected[('/shared/0/', '200')] == [8, 1, 0, 9000]
+    assert all(collected[('/shared/{}/'.format(route), '200')] == [8, 0, 0, 4000] for route in range(1, 200))
+    assert all(totals == [0, 0, 1, 50000] for (route, status), totals in collected.items() if status == '500')
+    assert reader.to_prometheus().splitlines()[2:7] == [
+        'http_request_duration_seconds_bucket{route="/shared/0/",status="200",le="0.001"} 8',
+        'http_request_duration_seconds_bucket{route="/shared/0/",status="200",le="0.01"} 9',
+        'http_request_duration_seconds_bucket{route="/shared/0/",status="200",le="+Inf"} 9',
+        'http_request_duration_seconds_sum{route="/shared/0/",status="200"} 0.009',
+        'http_request_duration_seconds_count{route="/shared/0/",status="200"} 9',
+    ]
+    reader.close()
+    histograms.close()
+
+
+def test_shared_histograms_create_keeps_mapped_file(tmp_path):
+    path = str(tmp_path / 'metrics')
+    histograms = SharedHistograms(path, create=True)
+    histograms.record('/a/', '200', 1)
+    # A new master replaces the file, workers of the old one keep their own
+    SharedHistograms(path, create=True).close()
+    histograms.record('/a/', '200', 1)
+    assert histograms.collect()[('/a/', '200')][0] == 2
+    assert SharedHistograms(path).collect() == {}
+    assert os.listdir(str(tmp_path)) == ['metrics']
+    histograms.close()
+
+
+def test_shared_histograms_bounded_series(tmp_path):
+    histograms = SharedHistograms(str(tmp_path / 'metrics'), create=True, max_series=metrics.RESERVED_SERIES + 1)
+    histograms.record('/a/', '200', 1)
+    histograms.record('/b/', '200', 1)
+    assert list(histograms.collect()) == [('/a/', '200'), (metrics.OTHER_ROUTE, '200')]
+    # Routes without room are not kept in the index of the process
+    for position in range(100):
+        histograms.record('/c/{}/'.format(position), '200', 1)
+    assert histograms.index == {('/a/', '200'): 0, (metrics.OTHER_ROUTE, '200'): histograms.stride}
+    assert histograms.collect()[(metrics.OTHER_ROUTE, '200')][0] == 101
+    histograms.close()
+
+
+def test_normalize_route():
+    assert normalize_route('/items/12/') == '/items/:id/'
+    assert normalize_route('/items/5d2f1c3e8a1b2c3d4e5f6a7b') == '/items/:id'
+    assert normalize_route('/items/0b8e7a3c-1f2d-4c5b-9a8e-7d6c5b4a3f2e/v2/') == '/items/:id/v2/'
+    assert normalize_route.cache_info().maxsize == metrics.ROUTE_CACHE_SIZE
+
+
+def test_gunicorn_logger_records_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_FILE', str(tmp_path / 'metrics'))
+    log_access(StructuredGunicornLogger)
+    assert SharedHistograms(metrics.METRICS_FILE).collect() == {
+        ('/path/', '200'): [0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 1000500]}
+
+
+def test_gunicorn_logger_metrics_errors_logged(monkeypatch):
+    class BrokenHistograms:
+        def record(self, route, status, duration_us):
+            raise OSError('No space left on device')
+
+    errors = []
+    monkeypatch.setattr(StructuredGunicornLogger, 'metrics', BrokenHistograms())
+    monkeypatch.setattr(StructuredGunicornLogger, 'error', lambda self, message: errors.append(message))
+    assert log_access(StructuredGunicornLogger).getMessage() == 'GET /path/ 200'
+    assert 'No space left on device' in errors[0]
@@ -0,0 +1,70 @@
+"""Gunicorn access log sampling tests"""
+import json
+
+from gunicorn.config import Config
+
+from python_utils.gunicorn.log import sampling
+from python_utils.gunicorn.log.formatters import GunicornRequestGELFFormatter
+from python_utils.gunicorn.log.loggers import GunicornLogger, StructuredGunicornLogger
+from python_utils.gunicorn.log.sampling import DEFAULT_PROBE_PATHS, AccessLogSampler, get_probe_paths
+
+from tests.gunicorn.test_loggers import log_access
+
+
+def test_access_log_sampler(monkeypatch):
+    monkeypatch.setattr(sampling.random, 'random', lambda: 0.5)
+    sampler = AccessLogSampler(suppressed_paths=DEFAULT_PROBE_PATHS,
+                               sample_rates=((r'/api/v1/items/\d+/$', 0.1), ('/api/', 0.75)),
+                               default_sample_rate=0, slow_threshold_us=1000000)
+
+    assert sampler.sample('/healthz', '200', 0) is None
+    assert sampler.sample('/healthz', '404', 0) is None
+    # Server errors are logged even in suppressed paths
+    assert sampler.sample('/healthz', '500', 0) == 1.0
+    assert sampler.sample('/api/v1/items/1/', '200', 0) is None
+    assert sampler.sample('/api/v1/items/', '200', 0) == 0.75
+    assert sampler.sample('/other/', '200', 0) is None
+    # Errors and slow requests are always logged
+    assert sampler.sample('/api/v1/items/1/', '404', 0) == 1.0
+    assert sampler.sample('/other/', 503, 0) == 1.0
+    assert sampler.sample('/api/v1/items/1/', '200', 1000000) == 1.0
+
+
+class SampledLogger(GunicornLogger):
+    access_sampler = AccessLogSampler(sample_rates=(('/path/', 0.5),))
+
+
+class StructuredSampledLogger(StructuredGunicornLogger):
+    access_sampler = SampledLogger.access_sampler
+
+
+def test_gunicorn_logger_sampling(monkeypatch):
+    formatter = GunicornRequestGELFFormatter()
+    monkeypatch.setattr(sampling.random, 'random', lambda: 0.25)
+    assert json.loads(formatter.format(log_access(SampledLogger)))['_sample_rate'] == 0.5
+    assert json.loads(formatter.format(log_access(StructuredSampledLogger)))['_sample_rate'] == 0.5
+
+    monkeypatch.setattr(sampling.random, 'random', lambda: 0.75)
+    assert log_access(SampledLogger) is None
+    assert log_access(StructuredSampledLogger) is None
+
+
+def test_probe_paths_from_settings(settings):
+    assert DEFAULT_PROBE_PATHS == ('/healthz', '/readyz')
+    settings.HEALTHZ_PATH = '/live'
+    assert get_probe_paths() == ('/live', '/readyz')
+
+
+def test_sampling_rules_from_gunicorn_config(monkeypatch):
+    monkeypatch.setattr(sampling.random, 'random', lambda: 0.25)
+    cfg = Config()
+    assert GunicornLogger(cfg).access_sampler is None
+    cfg.set('raw_env', ['GUNICORN_ACCESS_LOG_SUPPRESSED_PATHS=probes,/ping',
+                        'GUNICORN_ACCESS_LOG_SAMPLE_RATES=[["/api/", 0.5]]', 'GUNICORN_ACCESS_LOG_SAMPLE_RATE=0',
+                        'GUNICORN_ACCESS_LOG_SLOW_US=1000'])
+    sampler = StructuredGunicornLogger(cfg).access_sampler
+    assert sampler.suppressed_paths == frozenset(DEFAULT_PROBE_PATHS + ('/ping',))
+    assert (sampler.sample('/api/', '200', 0), sampler.sample('/other/', '200', 0)) == (0.5, None)
+    assert sampler.sample('/other/', '200', 1000) == 1.0
+    # Samplers of subclasses are kept
+    assert SampledLogger(cfg).access_sampler is SampledLogger.access_sampler
@@ -0,0 +1,39 @@
+"""Log filters tests"""
+import json
+import logging
+
+from python_utils.log import filters
+from python_utils.log.filters import RateLimitFilter
+from python_utils.log.formatters import BasicGELFFormatter
+
+
+def make_record(msg, args=None, level=logging.ERROR, lineno=1):
+    return logging.LogRecord('test', level, __file__, lineno, msg, args, None)
+
+
+def test_rate_limit_filter(monkeypatch):
+    now = [0]
+    monkeypatch.setattr(filters.time, 'monotonic', lambda: now[0])
+    rate_limit = RateLimitFilter(rate=1, burst=2)
+
+    assert [rate_limit.filter(make_record('error %s', (i,))) for i in range(5)] == [True, True, False, False, False]
+    # Other fingerprints are not affected
+    assert rate_limit.filter(make_record('error %s', (1,), level=logging.WARNING))
+    assert rate_limit.suppressed == 3
+
+    now[0] = 1
+    record = make_record('error %s', (5,))
+    assert rate_limit.filter(record)
+    assert record.suppressed == 3
+    assert json.loads(BasicGELFFormatter().format(record))['_suppressed'] == 3
+    assert not rate_limit.filter(make_record('error %s', (6,)))
+
+
+def test_rate_limit_filter_by_location_and_eviction():
+    rate_limit = RateLimitFilter(rate=0, burst=1, max_fingerprints=2, by_location=True)
+    assert rate_limit.filter(make_record('error 1'))
+    assert not rate_limit.filter(make_record('error 2'))
+    assert rate_limit.filter(make_record('error 3', lineno=2))
+    assert rate_limit.filter(make_record('error 4', lineno=3))
+    # First fingerprint was evicted
+    assert rate_limit.filter(make_record('error 5'))
@@ -0,0 +1,97 @@
+"""Log formatters tests"""
+import json
+import logging
+import socket
+import sys
+
+import pytest
+
+from python_utils.log.formatters import (EXTRA_FIELDS, JSON_BACKEND_ORJSON, BasicGELFFormatter,
+                                         get_traceback_fingerprint, get_traceback_key, orjson)
+
+
+def make_record(exc_info=None, **extra):
+    record = logging.LogRecord('test', logging.ERROR, '/app/file.py', 12, 'message %s', ('ñ',), exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_basic_gelf_formatter():
+    formatter = BasicGELFFormatter(extra_fields=EXTRA_FIELDS + ['status_code', 'empty'])
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = make_record(exc_info=sys.exc_info(), status_code=500, empty='')
+    expected = {
+        'version': '1.1',
+        'host': socket.gethostname(),
+        'short_message': 'message ñ',
+        'timestamp': record.created,
+        'level': 3,
+        '_logger_name': 'test',
+        '_levelname': 'ERROR',
+        'full_message': formatter.formatException(record.exc_info),
+        '_exc_fingerprint': get_traceback_fingerprint(get_traceback_key(record.exc_info)[0]),
+        '_line': 12,
+        '_file': '/app/file.py',
+        '_status_code': 500,
+    }
+    assert formatter.format(record) == json.dumps(expected)
+    assert formatter.format_bytes(record) == json.dumps(expected).encode('utf-8')
+
+    formatter.null_character = True
+    assert formatter.format_bytes(record) == json.dumps(expected).encode('utf-8') + b'\0'
+
+
+def test_basic_gelf_formatter_extra_fields_changed_in_place():
+    formatter = BasicGELFFormatter(extra_fields=list(EXTRA_FIELDS))
+    record = make_record(status_code=200)
+    assert '_status_code' not in json.loads(formatter.format(record))
+    formatter.extra_fields.append('status_code')
+    assert json.loads(formatter.format(record))['_status_code'] == 200
+    # Same number of fields
+    formatter.extra_fields[-1] = 'custom'
+    out = json.loads(formatter.format(make_record(status_code=200, custom='x')))
+    assert (out['_custom'], '_status_code' in out) == ('x', False)
+    formatter.extra_fields = ['status_code']
+    out = json.loads(formatter.format(make_record(status_code=200, custom='x')))
+    assert (out['_status_code'], '_custom' in out, '_line' in out) == (200, False, False)
+
+
+@pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+def test_basic_gelf_formatter_orjson_backend():
+    record = make_record(host='other')
+    formatter = BasicGELFFormatter()
+    orjson_formatter = BasicGELFFormatter(json_backend=JSON_BACKEND_ORJSON)
+    assert json.loads(orjson_formatter.format_bytes(record)) == json.loads(formatter.format(record))
+    assert json.loads(orjson_formatter.format(record))['host'] == 'other'
+
+
+def raise_error(value):
+    try:
+        raise ValueError('invalid')
+    except ValueError as exc:
+        raise KeyError(value) from exc
+
+
+def get_exc_info(value):
+    try:
+        raise_error(value)
+    except KeyError:
+        return sys.exc_info()
+
+
+def test_basic_gelf_formatter_exception_cache():
+    formatter = BasicGELFFormatter(exc_cache_size=2)
+    outs = [json.loads(formatter.format(make_record(exc_info=get_exc_info(value)))) for value in ('a', 'a', 'b')]
+
+    assert formatter.exc_cache_stats() == {'hits': 1, 'misses': 2, 'size': 2, 'max_size': 2}
+    assert outs[0]['full_message'] == outs[1]['full_message']
+    assert 'ValueError: invalid' in outs[2]['full_message'] and "KeyError: 'b'" in outs[2]['full_message']
+    # Same code path, same fingerprint
+    assert outs[0]['_exc_fingerprint'] == outs[2]['_exc_fingerprint']
+    try:
+        raise KeyError('a')
+    except KeyError:
+        other = json.loads(formatter.format(make_record(exc_info=sys.exc_info())))
+    assert other['_exc_fingerprint'] != outs[0]['_exc_fingerprint']
@@ -0,0 +1,196 @@
+"""Log handlers tests"""
+import io
+import json
+import logging
+import queue
+import random
+import socket
+import string
+import threading
+import types
+import zlib
+
+import pytest
+
+from python_utils.log import handlers
+from python_utils.log.context import reset_log_context, set_log_context
+from python_utils.log.formatters import BasicGELFFormatter
+from python_utils.log.handlers import (GELF_CHUNK_MAGIC, GELF_MAX_CHUNKS, OVERFLOW_DROP_NEWEST,
+                                       OVERFLOW_DROP_OLDEST, BatchQueueListener, GELFTCPHandler, GELFUDPHandler,
+                                       QueuedGELFHandler)
+
+
+def make_record(msg):
+    return logging.LogRecord('test', logging.INFO, __file__, 1, msg, None, None)
+
+
+def test_queued_gelf_handler_writes_batches():
+    stream = io.StringIO()
+    handler = QueuedGELFHandler(stream=stream, batch_size=10, flush_interval=0.01)
+    handler.setFormatter(BasicGELFFormatter())
+    for i in range(25):
+        handler.handle(make_record('message {}'.format(i)))
+    handler.close()
+
+    lines = stream.getvalue().splitlines()
+    assert [json.loads(line)['short_message'] for line in lines] == ['message {}'.format(i) for i in range(25)]
+    assert handler.stats() == {'queued': 25, 'dropped': 0, 'written': 25, 'failed': 0, 'pending': 0}
+
+
+def test_batch_queue_listener_flush_interval_from_first_record(monkeypatch):
+    clock = types.SimpleNamespace(now=0)
+    monkeypatch.setattr(handlers, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+
+    class TricklingQueue:
+        """Queue getting a record every 40 ms"""
+        records = ['r1', 'r2', 'r3', 'r4', 'r5', handlers._STOP]  # pylint: disable=protected-access
+
+        def get(self, timeout=None):
+            clock.now += 0.04
+            if timeout is not None and timeout < 0.04:
+                raise queue.Empty
+            return self.records.pop(0)
+
+    batches = []
+    BatchQueueListener(TricklingQueue(), batches.append, batch_size=100, flush_interval=0.1).run()
+    # A batch waits at most `flush_interval` since its first record, even if records keep coming
+    assert batches == [['r1', 'r2', 'r3'], ['r4', 'r5']]
+
+
+@pytest.mark.parametrize('overflow,expected', [
+    (OVERFLOW_DROP_OLDEST, ['0', '2', '3']),
+    (OVERFLOW_DROP_NEWEST, ['0', '1', '2']),
+])
+def test_queued_gelf_handler_overflow(overflow, expected):
+    stream = io.StringIO()
+    handler = QueuedGELFHandler(stream=stream, queue_size=2, batch_size=1, overflow=overflow)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    # Hold the listener with the first record while the queue is filled
+    release = threading.Event()
+    handle_batch = handler.handle_batch
+    handler.handle_batch = lambda records: release.wait() and handle_batch(records)
+    handler.handle(make_record('0'))
+    while handler.queue.qsize():
+        pass
+    for msg in ('1', '2', '3'):
+        handler.handle(make_record(msg))
+    release.set()
+    handler.close()
+
+    assert stream.getvalue().splitlines() == expected
+    assert handler.stats()['dropped'] == 1
+
+
+def test_queued_gelf_handler_drop_oldest_counts_drops_once():
+    class RacingQueue:
+        """Full queue that the listener empties before the oldest record is dropped"""
+
+        def put_nowait(self, record):
+            raise queue.Full
+
+        def get_nowait(self):
+            raise queue.Empty
+
+    handler = QueuedGELFHandler(stream=io.StringIO(), overflow=OVERFLOW_DROP_OLDEST)
+    handler.handle(make_record('0'))
+    listener_queue, handler.queue = handler.queue, RacingQueue()
+    handler.handle(make_record('1'))
+    handler.queue = listener_queue
+    handler.close()
+    assert handler.stats()['dropped'] == 1
+
+
+def test_gelf_udp_handler_chunks_and_compresses():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    handler = GELFUDPHandler(*server.getsockname(), chunk_size=200)
+    handler.setFormatter(BasicGELFFormatter())
+    message = ''.join(random.choice(string.ascii_letters) for _ in range(1000))
+    handler.handle(make_record('short'))
+    handler.handle(make_record(message))
+    handler.close()
+
+    assert json.loads(zlib.decompress(server.recv(200)).decode())['short_message'] == 'short'
+    chunks = {}
+    while True:
+        datagram = server.recv(200)
+        assert datagram[:2] == GELF_CHUNK_MAGIC
+        sequence, total = datagram[10], datagram[11]
+        chunks[sequence] = datagram[12:]
+        if len(chunks) == total:
+            break
+    data = b''.join(chunks[sequence] for sequence in range(total))
+    assert json.loads(zlib.decompress(data).decode())['short_message'] == message
+    server.close()
+
+
+def test_gelf_udp_handler_discards_too_many_chunks():
+    handler = GELFUDPHandler('127.0.0.1', chunk_size=13, compression=None)
+    assert len(handler.chunks(b'a' * GELF_MAX_CHUNKS)) == GELF_MAX_CHUNKS
+    assert handler.chunks(b'a' * (GELF_MAX_CHUNKS + 1)) == []
+
+
+def test_gelf_tcp_handler_reconnects():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    server.settimeout(5)
+    handler = GELFTCPHandler(*server.getsockname(), batch_size=2)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+
+    handler.handle(make_record('1'))
+    handler.handle(make_record('2'))
+    conn, _ = server.accept()
+    assert conn.recv(4) == b'1\0' b'2\0'
+    conn.close()
+    # First sends after the peer closed can succeed, so keep writing until the handler reconnects
+    server.settimeout(0.2)
+    for _ in range(25):
+        handler.handle(make_record('3'))
+        try:
+            conn, _ = server.accept()
+            break
+        except socket.timeout:
+            pass
+    else:
+        pytest.fail('handler did not reconnect')
+    handler.close()
+    conn.settimeout(5)
+    assert b'3\0' in conn.recv(1024)
+    conn.close()
+    server.close()
+
+
+def test_gelf_tcp_handler_reports_first_failure(monkeypatch):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    address = server.getsockname()
+    # Nothing listening: connections are refused
+    server.close()
+    handler = GELFTCPHandler(*address, batch_size=1, reconnect_backoff=0)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    errors = []
+    monkeypatch.setattr(handler, 'handleError', errors.append)
+    for message in ('1', '2', '3'):
+        handler.handle_batch([make_record(message)])
+    # Batches while backing off are dropped without trying to connect
+    handler.reconnect_backoff = 60
+    handler.handle_batch([make_record('4')])
+    monkeypatch.setattr(handler, 'connect', lambda: pytest.fail('connected while backing off'))
+    handler.handle_batch([make_record('5')])
+    assert [record.getMessage() for record in errors] == ['1']
+    assert handler.failed == 5
+    handler.close()
+
+
+def test_queued_gelf_handler_captures_log_context():
+    stream = io.StringIO()
+    handler = QueuedGELFHandler(stream=stream)
+    handler.setFormatter(BasicGELFFormatter())
+    token = set_log_context({'request_id': 'abc'})
+    handler.handle(make_record('message'))
+    reset_log_context(token)
+    handler.close()
+
+    assert json.loads(stream.getvalue())['_request_id'] == 'abc'